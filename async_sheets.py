@@ -0,0 +1,236 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import SHEETS_MAX_WORKERS, SHEETS_CALL_TIMEOUT, SINGLE_FLIGHT_GRACE, STORAGE_READY_WAIT
+from metrics import observe_call
+
+logger = logging.getLogger(__name__)
+
+
+class StorageNotReady(Exception):
+    """The storage backend is still connecting (or failing to)"""
+
+
+class AsyncSheetsHandler:
+    """Async facade over SheetsHandler.
+    
+    Blocking gspread calls run on a bounded thread pool so the telegram
+    event loop and the scheduler jobs keep running during API round-trips.
+    Reads are single-flight: concurrent identical reads share one call,
+    and its result is reused for `grace` seconds unless a write happens.
+    Without a handler the facade starts unconnected: connect() builds it in
+    the background and calls wait up to `ready_wait` seconds for it.
+    """
+    
+    def __init__(self, handler=None, max_workers=SHEETS_MAX_WORKERS, timeout=SHEETS_CALL_TIMEOUT,
+                 grace=SINGLE_FLIGHT_GRACE, ready_wait=STORAGE_READY_WAIT):
+        self.handler = handler
+        self.timeout = timeout
+        self.grace = grace
+        self.ready_wait = ready_wait
+        self.state = 'ready' if handler is not None else 'connecting'
+        self.last_error = None
+        self._state_since = time.monotonic()
+        self._ready = asyncio.Event()
+        if handler is not None:
+            self._ready.set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sheets')
+        self._inflight = {}   # read key -> asyncio.Task
+        self._recent = {}     # read key -> (finished at, result)
+        self._generation = 0  # bumped by every write
+        self.single_flight = {'calls': 0, 'shared': 0, 'grace_hits': 0}
+    
+    # === CONNECTION ===
+    
+    def _set_state(self, state, error=None):
+        self.state = state
+        self.last_error = error
+        self._state_since = time.monotonic()
+    
+    async def connect(self, factory, retry_delay=5, max_delay=300):
+        """Build the handler with factory() off the event loop, retrying until it works"""
+        loop = asyncio.get_running_loop()
+        delay = retry_delay
+        while self.handler is None:
+            start = time.monotonic()
+            try:
+                handler = await loop.run_in_executor(self._executor, factory)
+            except Exception as e:
+                self._set_state('failed', str(e))
+                logger.error(f"❌ Storage connect failed, retry in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+                self._set_state('connecting')
+                continue
+            self.handler = handler
+            self._set_state('ready')
+            self._ready.set()
+            logger.info(f"✅ Storage ready in {time.monotonic() - start:.1f}s")
+        return self.handler
+    
+    async def wait_ready(self, timeout=None):
+        """The handler once connected, StorageNotReady after timeout seconds"""
+        if self.handler is not None:
+            return self.handler
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            detail = f": {self.last_error}" if self.last_error else ''
+            raise StorageNotReady(f"storage {self.state}{detail}") from None
+        return self.handler
+    
+    def status(self):
+        """Connection state for /readyz"""
+        return {
+            'storage': self.state,
+            'seconds': round(time.monotonic() - self._state_since, 1),
+            'error': self.last_error,
+        }
+    
+    # === CALLS ===
+    
+    async def _run(self, name, *args, **kwargs):
+        """Run handler.<name> in the pool, raise asyncio.TimeoutError after self.timeout seconds"""
+        handler = await self.wait_ready(self.ready_wait)
+        loop = asyncio.get_running_loop()
+        call = functools.partial(getattr(handler, name), *args, **kwargs)
+        # On timeout the worker thread still finishes the call, we just stop waiting
+        return await observe_call(
+            name,
+            asyncio.wait_for(loop.run_in_executor(self._executor, call), self.timeout)
+        )
+    
+    async def _shared(self, name, *args, **kwargs):
+        """Single-flight read, callers get the same result object (do not mutate it)"""
+        key = (name, repr(args), repr(sorted(kwargs.items())))
+        recent = self._recent.get(key)
+        if recent is not None and time.monotonic() - recent[0] < self.grace:
+            self.single_flight['grace_hits'] += 1
+            return recent[1]
+        
+        task = self._inflight.get(key)
+        if task is None:
+            self.single_flight['calls'] += 1
+            task = asyncio.ensure_future(self._run(name, *args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._settle, key, self._generation))
+        else:
+            self.single_flight['shared'] += 1
+        # One caller giving up must not cancel the others
+        return await asyncio.shield(task)
+    
+    def _settle(self, key, generation, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if generation == self._generation and not task.cancelled() and task.exception() is None:
+            self._recent[key] = (time.monotonic(), task.result())
+    
+    def _changed(self):
+        """A write happened: later reads must not reuse earlier results"""
+        self._generation += 1
+        self._inflight.clear()
+        self._recent.clear()
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+    
+    # === CACHE ===
+    
+    async def refresh_cache(self):
+        try:
+            return await self._run('refresh_cache')
+        finally:
+            self._changed()
+    
+    async def sync_delta(self):
+        try:
+            return await self._run('sync_delta')
+        finally:
+            self._changed()
+    
+    async def check_for_changes(self):
+        synced = await self._run('check_for_changes')
+        if synced:
+            self._changed()
+        return synced
+    
+    async def save_snapshot(self):
+        return await self._run('save_snapshot')
+    
+    def invalidate_cache(self):
+        if self.handler is not None:
+            self.handler.invalidate_cache()
+        self._changed()
+    
+    # === TRADES ===
+    
+    async def add_trade(self, trade_data, idempotency_key=None):
+        try:
+            return await self._run('add_trade', trade_data, idempotency_key)
+        finally:
+            self._changed()
+    
+    async def get_pending_trades(self):
+        return await self._shared('get_pending_trades')
+    
+    async def get_trade_by_id(self, trade_id):
+        return await self._shared('get_trade_by_id', trade_id)
+    
+    async def update_trade_by_id(self, trade_id, updates):
+        try:
+            return await self._run('update_trade_by_id', trade_id, updates)
+        finally:
+            self._changed()
+    
+    async def update_trades_batch(self, updates_by_id):
+        try:
+            return await self._run('update_trades_batch', updates_by_id)
+        finally:
+            self._changed()
+    
+    async def add_fill(self, trade_id, percent, r):
+        try:
+            return await self._run('add_fill', trade_id, percent, r)
+        finally:
+            self._changed()
+    
+    def queue_update(self, trade_id, updates):
+        # Local only, flushed by flush_updates()
+        if self.handler is None:
+            raise StorageNotReady(f"storage {self.state}")
+        self.handler.queue_update(trade_id, updates)
+    
+    async def flush_updates(self):
+        try:
+            return await self._run('flush_updates')
+        finally:
+            self._changed()
+    
+    async def flush_outbox(self):
+        return await self._run('flush_outbox')
+    
+    def calculate_new_risk(self, entry, old_sl, new_sl, old_risk, direction):
+        # Pure calculation, no I/O
+        return self.handler.calculate_new_risk(entry, old_sl, new_sl, old_risk, direction)
+    
+    # === STATS ===
+    
+    async def get_stats(self, start_date=None, end_date=None):
+        return await self._shared('get_stats', start_date, end_date)
+    
+    async def get_stats_by_category(self, category, start_date=None, end_date=None):
+        return await self._shared('get_stats_by_category', category, start_date, end_date)
+    
+    async def query_stats(self, start_date=None, end_date=None, category=None, **filters):
+        return await self._shared('query_stats', start_date, end_date, category, **filters)
+    
+    async def get_open_risk(self):
+        return await self._shared('get_open_risk')
+    
+    async def reconcile_open_risk(self):
+        try:
+            return await self._run('reconcile_open_risk')
+        finally:
+            self._changed()
@@ -0,0 +1,208 @@
+"""Offline SheetsHandler benchmark on synthetic journals.
+
+    python -m benchmarks.bench_sheets                       # 1k / 10k / 100k
+    python -m benchmarks.bench_sheets --sizes 1000 --latency 0.2
+    python -m benchmarks.bench_sheets --output new.json --compare old.json
+
+Times every SheetsHandler method and the storage calls of the main bot
+flows, with API calls per run (from the fake worksheet) and peak Python
+allocations (tracemalloc). Journals are generated from a fixed seed so
+runs are comparable; --compare exits 1 when an operation got slower than
+--threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# No quota throttling against the fake, no outbox, no background jobs
+os.environ.setdefault('SHEETS_READS_PER_MINUTE', '100000000')
+os.environ.setdefault('SHEETS_WRITES_PER_MINUTE', '100000000')
+
+from benchmarks.fake_sheet import FakeWorksheet, synthetic_journal  # noqa: E402
+from sheets_handler import SheetsHandler, VIEW_COLUMNS  # noqa: E402
+from async_sheets import AsyncSheetsHandler  # noqa: E402
+from timeutil import TZ  # noqa: E402
+
+TRADE = dict(market='Tiền tệ', style='Day', direction='BUY', ticker='EURUSD',
+             entry=1.1, sl=1.09, risk=1.0, chart='', reason='bench')
+
+
+def _month():
+    return TZ.localize(datetime(2024, 6, 1)), TZ.localize(datetime(2024, 6, 30, 23, 59, 59))
+
+
+def handler_ops(handler, ws, size):
+    """(name, fn) pairs run against a warm cache"""
+    month_start, month_end = _month()
+    trade_ids = [1, size // 2, size]
+    counter = iter(range(10 ** 9))
+
+    def external_edit():
+        # One status change made by hand in the sheet, then a delta sync
+        row = 2 + next(counter) % size
+        ws.rows[row - 1][12] = 'Closed'
+        ws.spreadsheet.modified += 1
+        return handler.sync_delta()
+
+    def update_batch():
+        n = next(counter)
+        return handler.update_trades_batch({
+            1 + (n * 10 + i) % size: {'Ghi chú': f'bench {n}'} for i in range(10)
+        })
+
+    def queue_and_flush():
+        for i in range(5):
+            handler.queue_update(1 + i, {'TP': 1.2})
+        return handler.flush_updates()
+
+    return [
+        ('refresh_cache', handler.refresh_cache),
+        ('refresh_cache(VIEW_COLUMNS)', lambda: handler.refresh_cache(VIEW_COLUMNS)),
+        ('get_pending_trades', handler.get_pending_trades),
+        ('get_open_risk', handler.get_open_risk),
+        ('get_stats(all)', handler.get_stats),
+        ('get_stats(month)', lambda: handler.get_stats(month_start, month_end)),
+        ('get_stats_by_category', lambda: handler.get_stats_by_category('Thị trường', month_start, month_end)),
+        ('query_stats(filters)', lambda: handler.query_stats(month_start, month_end, market='Crypto', direction='BUY')),
+        ('get_trade_by_id', lambda: [handler.get_trade_by_id(t) for t in trade_ids]),
+        ('get_all_trades', handler.get_all_trades),
+        ('sync_delta(1 edit)', external_edit),
+        ('check_for_changes', handler.check_for_changes),
+        ('add_trade', lambda: handler.add_trade(dict(TRADE))),
+        ('update_trade_by_id', lambda: handler.update_trade_by_id(size // 2, {'SL': 1.095, 'Risk%': 0.5})),
+        ('update_trades_batch(10)', update_batch),
+        ('queue_update+flush_updates(5)', queue_and_flush),
+    ]
+
+
+def flow_ops(sheets, size):
+    """Storage calls of the main bot flows through the async facade"""
+    month_start, month_end = _month()
+
+    async def new_trade():
+        await sheets.add_trade(dict(TRADE))
+
+    async def update_trade():
+        # update_trade_start -> trade_selected -> update_input_received (move SL)
+        pending = await sheets.get_pending_trades()
+        trade = await sheets.get_trade_by_id(pending[0].id)
+        new_risk = sheets.calculate_new_risk(trade.entry, trade.sl, trade.sl, trade.risk, trade.direction)
+        await sheets.update_trade_by_id(trade.id, {'SL': trade.sl, 'Risk%': new_risk})
+
+    async def report():
+        # period_selected -> detail_selected
+        await sheets.get_stats(month_start, month_end)
+        await sheets.get_stats_by_category('Thị trường', month_start, month_end)
+        await sheets.get_stats_by_category('Kiểu', month_start, month_end)
+
+    async def open_risk():
+        await sheets.get_open_risk()
+
+    return [
+        ('flow:new_trade', new_trade),
+        ('flow:update_trade', update_trade),
+        ('flow:report', report),
+        ('flow:open_risk', open_risk),
+    ]
+
+
+def measure(fn, ws, repeat, run=None):
+    run = run or (lambda f: f())
+    calls_before = sum(ws.calls.values())
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(fn)
+        times.append(time.perf_counter() - start)
+    calls = (sum(ws.calls.values()) - calls_before) / repeat
+
+    tracemalloc.start()
+    run(fn)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'median_ms': round(statistics.median(times) * 1000, 3),
+        'min_ms': round(min(times) * 1000, 3),
+        'api_calls': round(calls, 2),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def bench_size(size, latency, repeat):
+    ws = FakeWorksheet(synthetic_journal(size, seed=size), latency=latency)
+    handler = SheetsHandler(worksheet=ws)
+    handler.refresh_cache()
+    results = []
+    for name, fn in handler_ops(handler, ws, size):
+        results.append({'size': size, 'op': name, **measure(fn, ws, repeat)})
+
+    sheets = AsyncSheetsHandler(handler, grace=0)
+    loop = asyncio.new_event_loop()
+    try:
+        for name, fn in flow_ops(sheets, size):
+            results.append({'size': size, 'op': name,
+                            **measure(fn, ws, repeat, run=lambda f: loop.run_until_complete(f()))})
+    finally:
+        sheets.shutdown()
+        loop.close()
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['size'], r['op']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\n{'size':>7}  {'operation':<32} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    for r in results:
+        old = baseline.get((r['size'], r['op']))
+        if not old:
+            continue
+        ratio = r['median_ms'] / old['median_ms'] if old['median_ms'] else 1.0
+        flag = ''
+        if ratio > 1 + threshold and r['median_ms'] - old['median_ms'] > 0.05:
+            flag = '  <-- slower'
+            regressions.append(r)
+        if r['api_calls'] > old['api_calls']:
+            flag += '  <-- more API calls'
+            regressions.append(r)
+        print(f"{r['size']:>7}  {r['op']:<32} {old['median_ms']:>10.3f} {r['median_ms']:>10.3f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per fake API call')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --output')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'size':>7}  {'operation':<32} {'median ms':>10} {'min ms':>10} {'API':>6} {'peak KB':>9}")
+    for size in args.sizes:
+        for r in bench_size(size, args.latency, args.repeat):
+            results.append(r)
+            print(f"{r['size']:>7}  {r['op']:<32} {r['median_ms']:>10.3f} {r['min_ms']:>10.3f} "
+                  f"{r['api_calls']:>6} {r['peak_alloc_kb']:>9}")
+
+    if args.output:
+        meta = {'python': platform.python_version(), 'latency': args.latency, 'repeat': args.repeat}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=1)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
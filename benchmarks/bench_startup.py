@@ -0,0 +1,199 @@
+"""Startup benchmark: time from process start to the first handled update.
+
+    python -m benchmarks.bench_startup                         # lazy / eager / warm, 5 runs each
+    python -m benchmarks.bench_startup --sizes 1000 100000     # warm start vs journal size
+    python -m benchmarks.bench_startup --connect-latency 3     # slow Google login / open_by_key
+    python -m benchmarks.bench_startup --output startup.json
+
+Every run is a fresh interpreter (cold imports); the clock starts once
+the fake sheet's rows are in memory. It does what
+Application.run_polling() does on startup, with a stub Bot, then feeds
+/start (no storage needed) and an open-risk tap (needs storage) through
+the update queue, as polling would. The sheet is the in-memory fake;
+--connect-latency stands in for authorising and opening the spreadsheet.
+`eager` connects before polling, like the bot did before storage was
+connected in the background. `warm` is lazy plus a snapshot of the
+journal (SNAPSHOT_PATH) loaded at connect, so the first storage-backed
+update no longer waits for a full download.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+START = time.perf_counter()
+
+MODES = ('lazy', 'eager', 'warm')
+MARKS = ('import_main', 'built', 'polling', 'first_update', 'storage_ready', 'first_storage_update')
+USER_ID = 424242
+
+
+def _offline_env():
+    os.environ.update({
+        'ADMIN_USER_ID': str(USER_ID),
+        'OUTBOX_PATH': '',
+        'HTTP_PORT': '0',  # any free port
+        'CHANGE_POLL_SECONDS': '0',
+        'SNAPSHOT_PATH': '',  # only the warm mode loads one, nothing is saved
+        'SHEETS_READS_PER_MINUTE': '100000000',
+        'SHEETS_WRITES_PER_MINUTE': '100000000',
+    })
+
+
+async def _replies(bot, count):
+    """Wait until the bot sent or edited `count` messages in total"""
+    while bot.calls['sendMessage'] + bot.calls['editMessageText'] < count:
+        await asyncio.sleep(0.001)
+
+
+async def _startup(main, args, marks):
+    from telegram import Update
+    from benchmarks.load_ptb import StubBot
+
+    def mark(name):
+        marks[name] = round(time.perf_counter() - START, 4)
+
+    bot = StubBot(latency=args.bot_latency)
+    application = main.build_application(bot=bot)
+    mark('built')
+    if args.eager:
+        await main.sheets.connect(main.create_storage)
+    ready = asyncio.ensure_future(main.sheets.wait_ready())
+    ready.add_done_callback(lambda _: mark('storage_ready'))
+
+    # Application.run_polling(): initialize, post_init, start fetching updates
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    mark('polling')
+
+    user = {'id': USER_ID, 'is_bot': False, 'first_name': 'Bench'}
+    chat = {'id': USER_ID, 'type': 'private'}
+    await application.update_queue.put(Update.de_json({'update_id': 1, 'message': {
+        'message_id': 1, 'date': int(time.time()), 'chat': chat, 'from': user, 'text': '/start',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+    }}, bot))
+    await _replies(bot, 1)
+    mark('first_update')
+
+    await application.update_queue.put(Update.de_json({'update_id': 2, 'callback_query': {
+        'id': '1', 'from': user, 'chat_instance': '1', 'data': 'open_risk',
+        'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat, 'text': 'menu'},
+    }}, bot))
+    await _replies(bot, 2)
+    mark('first_storage_update')
+    await ready
+
+    await application.stop()
+    await application.post_shutdown(application)
+    await application.shutdown()
+    main.sheets.shutdown()
+
+
+def run_once(args):
+    """One cold start in this process, returns {mark: seconds since START}"""
+    global START
+    with open(args.rows, 'rb') as f:
+        rows = pickle.load(f)  # the remote sheet, not part of startup
+    START = time.perf_counter()
+    _offline_env()
+    marks = {}
+    import main
+    marks['import_main'] = round(time.perf_counter() - START, 4)
+
+    def connect():
+        # Imported here, like create_storage() does for the real backend
+        from benchmarks.fake_sheet import FakeWorksheet
+        from sheets_handler import SheetsHandler
+        time.sleep(args.connect_latency)
+        handler = SheetsHandler(worksheet=FakeWorksheet(rows, latency=args.latency))
+        if args.snapshot:
+            handler.snapshot_path = args.snapshot
+            handler.load_snapshot()
+            handler.snapshot_path = ''
+        return handler
+    main.create_storage = connect
+
+    asyncio.run(_startup(main, args, marks))
+    return marks
+
+
+def make_journal(size, directory):
+    """Rows of the fake sheet and a snapshot of them, as (rows path, snapshot path)"""
+    _offline_env()
+    from benchmarks.fake_sheet import FakeWorksheet, synthetic_journal
+    from sheets_handler import SheetsHandler
+    rows = synthetic_journal(size)
+    rows_path = os.path.join(directory, f'journal-{size}.rows')
+    with open(rows_path, 'wb') as f:
+        pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+    handler = SheetsHandler(worksheet=FakeWorksheet(rows))
+    handler.snapshot_path = os.path.join(directory, f'journal-{size}.snapshot')
+    handler.refresh_cache()
+    handler.save_snapshot()
+    return rows_path, handler.snapshot_path
+
+
+def run_child(args, rows, mode, snapshot):
+    command = [sys.executable, '-m', 'benchmarks.bench_startup', '--child',
+               '--rows', rows, '--latency', str(args.latency),
+               '--connect-latency', str(args.connect_latency), '--bot-latency', str(args.bot_latency)]
+    if mode == 'eager':
+        command.append('--eager')
+    if mode == 'warm':
+        command += ['--snapshot', snapshot]
+    start = time.perf_counter()
+    out = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    marks = json.loads(out.strip().splitlines()[-1])
+    marks['process'] = round(time.perf_counter() - start, 4)
+    return marks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='synthetic journal sizes')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per fake Sheets API call')
+    parser.add_argument('--connect-latency', type=float, default=1.0,
+                        help='seconds to authorise and open the spreadsheet')
+    parser.add_argument('--bot-latency', type=float, default=0.0, help='seconds per Telegram API call')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', help=argparse.SUPPRESS)
+    parser.add_argument('--eager', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--snapshot', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_once(args)))
+        return 0
+
+    columns = MARKS + ('process',)
+    print(f"{'size':>7} {'mode':<6} " + ' '.join(f"{c:>20}" for c in columns) + '   (median seconds)')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            rows, snapshot = make_journal(size, tmp)
+            for mode in MODES:
+                runs = [run_child(args, rows, mode, snapshot) for _ in range(args.repeat)]
+                medians = {c: round(statistics.median(r[c] for r in runs), 4) for c in columns}
+                results.append({'size': size, 'mode': mode, **medians})
+                print(f"{size:>7} {mode:<6} " + ' '.join(f"{medians[c]:>20.3f}" for c in columns))
+
+    if args.output:
+        meta = {'python': platform.python_version(), 'latency': args.latency,
+                'connect_latency': args.connect_latency, 'repeat': args.repeat}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
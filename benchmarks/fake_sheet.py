@@ -0,0 +1,228 @@
+import random
+import re
+import time
+from collections import Counter
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol, numericise
+from storage import HEADERS
+
+
+def _cell(value):
+    """What Sheets returns for a written value"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _trim(row):
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+def _column_number(letters):
+    number = 0
+    for ch in letters:
+        number = number * 26 + ord(ch) - 64
+    return number
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.main = worksheet
+        self.worksheets = {worksheet.title: worksheet}
+        self.modified = 0
+
+    def get_lastUpdateTime(self):
+        self.main._call('get_lastUpdateTime')
+        return f"modified-{self.modified}"
+
+    def worksheet(self, title):
+        self.main._call('worksheet')
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self.main._call('add_worksheet')
+        worksheet = FakeWorksheet(latency=self.main.latency, jitter=self.main.jitter, title=title)
+        # Sheets in one spreadsheet share the modified time
+        worksheet.spreadsheet = self
+        self.worksheets[title] = worksheet
+        return worksheet
+
+
+class FakeWorksheet:
+    """In-memory stand-in for the gspread Worksheet methods this project calls.
+
+    Every method counts as one API request (calls), sleeps `latency`
+    seconds (+- jitter) like a round-trip, and counts the cells it moves
+    (cells_read / cells_written).
+    """
+
+    def __init__(self, rows=None, latency=0.0, jitter=0.0, title='Trades'):
+        self.title = title
+        self.rows = [list(r) for r in rows] if rows else []
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self.cells_read = 0
+        self.cells_written = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def _call(self, name):
+        self.calls[name] += 1
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _read(self, rows):
+        self.cells_read += sum(len(r) for r in rows)
+        return rows
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append('')
+        cells[col - 1] = _cell(value)
+        self.cells_written += 1
+
+    def _written(self):
+        self.spreadsheet.modified += 1
+
+    def _last_row(self):
+        for i in range(len(self.rows), 0, -1):
+            if any(self.rows[i - 1]):
+                return i
+        return 0
+
+    # === READS ===
+
+    def get_all_values(self, **kwargs):
+        self._call('get_all_values')
+        rows = self.rows[:self._last_row()]
+        width = max((len(r) for r in rows), default=0)
+        return self._read([list(r) + [''] * (width - len(r)) for r in rows])
+
+    def get_all_records(self, **kwargs):
+        self._call('get_all_records')
+        rows = self._read([list(r) for r in self.rows[:self._last_row()]])
+        if not rows:
+            return []
+        headers = rows[0]
+        return [
+            {h: numericise(r[i]) if i < len(r) else '' for i, h in enumerate(headers)}
+            for r in rows[1:]
+        ]
+
+    def row_values(self, row, **kwargs):
+        self._call('row_values')
+        if row > len(self.rows):
+            return []
+        return self._read([_trim(self.rows[row - 1])])[0]
+
+    def col_values(self, col, **kwargs):
+        self._call('col_values')
+        values = _trim(r[col - 1] if col - 1 < len(r) else '' for r in self.rows[:self._last_row()])
+        self._read([values])
+        return values
+
+    def batch_get(self, ranges, **kwargs):
+        self._call('batch_get')
+        return [self._range_values(rng.split('!')[-1]) for rng in ranges]
+
+    def _range_values(self, rng):
+        start, _, end = rng.partition(':')
+        end = end or start
+        m1 = re.match(r"([A-Z]+)(\d*)", start)
+        m2 = re.match(r"([A-Z]+)(\d*)", end)
+        c1, c2 = _column_number(m1.group(1)), _column_number(m2.group(1))
+        r1 = int(m1.group(2)) if m1.group(2) else 1
+        r2 = int(m2.group(2)) if m2.group(2) else self._last_row()
+        values = [_trim(self.rows[r - 1][c1 - 1:c2]) for r in range(r1, min(r2, len(self.rows)) + 1)]
+        while values and not values[-1]:
+            values.pop()
+        return self._read(values)
+
+    # === WRITES ===
+
+    def append_row(self, values, **kwargs):
+        self._append('append_row', [values])
+
+    def append_rows(self, values, **kwargs):
+        self._append('append_rows', values)
+
+    def _append(self, name, values):
+        self._call(name)
+        last = self._last_row()
+        del self.rows[last:]
+        for row in values:
+            self.rows.append([_cell(v) for v in row])
+            self.cells_written += len(row)
+        self._written()
+
+    def insert_row(self, values, index=1, **kwargs):
+        self._call('insert_row')
+        self.rows.insert(index - 1, [_cell(v) for v in values])
+        self.cells_written += len(values)
+        self._written()
+
+    def update_cell(self, row, col, value):
+        self._call('update_cell')
+        self._set(row, col, value)
+        self._written()
+
+    def batch_update(self, data, **kwargs):
+        self._call('batch_update')
+        for item in data:
+            start = item['range'].split('!')[-1].split(':')[0]
+            row, col = a1_to_rowcol(start)
+            for i, values in enumerate(item['values']):
+                for j, value in enumerate(values):
+                    self._set(row + i, col + j, value)
+        self._written()
+
+
+MARKETS = ['Hàng hóa', 'Tiền tệ', 'Stock Việt', 'Crypto']
+STYLES = ['Scalp', 'Day', 'Swing']
+
+
+def synthetic_journal(count, seed=0, start_year=2023):
+    """Header + `count` trade rows over ~3 years, ~10% still Pending"""
+    rnd = random.Random(seed)
+    rows = [list(HEADERS)]
+    for trade_id in range(1, count + 1):
+        direction = rnd.choice(['BUY', 'SELL'])
+        entry = round(rnd.uniform(1, 3000), 2)
+        distance = entry * rnd.uniform(0.002, 0.02)
+        sl = round(entry - distance if direction == 'BUY' else entry + distance, 2)
+        status = rnd.choices(['Closed', 'BE', 'Pending', 'Cancelled'], [70, 12, 10, 8])[0]
+        pnl = ''
+        if status == 'Closed':
+            pnl = str(rnd.choice([-1, -1, -0.5, 1, 1.5, 2, 3]))
+        elif status == 'BE':
+            pnl = '0'
+        rows.append([
+            str(trade_id),
+            f"{start_year + rnd.randint(0, 2)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} "
+            f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}",
+            rnd.choice(MARKETS),
+            rnd.choice(STYLES),
+            direction,
+            rnd.choice(['XAUUSD', 'EURUSD', 'BTCUSDT', 'VNM', 'FPT', 'USOIL']),
+            str(entry),
+            str(sl),
+            str(rnd.choice([0.5, 1, 1, 1.5, 2])),
+            f"https://www.tradingview.com/x/{rnd.getrandbits(40):x}/",
+            'Breakout + retest vùng cung cầu, volume xác nhận ' * rnd.randint(0, 3),
+            '',
+            status,
+            pnl,
+            'Dời SL về entry sau 1R' if rnd.random() < 0.2 else '',
+        ])
+    return rows
@@ -0,0 +1,304 @@
+"""Load test of the Telegram handlers with synthetic updates, no Telegram access.
+
+    python -m benchmarks.load_ptb                              # 1 / 5 / 20 / 50 users, fake sheet
+    python -m benchmarks.load_ptb --users 10 --latency 0.3     # slow Sheets round-trips
+    python -m benchmarks.load_ptb --backend sqlite --output load.json
+    python -m benchmarks.load_ptb --concurrent-updates 1       # one update at a time
+    python -m benchmarks.load_ptb --backend env                # STORAGE_BACKEND from env, WRITES REAL TRADES
+
+Builds the Application from main.build_application() (same handlers and
+ConversationHandlers as the bot) around a stub Bot that answers every API
+call locally. Each simulated user is its own private chat and loops over
+the new-trade, update-trade (move SL), report and open-risk flows by
+sending the callback queries / text messages a person would. Updates go
+through the application's update processor, so latency includes waiting
+for a slot when updates are not processed concurrently.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from collections import Counter, defaultdict
+
+from telegram import Update
+from telegram.ext import ExtBot
+from telegram.warnings import PTBUserWarning
+
+# per_message hints for the ConversationHandlers, same as in production
+warnings.filterwarnings('ignore', category=PTBUserWarning)
+
+FLOWS = ('new_trade', 'update_trade', 'report', 'open_risk')
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Load', 'username': 'load_test_bot'}
+
+
+class StubBot(ExtBot):
+    """ExtBot whose API requests never leave the process.
+
+    Answers like Telegram would (sent/edited messages are echoed back),
+    counts calls per endpoint and keeps the last keyboard of every chat.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(token='123456:LOADTEST')
+        with self._unfrozen():
+            self.latency = latency
+            self.calls = Counter()
+            self.keyboards = {}  # chat_id -> last InlineKeyboardMarkup
+            self._message_ids = itertools.count(1_000_000)
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint == 'getMe':
+            return dict(BOT_USER)
+        if endpoint in ('sendMessage', 'editMessageText'):
+            chat_id = data['chat_id']
+            if data.get('reply_markup') is not None:
+                self.keyboards[chat_id] = data['reply_markup']
+            return {
+                'message_id': data.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': dict(BOT_USER),
+                'text': data.get('text', ''),
+            }
+        return True
+
+    def buttons(self, chat_id, prefix):
+        markup = self.keyboards.get(chat_id)
+        if markup is None:
+            return []
+        return [b for row in markup.inline_keyboard for b in row
+                if (b.callback_data or '').startswith(prefix)]
+
+
+class SimulatedUser:
+    """One private chat sending updates, timing each one end to end"""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, user_id, application, bot, think, samples):
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+        self.chat = {'id': user_id, 'type': 'private'}
+        self.application = application
+        self.bot = bot
+        self.think = think
+        self.samples = samples  # flow -> [seconds per update]
+        self.message_id = None
+
+    def _message(self, text=None):
+        message = {'message_id': self.message_id or 1, 'date': int(time.time()),
+                   'chat': self.chat, 'text': text or 'menu'}
+        if text is not None:
+            message['from'] = self.user
+        return message
+
+    async def _send(self, flow, payload):
+        update = Update.de_json({'update_id': next(self._update_ids), **payload}, self.bot)
+        processor = self.application.update_processor
+        start = time.perf_counter()
+        await processor.process_update(update, self.application.process_update(update))
+        self.samples[flow].append(time.perf_counter() - start)
+        if self.think:
+            await asyncio.sleep(random.uniform(0, 2 * self.think))
+
+    async def tap(self, flow, data):
+        await self._send(flow, {'callback_query': {
+            'id': str(random.getrandbits(32)), 'from': self.user, 'chat_instance': str(self.chat['id']),
+            'data': data, 'message': self._message(),
+        }})
+
+    async def type(self, flow, text):
+        self.message_id = (self.message_id or 1) + 1
+        await self._send(flow, {'message': self._message(text)})
+
+    async def new_trade(self):
+        for data in ('new_trade', 'market_tiente', 'style_day', 'dir_buy'):
+            await self.tap('new_trade', data)
+        await self.type('new_trade', 'EURUSD 1.1 1.09 1')
+        await self.tap('new_trade', 'skip_chart')
+        await self.type('new_trade', 'Load test: breakout + retest')
+        await self.tap('new_trade', 'confirm_trade')
+
+    async def update_trade(self):
+        await self.tap('update_trade', 'update_trade')
+        buttons = self.bot.buttons(self.chat['id'], 'select_')
+        if not buttons:
+            return
+        button = random.choice(buttons)
+        await self.tap('update_trade', button.callback_data)
+        await self.tap('update_trade', 'action_movesl')
+        # Move SL to entry (button text: "#id TICKER DIR @ entry (Risk: r%)")
+        entry = re.search(r'@ (\S+)', button.text)
+        await self.type('update_trade', entry.group(1) if entry else '1')
+
+    async def report(self):
+        for data in ('report', 'period_month', 'detail_market_month'):
+            await self.tap('report', data)
+
+    async def open_risk(self):
+        await self.tap('open_risk', 'open_risk')
+
+    async def run(self, rounds):
+        flows = list(FLOWS)
+        random.shuffle(flows)  # users do not move in lockstep
+        for i in range(rounds):
+            await getattr(self, flows[i % len(flows)])()
+
+
+def _percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def summarize(samples, elapsed):
+    every = [s for values in samples.values() for s in values]
+    p50, p95, p99 = _percentiles(every)
+    result = {
+        'updates': len(every),
+        'updates_per_s': round(len(every) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(p50 * 1000, 2),
+        'p95_ms': round(p95 * 1000, 2),
+        'p99_ms': round(p99 * 1000, 2),
+        'max_ms': round(max(every, default=0) * 1000, 2),
+        'flows': {},
+    }
+    for flow, values in samples.items():
+        p50, p95, p99 = _percentiles(values)
+        result['flows'][flow] = {'updates': len(values), 'p50_ms': round(p50 * 1000, 2),
+                                 'p95_ms': round(p95 * 1000, 2), 'p99_ms': round(p99 * 1000, 2)}
+    return result
+
+
+async def run_stage(application, bot, users, rounds, think):
+    samples = defaultdict(list)
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(context.error)
+    application.add_error_handler(on_error)
+
+    # Fresh chat ids per stage, so no conversation is left half way
+    base = 10_000 + users * 1_000
+    simulated = [SimulatedUser(base + i, application, bot, think, samples) for i in range(users)]
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(u.run(rounds) for u in simulated))
+    finally:
+        application.remove_error_handler(on_error)
+    elapsed = time.perf_counter() - start
+
+    result = summarize(samples, elapsed)
+    result.update(users=users, errors=len(errors), seconds=round(elapsed, 2))
+    if errors:
+        result['first_error'] = repr(errors[0])
+    return result
+
+
+def prepare_env(backend):
+    """Keep `import main` offline: no sheet at import time, no outbox, no quota waits"""
+    if backend == 'env':
+        return
+    os.environ['STORAGE_BACKEND'] = 'sqlite'
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='load_ptb_'), 'journal.db')
+    os.environ['OUTBOX_PATH'] = ''
+    os.environ.setdefault('SHEETS_READS_PER_MINUTE', '100000000')
+    os.environ.setdefault('SHEETS_WRITES_PER_MINUTE', '100000000')
+
+
+def make_storage(backend, size, latency):
+    """Storage handler for the bot's facade"""
+    from benchmarks.fake_sheet import FakeWorksheet, synthetic_journal
+    from sheets_handler import SheetsHandler
+    from storage import create_storage
+    from trade import Trade
+
+    if backend == 'env':
+        return create_storage()
+    rows = synthetic_journal(size, seed=size)
+    if backend == 'fake':
+        return SheetsHandler(worksheet=FakeWorksheet(rows, latency=latency))
+    store = create_storage()
+    store.import_trades([Trade.from_row(rows[0], r) for r in rows[1:]])
+    return store
+
+
+async def run(args):
+    import main
+    logging.getLogger().setLevel(logging.WARNING)  # keep the table readable
+
+    await main.sheets.connect(lambda: make_storage(args.backend, args.size, args.latency))
+    if args.concurrent_updates is None:
+        args.concurrent_updates = main.CONCURRENT_UPDATES
+
+    bot = StubBot(latency=args.bot_latency)
+    application = main.build_application(bot=bot, concurrent_updates=args.concurrent_updates)
+    results = []
+    async with application:
+        # Warm the trade cache like the first request after startup would
+        await main.sheets.refresh_cache()
+        for users in args.users:
+            bot.calls.clear()
+            result = await run_stage(application, bot, users, args.rounds, args.think)
+            result['bot_calls'] = dict(bot.calls)
+            results.append(result)
+            print(f"{users:>6} {result['updates']:>8} {result['errors']:>7} {result['updates_per_s']:>9} "
+                  f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} {result['max_ms']:>9}")
+            if args.verbose:
+                for flow, r in sorted(result['flows'].items()):
+                    print(f"{'':>6} {flow:<16} {r['updates']:>6} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+            if result.get('first_error'):
+                print(f"{'':>6} ❌ {result['first_error']}")
+    main.sheets.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 5, 20, 50],
+                        help='concurrent users, one stage per value')
+    parser.add_argument('--rounds', type=int, default=8, help='flows per user per stage')
+    parser.add_argument('--backend', choices=['fake', 'sqlite', 'env'], default='fake')
+    parser.add_argument('--size', type=int, default=1000, help='synthetic journal size (fake / sqlite)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per fake Sheets API call')
+    parser.add_argument('--bot-latency', type=float, default=0.0, help='seconds per Telegram API call')
+    parser.add_argument('--concurrent-updates', type=int,
+                        help='updates processed at once (default: CONCURRENT_UPDATES, as in the bot)')
+    parser.add_argument('--think', type=float, default=0.0, help='mean pause between taps (seconds)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('-v', '--verbose', action='store_true', help='per-flow percentiles')
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    prepare_env(args.backend)
+    print(f"{'users':>6} {'updates':>8} {'errors':>7} {'upd/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    results = asyncio.run(run(args))
+
+    if args.output:
+        meta = {'python': platform.python_version(), 'backend': args.backend, 'size': args.size,
+                'concurrent_updates': args.concurrent_updates,
+                'latency': args.latency, 'bot_latency': args.bot_latency, 'rounds': args.rounds,
+                'think': args.think}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=1)
+    return 1 if any(r['errors'] for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
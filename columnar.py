@@ -0,0 +1,148 @@
+import numpy as np
+from timeutil import to_epoch
+
+NO_TIME = np.iinfo(np.int64).min  # trades without a valid timestamp
+
+CATEGORICAL = ('market', 'style', 'direction', 'status')
+CATEGORY_FIELDS = {'Thị trường': 'market', 'Kiểu': 'style', 'Hướng': 'direction'}
+
+
+class ColumnarTrades:
+    """Array-backed copy of the journal for vectorized analytics.
+
+    Entry/SL/Risk%/PnL_R are float64, timestamps int64 epoch seconds and
+    market/style/direction/status int32 codes into per-column category
+    lists, copied from Trade records; update_trade() edits or appends in place.
+    """
+
+    def __init__(self, trades=(), capacity=1024):
+        trades = list(trades)
+        capacity = max(capacity, len(trades))
+        self.size = 0
+        self._pos = {}  # trade ID -> array position
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.ts = np.full(capacity, NO_TIME, dtype=np.int64)
+        self.entry = np.full(capacity, np.nan)
+        self.sl = np.full(capacity, np.nan)
+        self.risk = np.zeros(capacity)
+        self.pnl = np.zeros(capacity)
+        self.codes = {name: np.zeros(capacity, dtype=np.int32) for name in CATEGORICAL}
+        self.categories = {name: [] for name in CATEGORICAL}
+        self._code_of = {name: {} for name in CATEGORICAL}
+        for trade in trades:
+            self.update_trade(trade)
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        for name in ('ids', 'ts', 'entry', 'sl', 'risk', 'pnl'):
+            old = getattr(self, name)
+            fill = NO_TIME if name == 'ts' else (np.nan if name in ('entry', 'sl') else 0)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        for name, old in self.codes.items():
+            new = np.zeros(capacity, dtype=np.int32)
+            new[:self.size] = old[:self.size]
+            self.codes[name] = new
+
+    def code(self, name, value):
+        """Category code of a value, added to the category list if new"""
+        value = str(value)
+        codes = self._code_of[name]
+        if value not in codes:
+            codes[value] = len(self.categories[name])
+            self.categories[name].append(value)
+        return codes[value]
+
+    def update_trade(self, trade):
+        """Copy one Trade into its row, append if new"""
+        trade_id = trade.id
+        pos = self._pos.get(trade_id)
+        if pos is None:
+            if self.size == len(self.ids):
+                self._grow()
+            pos = self.size
+            self.size += 1
+            self._pos[trade_id] = pos
+
+        self.ids[pos] = trade_id
+        self.ts[pos] = NO_TIME if trade.epoch is None else trade.epoch
+        self.entry[pos] = np.nan if trade.entry is None else trade.entry
+        self.sl[pos] = np.nan if trade.sl is None else trade.sl
+        self.risk[pos] = trade.risk
+        self.pnl[pos] = trade.pnl
+        for name in CATEGORICAL:
+            self.codes[name][pos] = self.code(name, getattr(trade, name))
+
+    # === QUERIES ===
+
+    def mask(self, start_date=None, end_date=None, **filters):
+        """Boolean row mask: period plus filters like status='Pending' or market=['A', 'B']"""
+        n = self.size
+        result = np.ones(n, dtype=bool)
+        start = to_epoch(start_date)
+        end = to_epoch(end_date)
+        if start is not None:
+            result &= self.ts[:n] >= start
+        if end is not None:
+            result &= (self.ts[:n] <= end) & (self.ts[:n] != NO_TIME)
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            wanted_codes = [self._code_of[name][v] for v in values if v in self._code_of[name]]
+            codes = self.codes[name][:n]
+            if len(wanted_codes) <= 4:
+                # A few equality tests beat np.isin / lookup tables
+                match = np.zeros(n, dtype=bool)
+                for code in wanted_codes:
+                    match |= codes == code
+                result &= match
+            else:
+                table = np.zeros(len(self.categories[name]) + 1, dtype=bool)
+                table[wanted_codes] = True
+                result &= table[codes]
+        return result
+
+    def closed_mask(self, start_date=None, end_date=None, **filters):
+        return self.mask(start_date, end_date, status=['Closed', 'BE'], **filters)
+
+    def stats(self, start_date=None, end_date=None, **filters):
+        """get_stats result, vectorized, with optional market/style/direction filters"""
+        # Masked reductions instead of boolean indexing, no copies of the columns
+        closed = self.closed_mask(start_date, end_date, **filters)
+        pnl = self.pnl[:self.size]
+        total = int(np.count_nonzero(closed))
+        wins = int(np.count_nonzero((pnl > 0) & closed))
+        be_code = self._code_of['status'].get('BE', -1)
+        be = int(np.count_nonzero((self.codes['status'][:self.size] == be_code) & closed))
+        return {
+            'winrate': round(wins / total * 100, 1) if total else 0,
+            'total_pnl': round(float(np.dot(pnl, closed)), 2) if total else 0,
+            'total_trades': total,
+            'wins': wins,
+            'losses': int(np.count_nonzero((pnl < 0) & closed)),
+            'be': be
+        }
+
+    def stats_by_category(self, category, start_date=None, end_date=None, **filters):
+        """get_stats_by_category result, vectorized"""
+        name = CATEGORY_FIELDS.get(category, category)
+        closed = self.closed_mask(start_date, end_date, **filters)
+        codes = self.codes[name][:self.size]
+        pnl = self.pnl[:self.size]
+
+        result = {}
+        for code, key in enumerate(self.categories[name]):
+            # Few categories (markets, styles): one masked pass each
+            selected = closed & (codes == code)
+            trades = int(np.count_nonzero(selected))
+            if not trades:
+                continue
+            wins = int(np.count_nonzero((pnl > 0) & selected))
+            result[key] = {
+                'winrate': round(wins / trades * 100, 1),
+                'pnl': round(float(np.dot(pnl, selected)), 2),
+                'trades': trades
+            }
+        return result
@@ -10,6 +10,8 @@ ADMIN_USER_ID = int(os.getenv('ADMIN_USER_ID', '123456789'))
 # Google Sheet ID
 SHEET_ID = os.getenv('SHEET_ID')
 SHEET_NAME = 'Trades'
+# Partial closes (Chốt 1 phần), one row per fill, created if missing
+FILLS_SHEET_NAME = os.getenv('FILLS_SHEET_NAME', 'Fills')
 
 # Timezone
 TIMEZONE = 'Asia/Tokyo'
@@ -17,3 +19,79 @@ TIMEZONE = 'Asia/Tokyo'
 # Report times
 REPORT_HOURS = [12, 20]  # 12:30 và 20:30
 REPORT_MINUTE = 30
+
+# Trade cache: reload the sheet after this many seconds
+# (catches manual edits in Google Sheets; 0 = always reload)
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '300'))
+
+# Stale cache is updated from new rows + the mutable columns only
+# (0 = reload the whole sheet every time; the reconcile job always does)
+DELTA_SYNC = os.getenv('DELTA_SYNC', '1') == '1'
+
+# Poll the sheet's modified time this often (seconds) and sync the cache
+# only when it changed, catches manual edits quickly (0 = off)
+CHANGE_POLL_SECONDS = int(os.getenv('CHANGE_POLL_SECONDS', '60'))
+
+# Google Sheets calls run on a thread pool off the event loop
+SHEETS_MAX_WORKERS = int(os.getenv('SHEETS_MAX_WORKERS', '4'))
+SHEETS_CALL_TIMEOUT = float(os.getenv('SHEETS_CALL_TIMEOUT', '30'))
+# Identical reads within this many seconds share one result (0 = only
+# reads that overlap in time)
+SINGLE_FLIGHT_GRACE = float(os.getenv('SINGLE_FLIGHT_GRACE', '2'))
+# Storage connects in the background after startup; an update arriving
+# before that waits at most this many seconds, then gets a "try again"
+STORAGE_READY_WAIT = float(os.getenv('STORAGE_READY_WAIT', '10'))
+
+# Sheets API quota (per minute, per service account) and 429 retries
+SHEETS_READS_PER_MINUTE = int(os.getenv('SHEETS_READS_PER_MINUTE', '60'))
+SHEETS_WRITES_PER_MINUTE = int(os.getenv('SHEETS_WRITES_PER_MINUTE', '60'))
+QUOTA_MAX_RETRIES = int(os.getenv('QUOTA_MAX_RETRIES', '5'))
+QUOTA_MAX_BACKOFF = float(os.getenv('QUOTA_MAX_BACKOFF', '32'))
+# Longest one call may wait for tokens and 429 retries before QuotaExceeded,
+# keep it below SHEETS_CALL_TIMEOUT so handlers get QuotaExceeded, not a timeout
+QUOTA_MAX_WAIT = float(os.getenv('QUOTA_MAX_WAIT', '20'))
+
+# Write-behind outbox: sheet writes are saved here first and sent by a
+# background worker (fly.toml points it at the /data volume, empty = write directly)
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', 'outbox.jsonl')
+OUTBOX_FLUSH_INTERVAL = float(os.getenv('OUTBOX_FLUSH_INTERVAL', '2'))
+OUTBOX_MAX_BACKOFF = float(os.getenv('OUTBOX_MAX_BACKOFF', '300'))
+
+# Warm start: the cached journal and report views are saved here every
+# SNAPSHOT_MINUTES and on shutdown, and loaded at boot followed by one
+# delta sync instead of downloading the whole sheet (fly.toml: /data volume, empty = off)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'journal.snapshot')
+SNAPSHOT_MINUTES = int(os.getenv('SNAPSHOT_MINUTES', '10'))
+
+# Storage backend:
+#   sheets        - Google Sheet is the database
+#   sqlite        - local SQLite only
+#   sqlite+sheets - SQLite is the source of truth, mirrored to the sheet
+#                   through the outbox for viewing
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sheets')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'journal.db')
+
+# Open-risk view is updated on every trade event and re-checked
+# against the sheet this often (minutes)
+RISK_RECONCILE_MINUTES = int(os.getenv('RISK_RECONCILE_MINUTES', '30'))
+
+# How updates arrive:
+#   polling - long polling getUpdates
+#   webhook - Telegram POSTs to WEBHOOK_PATH on the HTTP server below,
+#             checked against WEBHOOK_SECRET (A-Z, a-z, 0-9, _ and -)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Public HTTPS base URL registered with Telegram (https://<app>.fly.dev),
+# empty = serve only, e.g. to POST recorded updates locally
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Updates handled at the same time; one chat's updates and changes to one
+# trade still take turns
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '8'))
+
+# HTTP server for /metrics (Prometheus), /healthz, /readyz and the webhook, fly.toml internal_port
+HTTP_HOST = os.getenv('HTTP_HOST', '0.0.0.0')
+HTTP_PORT = int(os.getenv('HTTP_PORT', '8080'))
+# The port is public on Fly: /metrics and /readyz need "Authorization: Bearer
+# <METRICS_TOKEN>" (empty = always 403), /healthz stays open for the health check
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
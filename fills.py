@@ -0,0 +1,136 @@
+import bisect
+from dataclasses import dataclass, replace
+from typing import Optional
+from timeutil import now_timestamp, parse_timestamp, to_epoch
+from trade import parse_number, format_number
+
+
+@dataclass(frozen=True, slots=True)
+class Fill:
+    """One partial close: `percent` of the original size closed at `r` R"""
+    id: int
+    trade_id: int
+    timestamp: str
+    epoch: Optional[int]
+    percent: float
+    r: float
+
+    @classmethod
+    def create(cls, fill_id, trade_id, percent, r, timestamp=None):
+        timestamp = now_timestamp() if timestamp is None else timestamp
+        return cls(int(fill_id), int(trade_id), timestamp, parse_timestamp(timestamp), float(percent), float(r))
+
+    @classmethod
+    def from_row(cls, row):
+        """Fills sheet row (FILL_HEADERS order) -> Fill, None for the header or a broken row"""
+        cells = list(row) + [''] * (5 - len(row))
+        fill_id, trade_id, percent, r = (parse_number(cells[i]) for i in (0, 1, 3, 4))
+        if None in (fill_id, trade_id, percent, r) or not fill_id.is_integer() or not trade_id.is_integer():
+            return None
+        return cls.create(fill_id, trade_id, percent, r, str(cells[2] or '').strip())
+
+    @property
+    def realized_r(self):
+        """R this fill adds to the trade's result"""
+        return self.percent * self.r / 100
+
+    def to_row(self):
+        return [self.id, self.trade_id, self.timestamp, self.percent, self.r]
+
+
+def check_fill(status, percent, closed_pct):
+    """ValueError unless the trade is Pending and `percent` is a partial close of what is still open"""
+    if status != 'Pending':
+        raise ValueError(f"Lệnh đã {status or 'đóng'}, không chốt 1 phần được nữa")
+    remaining = 100 - closed_pct
+    if not 0 < percent < remaining:
+        raise ValueError(f"% chốt phải lớn hơn 0 và nhỏ hơn {format_number(round(remaining, 2))}% còn mở")
+
+
+class FillsLedger:
+    """Partial closes indexed by trade ID (running totals) and by time.
+
+    apply() gives Trade records their closed_pct / realized_r, so the
+    stats views count realized R and open risk only the size still open.
+    Fills are only ever added; add() ignores an ID it already has, so a
+    replayed outbox entry is harmless.
+    """
+
+    def __init__(self):
+        self._by_trade = {}  # trade ID -> [Fill], oldest first
+        self._totals = {}    # trade ID -> (closed %, realized R)
+        self._timeline = []  # sorted (epoch, fill ID, trade ID, realized R) of dated fills
+        self._ids = set()
+        self.max_id = 0
+
+    def rebuild(self, fills):
+        """Recompute from Fill records"""
+        self.__init__()
+        for fill in fills:
+            self.add(fill)
+
+    def copy(self):
+        """Copy that later adds do not change"""
+        other = FillsLedger.__new__(FillsLedger)
+        other._by_trade = {trade_id: list(fills) for trade_id, fills in self._by_trade.items()}
+        other._totals = dict(self._totals)
+        other._timeline = list(self._timeline)
+        other._ids = set(self._ids)
+        other.max_id = self.max_id
+        return other
+
+    def next_id(self):
+        self.max_id += 1
+        return self.max_id
+
+    def add(self, fill):
+        """Index one fill, False if its ID is already known"""
+        if fill.id in self._ids:
+            return False
+        self._ids.add(fill.id)
+        self.max_id = max(self.max_id, fill.id)
+        self._by_trade.setdefault(fill.trade_id, []).append(fill)
+        closed, realized = self._totals.get(fill.trade_id, (0.0, 0.0))
+        self._totals[fill.trade_id] = (closed + fill.percent, realized + fill.realized_r)
+        if fill.epoch is not None:
+            bisect.insort(self._timeline, (fill.epoch, fill.id, fill.trade_id, fill.realized_r))
+        return True
+
+    def totals(self, trade_id):
+        """(closed %, realized R) of a trade"""
+        return self._totals.get(int(trade_id), (0.0, 0.0))
+
+    def trade_ids(self):
+        """IDs of trades with at least one fill"""
+        return self._totals.keys()
+
+    def fills_of(self, trade_id):
+        return list(self._by_trade.get(int(trade_id), ()))
+
+    def all(self):
+        """Every fill, by ID"""
+        return sorted((f for fills in self._by_trade.values() for f in fills), key=lambda f: f.id)
+
+    def apply(self, trade):
+        """Trade record with the totals of its fills"""
+        totals = self._totals.get(trade.id)
+        if totals is None:
+            return trade
+        return replace(trade, closed_pct=totals[0], realized_r=totals[1])
+
+    def realized_between(self, trade_ids, start_date=None, end_date=None):
+        """R realized by fills of trade_ids dated in the period (inclusive bounds)"""
+        start = to_epoch(start_date)
+        end = to_epoch(end_date)
+        if start is None and end is None:
+            # Unbounded: running totals, undated fills included
+            return sum(self._totals[t][1] for t in trade_ids if t in self._totals)
+        lo = 0 if start is None else bisect.bisect_left(self._timeline, (start,))
+        hi = len(self._timeline) if end is None else bisect.bisect_left(self._timeline, (end + 1,))
+        return sum(r for _, _, trade_id, r in self._timeline[lo:hi] if trade_id in trade_ids)
+
+    def __contains__(self, fill_id):
+        return fill_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
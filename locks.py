@@ -0,0 +1,65 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from telegram.ext import BaseUpdateProcessor
+from metrics import LOCK_WAIT_SECONDS, LOCK_CONTENDED
+
+
+class KeyedLock:
+    """One asyncio.Lock per key (e.g. trade ID), created on demand, dropped when free.
+
+    Holders of the same key run one after another, different keys never
+    wait for each other. Wait times go to lock_wait_seconds{lock=name}.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._locks = {}  # key -> [asyncio.Lock, holders + waiters]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            lock = entry[0]
+            if lock.locked():
+                LOCK_CONTENDED.labels(self.name).inc()
+            start = time.perf_counter()
+            async with lock:
+                LOCK_WAIT_SECONDS.labels(self.name).observe(time.perf_counter() - start)
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        """Keys currently held or waited for"""
+        return len(self._locks)
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Up to max_concurrent_updates updates at once, one at a time per chat.
+
+    ConversationHandler state and user_data are not safe with concurrent
+    updates of the same user: quick taps would race. Updates without a
+    chat (e.g. inline queries) are not serialized.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._chats = KeyedLock('chat')
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            await coroutine
+            return
+        async with self._chats.hold(chat.id):
+            await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -2,11 +2,24 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (Application, CommandHandler, MessageHandler, 
                           CallbackQueryHandler, ConversationHandler, filters, ContextTypes)
-from config import BOT_TOKEN, ADMIN_USER_ID, TIMEZONE, REPORT_HOURS, REPORT_MINUTE
-from sheets_handler import SheetsHandler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from config import (BOT_TOKEN, ADMIN_USER_ID, TIMEZONE, REPORT_HOURS, REPORT_MINUTE, OUTBOX_PATH,
+                    RISK_RECONCILE_MINUTES, CHANGE_POLL_SECONDS, SNAPSHOT_MINUTES, HTTP_HOST, HTTP_PORT,
+                    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, CONCURRENT_UPDATES,
+                    METRICS_TOKEN)
+from storage import create_storage
+from async_sheets import AsyncSheetsHandler, StorageNotReady
+from outbox import run_outbox_worker
+from trade import format_number
+from quota import QuotaExceeded
+from metrics import track_handler, track_job, watch, metrics_endpoint
+from webserver import WebServer, require_token
+from webhook import TelegramWebhook
+from locks import KeyedLock, ChatUpdateProcessor
+import asyncio
 from datetime import datetime, timedelta
 import pytz
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import uuid
 import warnings
 
 # Suppress PTBUserWarning
@@ -26,8 +39,33 @@ MARKET, STYLE, DIRECTION, INPUT_LINE, CHART, REASON = range(6)
 UPDATE_SELECT, UPDATE_ACTION, UPDATE_INPUT = range(6, 9)
 REPORT_PERIOD, REPORT_DETAIL = range(9, 11)
 
-# Initialize sheets handler
-sheets = SheetsHandler()
+# Storage (STORAGE_BACKEND) behind the async facade, I/O runs off the event loop.
+# It connects in the background once the bot is up (post_init), so a slow
+# or failing Google login never blocks polling or the health checks
+sheets = AsyncSheetsHandler()
+_connect_task = None
+_outbox_task = None
+_scheduler = None
+
+# Updates run concurrently: every change to one trade holds its lock, so a
+# read-modify-write (move SL, partial close) never interleaves with another
+trade_locks = KeyedLock('trade')
+
+async def healthz(headers, body):
+    # The event loop answers: alive, even while storage is still connecting
+    return 200, 'text/plain', b'ok\n'
+
+async def readyz(headers, body):
+    # State only, the connect error text stays in the logs
+    status = 200 if sheets.handler is not None else 503
+    return status, 'text/plain', f"{sheets.status()['storage']}\n".encode()
+
+# /metrics for Prometheus and the health checks, served on the same event loop as the bot
+watch(sheets)
+http_server = WebServer(HTTP_HOST, HTTP_PORT)
+http_server.route('GET', '/metrics', require_token(METRICS_TOKEN, metrics_endpoint))
+http_server.route('GET', '/healthz', healthz)
+http_server.route('GET', '/readyz', require_token(METRICS_TOKEN, readyz))
 
 # Market mapping
 MARKET_MAP = {
@@ -96,6 +134,7 @@ def is_admin(user_id: int) -> bool:
     return user_id == ADMIN_USER_ID
 
 # Start command
+@track_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -112,6 +151,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 # Main menu handler
+@track_handler
 async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -125,6 +165,7 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === NEW TRADE FLOW ===
 
+@track_handler
 async def new_trade_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -139,6 +180,7 @@ async def new_trade_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return MARKET
 
+@track_handler
 async def market_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -154,6 +196,7 @@ async def market_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return STYLE
 
+@track_handler
 async def style_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -170,6 +213,7 @@ async def style_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return DIRECTION
 
+@track_handler
 async def direction_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -190,6 +234,7 @@ async def direction_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     return INPUT_LINE
 
+@track_handler
 async def input_line_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     parts = text.split()
@@ -241,6 +286,7 @@ async def input_line_received(update: Update, context: ContextTypes.DEFAULT_TYPE
 # Continue in next part...
 # ... (phần trên)
 
+@track_handler
 async def chart_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Handle photo
     if update.message.photo:
@@ -265,6 +311,7 @@ async def chart_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return REASON
 
+@track_handler
 async def skip_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -279,9 +326,12 @@ async def skip_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return REASON
 
+@track_handler
 async def reason_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reason = update.message.text.strip()
     context.user_data['reason'] = reason
+    # Same key for every confirm of this trade, so it is saved only once
+    context.user_data.setdefault('idempotency_key', uuid.uuid4().hex)
     
     # Show preview
     data = context.user_data
@@ -308,15 +358,19 @@ async def reason_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return REASON
 
+@track_handler
 async def confirm_trade(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     data = context.user_data
+    if 'idempotency_key' not in data:
+        # Double tap after the trade was already saved
+        return ConversationHandler.END
     
     # Save to sheet
     try:
-        trade_id = sheets.add_trade(data)
+        trade_id = await sheets.add_trade(data, data['idempotency_key'])
         
         await query.edit_message_text(
             "✅ *Đã lưu trade!*\n\n"
@@ -348,12 +402,13 @@ async def confirm_trade(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === UPDATE TRADE FLOW ===
 
+@track_handler
 async def update_trade_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     # Get pending trades
-    pending = sheets.get_pending_trades()
+    pending = await sheets.get_pending_trades()
     
     if not pending:
         await query.edit_message_text(
@@ -365,11 +420,11 @@ async def update_trade_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Create buttons for each trade
     buttons = []
     for trade in pending:
-        trade_id = trade.get('ID')
-        ticker = trade.get('Ticker', 'N/A')
-        direction = trade.get('Hướng', 'N/A')
-        entry = trade.get('Entry', 'N/A')
-        risk = trade.get('Risk%', 'N/A')
+        trade_id = trade.id
+        ticker = trade.ticker or 'N/A'
+        direction = trade.direction or 'N/A'
+        entry = format_number(trade.entry)
+        risk = format_number(trade.risk)
         
         button_text = f"#{trade_id} {ticker} {direction} @ {entry} (Risk: {risk}%)"
         buttons.append([InlineKeyboardButton(button_text, callback_data=f"select_{trade_id}")])
@@ -383,6 +438,7 @@ async def update_trade_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     return UPDATE_SELECT
 
+@track_handler
 async def trade_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -391,7 +447,7 @@ async def trade_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['selected_trade_id'] = trade_id
     
     # Get trade details
-    trade = sheets.get_trade_by_id(trade_id)
+    trade = await sheets.get_trade_by_id(trade_id)
     
     if not trade:
         await query.edit_message_text(
@@ -404,15 +460,20 @@ async def trade_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     details = (
         f"📋 *TRADE #{trade_id}*\n"
         "═══════════════════\n\n"
-        f"📊 Thị trường: *{trade.get('Thị trường')}*\n"
-        f"⏱️ Kiểu: *{trade.get('Kiểu')}*\n"
-        f"📈 Hướng: *{trade.get('Hướng')}*\n"
-        f"💹 Ticker: *{trade.get('Ticker')}*\n"
-        f"💰 Entry: *{trade.get('Entry')}*\n"
-        f"🛑 SL: *{trade.get('SL')}*\n"
-        f"⚠️ Risk: *{trade.get('Risk%')}%*\n"
-        f"📝 Lý do: _{trade.get('Lý do', 'N/A')}_\n\n"
+        f"📊 Thị trường: *{trade.market}*\n"
+        f"⏱️ Kiểu: *{trade.style}*\n"
+        f"📈 Hướng: *{trade.direction}*\n"
+        f"💹 Ticker: *{trade.ticker}*\n"
+        f"💰 Entry: *{format_number(trade.entry)}*\n"
+        f"🛑 SL: *{format_number(trade.sl)}*\n"
+        f"⚠️ Risk: *{format_number(trade.risk)}%*\n"
     )
+    if trade.closed_pct:
+        details += (
+            f"✂️ Đã chốt: *{format_number(round(trade.closed_pct, 2))}%* "
+            f"({round(trade.realized_r, 2):+}R), risk còn *{format_number(round(trade.remaining_risk, 2))}%*\n"
+        )
+    details += f"📝 Lý do: _{trade.reason or 'N/A'}_\n\n"
     
     # Quick action buttons
     action_buttons = [
@@ -434,6 +495,7 @@ async def trade_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_ACTION
 
+@track_handler
 async def action_win(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -449,6 +511,7 @@ async def action_win(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_INPUT
 
+@track_handler
 async def action_loss(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -464,6 +527,7 @@ async def action_loss(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_INPUT
 
+@track_handler
 async def action_be(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -471,10 +535,11 @@ async def action_be(update: Update, context: ContextTypes.DEFAULT_TYPE):
     trade_id = context.user_data.get('selected_trade_id')
     
     # Update sheet
-    sheets.update_trade_by_id(trade_id, {
-        'Trạng thái': 'Closed',
-        'PnL_R': 0
-    })
+    async with trade_locks.hold(trade_id):
+        await sheets.update_trade_by_id(trade_id, {
+            'Trạng thái': 'Closed',
+            'PnL_R': 0
+        })
     
     await query.edit_message_text(
         f"⚖️ *Trade #{trade_id} đã đóng ở BE*\n"
@@ -484,6 +549,7 @@ async def action_be(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ConversationHandler.END
 
+@track_handler
 async def action_movesl(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -499,6 +565,7 @@ async def action_movesl(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_INPUT
 
+@track_handler
 async def action_settp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -514,6 +581,7 @@ async def action_settp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_INPUT
 
+@track_handler
 async def action_partial(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -529,6 +597,7 @@ async def action_partial(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_INPUT
 
+@track_handler
 async def action_editreason(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -543,15 +612,17 @@ async def action_editreason(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPDATE_INPUT
 
+@track_handler
 async def action_cancel_trade(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     trade_id = context.user_data.get('selected_trade_id')
     
-    sheets.update_trade_by_id(trade_id, {
-        'Trạng thái': 'Cancelled'
-    })
+    async with trade_locks.hold(trade_id):
+        await sheets.update_trade_by_id(trade_id, {
+            'Trạng thái': 'Cancelled'
+        })
     
     await query.edit_message_text(
         f"🚫 *Trade #{trade_id} đã hủy*",
@@ -563,6 +634,7 @@ async def action_cancel_trade(update: Update, context: ContextTypes.DEFAULT_TYPE
 # Continue in next part...
 # ... (phần trên)
 
+@track_handler
 async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process input for update action"""
     text = update.message.text.strip()
@@ -573,10 +645,11 @@ async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TY
         if action == 'win' or action == 'loss':
             pnl = float(text)  # User enters 2.5 → Save 2.5, NOT 25
             
-            sheets.update_trade_by_id(trade_id, {
-                'Trạng thái': 'Closed',
-                'PnL_R': pnl  # FIX: No multiplication
-            })
+            async with trade_locks.hold(trade_id):
+                await sheets.update_trade_by_id(trade_id, {
+                    'Trạng thái': 'Closed',
+                    'PnL_R': pnl  # FIX: No multiplication
+                })
             
             emoji = "✅" if pnl > 0 else "❌"
             await update.message.reply_text(
@@ -586,19 +659,20 @@ async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TY
             
         elif action == 'movesl':
             new_sl = float(text)
-            trade = sheets.get_trade_by_id(trade_id)
-            
-            entry = float(trade['Entry'])
-            old_sl = float(trade['SL'])
-            old_risk = float(trade['Risk%'])
-            direction = trade['Hướng']
-            
-            new_risk = sheets.calculate_new_risk(entry, old_sl, new_sl, old_risk, direction)
-            
-            sheets.update_trade_by_id(trade_id, {
-                'SL': new_sl,
-                'Risk%': new_risk  # FIX: No multiplication
-            })
+            async with trade_locks.hold(trade_id):
+                trade = await sheets.get_trade_by_id(trade_id)
+                
+                entry = trade.entry
+                old_sl = trade.sl
+                old_risk = trade.risk
+                direction = trade.direction
+                
+                new_risk = sheets.calculate_new_risk(entry, old_sl, new_sl, old_risk, direction)
+                
+                await sheets.update_trade_by_id(trade_id, {
+                    'SL': new_sl,
+                    'Risk%': new_risk  # FIX: No multiplication
+                })
             
             risk_status = "Free risk!" if new_risk <= 0 else f"Risk mới: {new_risk}%"
             await update.message.reply_text(
@@ -608,7 +682,8 @@ async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TY
             
         elif action == 'settp':
             tp = float(text)
-            sheets.update_trade_by_id(trade_id, {'TP': tp})
+            async with trade_locks.hold(trade_id):
+                await sheets.update_trade_by_id(trade_id, {'TP': tp})
             await update.message.reply_text(
                 f"✅ TP đã set: {tp}",
                 reply_markup=main_menu_kb()
@@ -626,20 +701,27 @@ async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TY
             percent = float(parts[0])
             pnl = float(parts[1])  # FIX: No multiplication
             
-            trade = sheets.get_trade_by_id(trade_id)
-            note = trade.get('Ghi chú', '')
-            new_note = f"{note}\n✂️ {percent}% @ {pnl}R".strip()
-            
-            sheets.update_trade_by_id(trade_id, {'Ghi chú': new_note})
+            try:
+                async with trade_locks.hold(trade_id):
+                    fill = await sheets.add_fill(trade_id, percent, pnl)
+            except ValueError as e:
+                # More than what is still open
+                await update.message.reply_text(f"❌ {e}", reply_markup=cancel_kb())
+                return UPDATE_INPUT
             
-            await update.message.reply_text(
-                f"✅ Đã chốt {percent}% với {pnl}R\nTrade #{trade_id} vẫn đang mở",
-                reply_markup=main_menu_kb()
-            )
+            if fill is None:
+                await update.message.reply_text("❌ Không tìm thấy trade", reply_markup=main_menu_kb())
+            else:
+                await update.message.reply_text(
+                    f"✅ Đã chốt {format_number(percent)}% với {format_number(pnl)}R "
+                    f"({round(fill.realized_r, 2):+}R)\nTrade #{trade_id} vẫn đang mở",
+                    reply_markup=main_menu_kb()
+                )
             
         elif action == 'editreason':
             new_reason = text
-            sheets.update_trade_by_id(trade_id, {'Lý do': new_reason})
+            async with trade_locks.hold(trade_id):
+                await sheets.update_trade_by_id(trade_id, {'Lý do': new_reason})
             await update.message.reply_text(
                 "✅ Lý do đã cập nhật",
                 reply_markup=main_menu_kb()
@@ -656,6 +738,14 @@ async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TY
         )
         return UPDATE_INPUT
         
+    except QuotaExceeded:
+        # Keep the input state so the user can just send the value again
+        await update.message.reply_text(
+            "⏳ Google Sheets đang quá tải, gửi lại giá trị sau ít phút",
+            reply_markup=cancel_kb()
+        )
+        return UPDATE_INPUT
+        
     except Exception as e:
         logger.error(f"Error updating trade: {e}")
         await update.message.reply_text(
@@ -667,6 +757,7 @@ async def update_input_received(update: Update, context: ContextTypes.DEFAULT_TY
 
 # === REPORT FLOW ===
 
+@track_handler
 async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -686,6 +777,7 @@ async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return REPORT_PERIOD
 
+@track_handler
 async def period_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -694,17 +786,19 @@ async def period_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tz = pytz.timezone(TIMEZONE)
     now = datetime.now(tz)
     
+    # Timezone-aware boundaries, storage compares them as epoch seconds
     if period == 'today':
-        start = now.replace(hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
-        end = now.strftime('%Y-%m-%d %H:%M:%S')
+        start = tz.localize(datetime(now.year, now.month, now.day))
+        end = now
         period_text = "HÔM NAY"
     elif period == 'week':
-        start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
-        end = now.strftime('%Y-%m-%d %H:%M:%S')
+        monday = now - timedelta(days=now.weekday())
+        start = tz.localize(datetime(monday.year, monday.month, monday.day))
+        end = now
         period_text = "TUẦN NÀY"
     elif period == 'month':
-        start = now.replace(day=1, hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
-        end = now.strftime('%Y-%m-%d %H:%M:%S')
+        start = tz.localize(datetime(now.year, now.month, 1))
+        end = now
         period_text = "THÁNG NÀY"
     else:
         await query.edit_message_text(
@@ -714,18 +808,21 @@ async def period_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     # Get stats
-    stats = sheets.get_stats(start, end)
+    stats = await sheets.get_stats(start, end)
     
     report = f"📊 BÁO CÁO {period_text}\n\n"
     report += f"Winrate: {stats['winrate']}%\n"
     report += f"{stats['wins']}W-{stats['losses']}L-{stats['be']}BE\n"
     report += f"Tổng PnL: {stats['total_pnl']}R\n"  # ← FIX: Bỏ .2f nếu đã round
     report += f"Số lệnh: {stats['total_trades']}\n"
+    if stats.get('partial_r'):
+        report += f"✂️ Chốt 1 phần (lệnh đang mở): {stats['partial_r']:+}R\n"
 
     
     detail_buttons = [
         [InlineKeyboardButton("📊 Chi tiết Thị trường", callback_data=f"detail_market_{period}"),
          InlineKeyboardButton("⏱️ Chi tiết Kiểu trade", callback_data=f"detail_style_{period}")],
+        [InlineKeyboardButton("↕️ Chi tiết BUY/SELL", callback_data=f"detail_direction_{period}")],
         [InlineKeyboardButton("🔙 Menu", callback_data="main_menu")]
     ]
     
@@ -736,12 +833,13 @@ async def period_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return REPORT_DETAIL
 
+@track_handler
 async def detail_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     parts = query.data.split('_')
-    detail_type = parts[1]  # market or style
+    detail_type = parts[1]  # market, style or direction
     period = parts[2]
     
     # Get date range (same logic as above)
@@ -749,23 +847,31 @@ async def detail_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     now = datetime.now(tz)
     
     if period == 'today':
-        start = now.replace(hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
+        start = tz.localize(datetime(now.year, now.month, now.day))
     elif period == 'week':
-        start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
+        monday = now - timedelta(days=now.weekday())
+        start = tz.localize(datetime(monday.year, monday.month, monday.day))
     else:
-        start = now.replace(day=1, hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
+        start = tz.localize(datetime(now.year, now.month, 1))
     
-    end = now.strftime('%Y-%m-%d %H:%M:%S')
+    end = now
     
     # Get breakdown stats
     if detail_type == 'market':
         category = 'Thị trường'
         title = "📊 THEO THỊ TRƯỜNG"
+    elif detail_type == 'direction':
+        category = 'Hướng'
+        title = "↕️ THEO HƯỚNG"
     else:
         category = 'Kiểu'
         title = "⏱️ THEO KIỂU TRADE"
     
-    stats = sheets.get_stats_by_category(category, start, end)
+    if category == 'Hướng':
+        # Not in the day buckets of the stats view, the columnar copy groups any column
+        stats = await sheets.query_stats(start, end, category=category)
+    else:
+        stats = await sheets.get_stats_by_category(category, start, end)
     
     detail_text = f"{title}\n────────────────────\n\n"
     
@@ -786,13 +892,14 @@ async def detail_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === OPEN RISK ===
 
+@track_handler
 async def open_risk(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show current open risk - with refresh button"""
     query = update.callback_query
     await query.answer()  # Always answer callback first
     
     try:
-        risk_data = sheets.get_open_risk()
+        risk_data = await sheets.get_open_risk()
         pending_trades = risk_data.get('trades', [])
         
         if risk_data['count'] == 0:
@@ -822,10 +929,12 @@ async def open_risk(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if pending_trades:
                 msg += "📋 CHI TIẾT LỆNH:\n"
                 for idx, trade in enumerate(pending_trades[:10], 1):
-                    ticker = trade.get('Ticker', 'N/A')
-                    direction = trade.get('Hướng', 'N/A')
-                    risk = trade.get('Risk%', 0)
+                    ticker = trade.ticker or 'N/A'
+                    direction = trade.direction or 'N/A'
+                    risk = format_number(round(trade.remaining_risk, 2))
                     msg += f"{idx}. {ticker} {direction} - {risk}%\n"
+                    if trade.closed_pct:
+                        msg += f"   ✂️ đã chốt {format_number(round(trade.closed_pct, 2))}%\n"
                 
                 if len(pending_trades) > 10:
                     msg += f"\n... và {len(pending_trades) - 10} lệnh khác"
@@ -837,6 +946,9 @@ async def open_risk(update: Update, context: ContextTypes.DEFAULT_TYPE):
         tz = pytz.timezone(TIMEZONE)
         now = datetime.now(tz).strftime('%H:%M:%S')
         msg += f"\n\n🔄 Cập nhật: {now}"
+        sync_age = risk_data.get('sync_age')
+        if sync_age is not None:
+            msg += f"\n🗂️ Đồng bộ Sheet: {int(sync_age)}s trước"
         
         keyboard = [
             [InlineKeyboardButton("🔄 Refresh", callback_data='open_risk')],
@@ -859,6 +971,10 @@ async def open_risk(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # Re-raise other errors
                 raise
         
+    except (QuotaExceeded, asyncio.TimeoutError):
+        # Refresh spam (or a read still queued at the call timeout): keep the panel
+        await query.message.reply_text("⏳ Google Sheets đang quá tải, thử lại sau ít phút")
+        
     except Exception as e:
         print(f"❌ Error in open_risk: {e}")
         try:
@@ -883,7 +999,7 @@ async def open_risk(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def send_scheduled_risk_report(application: Application):
     """Send risk report at scheduled times - Show PENDING trades"""
     try:
-        risk_data = sheets.get_open_risk()
+        risk_data = await sheets.get_open_risk()
         pending_trades = risk_data.get('trades', [])  # Get pending trades list
         
         tz = pytz.timezone(TIMEZONE)
@@ -913,14 +1029,16 @@ async def send_scheduled_risk_report(application: Application):
             # CHI TIẾT LỆNH ĐANG MỞ (PENDING)
             report += "\n📋 CÁC LỆNH ĐANG MỞ:\n"
             for idx, trade in enumerate(pending_trades[:10], 1):
-                ticker = trade.get('Ticker', 'N/A')
-                direction = trade.get('Hướng', 'N/A')
-                entry = trade.get('Entry', 'N/A')
-                sl = trade.get('SL', 'N/A')
-                risk = trade.get('Risk%', 0)
+                ticker = trade.ticker or 'N/A'
+                direction = trade.direction or 'N/A'
+                entry = format_number(trade.entry)
+                sl = format_number(trade.sl)
+                risk = format_number(round(trade.remaining_risk, 2))
                 
                 report += f"{idx}. {ticker} {direction} @ {entry}\n"
                 report += f"   SL: {sl} | Risk: {risk}%\n"
+                if trade.closed_pct:
+                    report += f"   ✂️ Đã chốt {format_number(round(trade.closed_pct, 2))}%\n"
             
             if len(pending_trades) > 10:
                 report += f"\n... và {len(pending_trades) - 10} lệnh khác"
@@ -940,6 +1058,7 @@ async def send_scheduled_risk_report(application: Application):
 
 # === CANCEL HANDLER ===
 
+@track_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if query:
@@ -956,11 +1075,80 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     return ConversationHandler.END
 
+# Updates that hit an error (storage not connected yet, ...)
+async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
+    if isinstance(context.error, StorageNotReady) and isinstance(update, Update) and update.effective_message:
+        await update.effective_message.reply_text("⏳ Bot đang kết nối Google Sheets, thử lại sau ít giây")
+        return
+    logger.error("Exception while handling an update:", exc_info=context.error)
+
+# === STARTUP / SHUTDOWN ===
+
+def start_scheduler(application: Application):
+    """Scheduled risk reports and the storage consistency jobs"""
+    scheduler = AsyncIOScheduler(timezone=pytz.timezone(TIMEZONE))
+    for hour in REPORT_HOURS:
+        scheduler.add_job(
+            track_job(send_scheduled_risk_report),
+            'cron',
+            hour=hour,
+            minute=REPORT_MINUTE,
+            args=[application]
+        )
+    # Slow consistency check of the incremental open-risk view
+    scheduler.add_job(track_job(sheets.reconcile_open_risk), 'interval', minutes=RISK_RECONCILE_MINUTES)
+    if CHANGE_POLL_SECONDS > 0:
+        # Manual edits in the sheet reach the cache within one poll
+        scheduler.add_job(track_job(sheets.check_for_changes), 'interval', seconds=CHANGE_POLL_SECONDS)
+    if SNAPSHOT_MINUTES > 0:
+        # Warm-start file for the next deploy, skipped when nothing changed
+        scheduler.add_job(track_job(sheets.save_snapshot), 'interval', minutes=SNAPSHOT_MINUTES)
+    scheduler.start()
+    return scheduler
+
+async def post_init(application: Application):
+    global _connect_task, _outbox_task, _scheduler
+    await http_server.start()
+    # Runs while polling starts, handlers wait for it (STORAGE_READY_WAIT)
+    _connect_task = asyncio.create_task(sheets.connect(create_storage))
+    if OUTBOX_PATH:
+        # Also replays entries left over from before a restart
+        _outbox_task = asyncio.create_task(run_outbox_worker(sheets))
+    _scheduler = start_scheduler(application)
+
+async def post_shutdown(application: Application):
+    await http_server.stop()
+    if _scheduler:
+        _scheduler.shutdown(wait=False)
+    if _connect_task:
+        _connect_task.cancel()
+    if sheets.handler is not None:
+        try:
+            await sheets.save_snapshot()
+        except Exception as e:
+            logger.error(f"❌ Snapshot on shutdown failed: {e}")
+    if _outbox_task:
+        _outbox_task.cancel()
+        try:
+            # Last chance to send pending writes, the rest are replayed on next start
+            await sheets.flush_outbox()
+        except Exception as e:
+            logger.error(f"❌ Outbox flush on shutdown failed: {e}")
+
 # === MAIN ===
 
-def main():
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+def build_application(bot=None, concurrent_updates=1):
+    """Application with every handler registered (bot: e.g. a stub for load tests)"""
+    builder = Application.builder()
+    builder = builder.bot(bot) if bot is not None else builder.token(BOT_TOKEN)
+    application = (
+        builder
+        # Different chats in parallel, one chat's updates in order
+        .concurrent_updates(ChatUpdateProcessor(concurrent_updates))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Conversation handler for new trade
     new_trade_conv = ConversationHandler(
@@ -1028,20 +1216,23 @@ def main():
     application.add_handler(report_conv)
     application.add_handler(CallbackQueryHandler(open_risk, pattern='^open_risk$'))
     application.add_handler(CallbackQueryHandler(main_menu, pattern='^main_menu$'))
+    application.add_error_handler(on_error)
+    return application
+
+def main():
+    if BOT_MODE not in ('polling', 'webhook'):
+        raise ValueError(f"❌ Unknown BOT_MODE: {BOT_MODE}")
     
-    # Setup scheduler for automatic reports
-    scheduler = AsyncIOScheduler(timezone=pytz.timezone(TIMEZONE))
-    for hour in REPORT_HOURS:
-        scheduler.add_job(
-            send_scheduled_risk_report,
-            'cron',
-            hour=hour,
-            minute=REPORT_MINUTE,
-            args=[application]
-        )
-    scheduler.start()
+    application = build_application(concurrent_updates=CONCURRENT_UPDATES)
+    
+    # post_init connects storage and starts the scheduler in both modes
+    if BOT_MODE == 'webhook':
+        webhook = TelegramWebhook(application, WEBHOOK_SECRET)
+        http_server.route('POST', WEBHOOK_PATH, webhook)
+        logger.info("Bot started (webhook)!")
+        asyncio.run(webhook.serve(WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH if WEBHOOK_URL else None))
+        return
     
-    # Start bot
     logger.info("Bot started!")
     application.run_polling()
 
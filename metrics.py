@@ -0,0 +1,127 @@
+import functools
+import time
+from prometheus_client import (CollectorRegistry, Counter, Histogram, generate_latest,
+                               CONTENT_TYPE_LATEST)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REGISTRY = CollectorRegistry()
+
+# Telegram updates take a few Sheets round-trips at most
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HANDLER_SECONDS = Histogram(
+    'bot_handler_seconds', 'Telegram handler latency', ['handler'],
+    buckets=BUCKETS, registry=REGISTRY)
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors', 'Exceptions raised by Telegram handlers', ['handler'],
+    registry=REGISTRY)
+SHEETS_SECONDS = Histogram(
+    'sheets_call_seconds', 'Storage operation latency incl. thread pool wait', ['method'],
+    buckets=BUCKETS, registry=REGISTRY)
+SHEETS_ERRORS = Counter(
+    'sheets_call_errors', 'Failed storage operations (incl. timeouts)', ['method'],
+    registry=REGISTRY)
+JOB_SECONDS = Histogram(
+    'scheduler_job_seconds', 'Scheduled job duration', ['job'],
+    buckets=BUCKETS, registry=REGISTRY)
+JOB_ERRORS = Counter(
+    'scheduler_job_errors', 'Failed scheduled jobs', ['job'], registry=REGISTRY)
+# Per-key locks (KeyedLock): mostly uncontended, waits are as long as a Sheets write
+LOCK_WAIT_SECONDS = Histogram(
+    'lock_wait_seconds', 'Time waiting for a keyed lock', ['lock'],
+    buckets=(0.0001, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30), registry=REGISTRY)
+LOCK_CONTENDED = Counter(
+    'lock_contended', 'Keyed lock acquisitions that had to wait', ['lock'], registry=REGISTRY)
+WEBHOOK_UPDATES = Counter(
+    'webhook_updates', 'Webhook POSTs by result (accepted, forbidden, draining, bad_request)',
+    ['result'], registry=REGISTRY)
+
+
+def _timed(histogram, errors, name, func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.labels(name).inc()
+            raise
+        finally:
+            histogram.labels(name).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def track_handler(func):
+    """Decorator: latency and errors of a Telegram handler"""
+    return _timed(HANDLER_SECONDS, HANDLER_ERRORS, func.__name__, func)
+
+
+def track_job(func, name=None):
+    """Wrap a scheduler job coroutine function with duration/error metrics"""
+    return _timed(JOB_SECONDS, JOB_ERRORS, name or func.__name__, func)
+
+
+async def observe_call(method, awaitable):
+    """Await a storage call, recording its latency and errors"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    except Exception:
+        SHEETS_ERRORS.labels(method).inc()
+        raise
+    finally:
+        SHEETS_SECONDS.labels(method).observe(time.perf_counter() - start)
+
+
+class RuntimeCollector:
+    """Connection, cache, quota, queue and single-flight numbers read at scrape time"""
+
+    def __init__(self, sheets):
+        self.sheets = sheets  # AsyncSheetsHandler
+
+    def collect(self):
+        handler = self.sheets.handler
+        yield GaugeMetricFamily(
+            'storage_ready', '1 once the storage backend is connected', value=int(handler is not None))
+        stats = handler.get_runtime_stats() if handler is not None else {}
+
+        cache = stats.get('cache')
+        if cache:
+            lookups = CounterMetricFamily(
+                'sheets_cache_lookups', 'Cache lookups by result', labels=['result'])
+            for result, count in cache.items():
+                lookups.add_metric([result], count)
+            yield lookups
+            total = sum(cache.values())
+            yield GaugeMetricFamily(
+                'sheets_cache_hit_ratio', 'Share of cache lookups served without any API read',
+                value=cache.get('hits', 0) / total if total else 0)
+
+        quota = stats.get('quota')
+        if quota:
+            events = CounterMetricFamily(
+                'sheets_quota_events', 'Sheets API calls and throttling', labels=['event'])
+            for event, count in quota.items():
+                events.add_metric([event], count)
+            yield events
+
+        queues = GaugeMetricFamily('queue_depth', 'Items waiting in queues', labels=['queue'])
+        for queue, depth in stats.get('queues', {}).items():
+            queues.add_metric([queue], depth)
+        queues.add_metric(['reads_in_flight'], len(self.sheets._inflight))
+        yield queues
+
+        shared = CounterMetricFamily(
+            'sheets_single_flight', 'Facade reads by how they were served', labels=['result'])
+        for result, count in self.sheets.single_flight.items():
+            shared.add_metric([result], count)
+        yield shared
+
+
+def watch(sheets):
+    """Export runtime numbers of an AsyncSheetsHandler"""
+    REGISTRY.register(RuntimeCollector(sheets))
+
+
+async def metrics_endpoint(headers, body):
+    return 200, CONTENT_TYPE_LATEST, generate_latest(REGISTRY)
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from config import OUTBOX_FLUSH_INTERVAL, OUTBOX_MAX_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Append-only JSONL file of sheet writes not yet sent to Google.
+    
+    Every entry is fsync'ed before append() returns, so a crash or redeploy
+    never loses an acknowledged write. Entries are removed by ack() once
+    the sheet has them; whatever is left is replayed on the next start.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._entries = self._load()
+        self._seq = max((e['seq'] for e in self._entries), default=0)
+        if self._entries:
+            logger.info(f"📤 Outbox: {len(self._entries)} unsent entries to replay")
+    
+    def _load(self):
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn last line from a crash mid-write, it was never acknowledged
+                    logger.warning(f"⚠️ Outbox: skipping corrupt line {line[:50]!r}")
+        return entries
+    
+    def append(self, op, trade_id, **fields):
+        """Durably record a write ('add' with row=..., 'update' with updates=...)"""
+        with self._lock:
+            self._seq += 1
+            entry = {'seq': self._seq, 'op': op, 'trade_id': trade_id, **fields}
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries.append(entry)
+            return entry
+    
+    def pending(self):
+        """Unsent entries, oldest first"""
+        with self._lock:
+            return list(self._entries)
+    
+    def ack(self, seqs):
+        """Drop entries that reached the sheet"""
+        seqs = set(seqs)
+        with self._lock:
+            self._entries = [e for e in self._entries if e['seq'] not in seqs]
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+async def run_outbox_worker(sheets, interval=OUTBOX_FLUSH_INTERVAL, max_backoff=OUTBOX_MAX_BACKOFF):
+    """Drain the outbox to Google Sheets forever, exponential backoff on errors"""
+    delay = interval
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            sent = await sheets.flush_outbox()
+            if sent:
+                logger.info(f"📤 Outbox: sent {sent} entries")
+            delay = interval
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            delay = min(delay * 2, max_backoff)
+            logger.warning(f"⚠️ Outbox flush failed, retry in {delay:.0f}s: {e}")
@@ -0,0 +1,212 @@
+import copy
+import functools
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from config import (SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE,
+                    QUOTA_MAX_RETRIES, QUOTA_MAX_BACKOFF, QUOTA_MAX_WAIT)
+
+# gspread methods that cost one Sheets/Drive API request
+READ_METHODS = {
+    'get_all_values', 'get_all_records', 'get_values', 'batch_get', 'get',
+    'row_values', 'col_values', 'acell', 'cell', 'get_lastUpdateTime', 'worksheet',
+}
+WRITE_METHODS = {
+    'append_row', 'append_rows', 'insert_row', 'insert_rows', 'update',
+    'update_cell', 'update_cells', 'batch_update', 'delete_rows',
+}
+
+# Read tokens background reads leave for interactive ones
+BACKGROUND_RESERVE = 5
+
+
+class QuotaExceeded(Exception):
+    """Google API still answered 429 after all retries, or no token within max_wait"""
+
+
+def is_rate_limited(error):
+    """gspread APIError (or any error with an HTTP response) for status 429"""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+class TokenBucket:
+    """per_minute tokens refilled continuously, bursts up to capacity"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def wait_time(self, reserve=0):
+        """Seconds until a token is free above reserve, 0 = now"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1 + reserve:
+            return 0
+        return (1 + reserve - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class QuotaManager:
+    """Rate limiter in front of every gspread call.
+
+    Reads and writes have their own token bucket (Sheets quotas are per
+    minute, separately for reads and writes). A 429 pauses all calls of
+    that kind with exponential backoff plus jitter, up to max_wait
+    seconds per call in total. Background reads
+    (inside background()) wait while writes are queued and keep a few
+    read tokens for interactive calls. Identical reads already in flight
+    share one request.
+    """
+
+    def __init__(self, reads_per_minute=SHEETS_READS_PER_MINUTE,
+                 writes_per_minute=SHEETS_WRITES_PER_MINUTE,
+                 max_retries=QUOTA_MAX_RETRIES, max_backoff=QUOTA_MAX_BACKOFF,
+                 max_wait=QUOTA_MAX_WAIT):
+        self.buckets = {
+            'read': TokenBucket(reads_per_minute),
+            'write': TokenBucket(writes_per_minute),
+        }
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._paused_until = {'read': 0.0, 'write': 0.0}
+        self._writers_waiting = 0
+        self._inflight = {}  # read key -> [Future, waiters]
+        self._local = threading.local()
+        self.counters = {
+            'reads': 0,
+            'writes': 0,
+            'throttled': 0,      # calls that waited for a token or a 429 pause
+            'rate_limited': 0,   # 429 answers
+            'coalesced': 0,      # reads served by an identical read in flight
+            'quota_exceeded': 0, # calls given up after max_retries
+        }
+
+    def _count(self, name):
+        with self._cond:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        """Copy of the counters"""
+        with self._cond:
+            return dict(self.counters)
+
+    @contextmanager
+    def background(self):
+        """Mark reads in this thread as background work (polls, reconcile)"""
+        self._local.background = True
+        try:
+            yield
+        finally:
+            self._local.background = False
+
+    def _acquire(self, kind, deadline):
+        background = kind == 'read' and getattr(self._local, 'background', False)
+        reserve = BACKGROUND_RESERVE if background else 0
+        bucket = self.buckets[kind]
+        waited = False
+        with self._cond:
+            if kind == 'write':
+                self._writers_waiting += 1
+            try:
+                while True:
+                    if background and self._writers_waiting:
+                        delay = 0.5  # woken early when the writes are through
+                    else:
+                        delay = max(bucket.wait_time(reserve), self._paused_until[kind] - time.monotonic())
+                    if delay <= 0:
+                        bucket.take()
+                        break
+                    if time.monotonic() + delay > deadline:
+                        self.counters['quota_exceeded'] += 1
+                        raise QuotaExceeded(f"Google Sheets {kind} quota: no token within {self.max_wait:.0f}s")
+                    waited = True
+                    self._cond.wait(delay)
+            finally:
+                if kind == 'write':
+                    self._writers_waiting -= 1
+                    self._cond.notify_all()
+            if waited:
+                self.counters['throttled'] += 1
+
+    def _call_with_retry(self, kind, func, args, kwargs):
+        deadline = time.monotonic() + self.max_wait
+        for attempt in range(self.max_retries + 1):
+            self._acquire(kind, deadline)
+            self._count(kind + 's')
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                self._count('rate_limited')
+                if attempt == self.max_retries:
+                    self._count('quota_exceeded')
+                    raise QuotaExceeded(f"Google Sheets {kind} quota exceeded") from e
+                delay = min(self.max_backoff, 2 ** attempt) + random.random()
+                if time.monotonic() + delay > deadline:
+                    self._count('quota_exceeded')
+                    raise QuotaExceeded(f"Google Sheets {kind} quota exceeded") from e
+                print(f"⏳ Sheets {kind} quota hit (429), retry in {delay:.1f}s")
+                with self._cond:
+                    self._paused_until[kind] = max(self._paused_until[kind], time.monotonic() + delay)
+
+    def call(self, kind, func, *args, **kwargs):
+        """Run one API call ('read' or 'write') within quota"""
+        if kind != 'read':
+            return self._call_with_retry(kind, func, args, kwargs)
+
+        key = (getattr(func, '__name__', repr(func)), id(getattr(func, '__self__', None)),
+               repr(args), repr(sorted(kwargs.items())))
+        with self._cond:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                self._inflight[key] = inflight = [Future(), 0]
+                owner = True
+            else:
+                inflight[1] += 1
+                owner = False
+        if not owner:
+            self._count('coalesced')
+            # Callers may edit what they get, each gets its own copy
+            return copy.deepcopy(inflight[0].result())
+
+        try:
+            result = self._call_with_retry(kind, func, args, kwargs)
+        except BaseException as e:
+            with self._cond:
+                del self._inflight[key]
+            inflight[0].set_exception(e)
+            raise
+        with self._cond:
+            del self._inflight[key]
+            waiters = inflight[1]
+        inflight[0].set_result(copy.deepcopy(result) if waiters else None)
+        return result
+
+
+class QuotaProxy:
+    """gspread Worksheet/Spreadsheet whose API methods go through a QuotaManager"""
+
+    def __init__(self, target, quota):
+        self._target = target
+        self._quota = quota
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in WRITE_METHODS:
+            return functools.partial(self._quota.call, 'write', attr)
+        if name in READ_METHODS:
+            return functools.partial(self._quota.call, 'read', attr)
+        if name == 'spreadsheet':
+            return QuotaProxy(attr, self._quota)
+        return attr
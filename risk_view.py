@@ -0,0 +1,75 @@
+class OpenRiskView:
+    """Materialized open risk: total, count and per market/style sums of Pending trades.
+
+    update_trade() is called for every added or edited trade (add, move SL,
+    partial close, close, BE, cancel), so reading the view is a dictionary
+    lookup. Partly closed trades count with their remaining risk.
+    """
+
+    def __init__(self):
+        self._by_trade = {}   # trade ID -> pending Trade, sheet order
+        self._total = 0.0
+        self._by_market = {}  # market -> (open trades, risk sum)
+        self._by_style = {}   # style -> (open trades, risk sum)
+
+    def rebuild(self, trades):
+        """Recompute from Trade records"""
+        self.__init__()
+        for trade in trades:
+            self.update_trade(trade)
+
+    def copy(self):
+        """Copy that later updates do not change"""
+        other = OpenRiskView.__new__(OpenRiskView)
+        other._by_trade = dict(self._by_trade)
+        other._total = self._total
+        other._by_market = dict(self._by_market)
+        other._by_style = dict(self._by_style)
+        return other
+
+    def _apply(self, trade, sign):
+        risk = sign * trade.remaining_risk
+        self._total += risk
+        for groups, key in (
+            (self._by_market, trade.market),
+            (self._by_style, trade.style),
+        ):
+            count, total = groups.get(key, (0, 0.0))
+            if count + sign == 0:
+                # No open trades left in this group
+                groups.pop(key, None)
+            else:
+                groups[key] = (count + sign, total + risk)
+
+    def update_trade(self, trade):
+        """Add, change or drop one trade"""
+        trade_id = trade.id
+        old = self._by_trade.get(trade_id)
+        if trade.status != 'Pending':
+            if old is not None:
+                del self._by_trade[trade_id]
+                self._apply(old, -1)
+            return
+
+        if old is not None:
+            self._apply(old, -1)
+        # Assigning an existing key keeps its position in the list
+        self._by_trade[trade_id] = trade
+        self._apply(trade, 1)
+
+    def snapshot(self):
+        """Same result as get_open_risk"""
+        return {
+            'total': round(self._total, 2),
+            'count': len(self._by_trade),
+            'market_count': {k: round(v, 2) for k, (_, v) in self._by_market.items()},
+            'style_count': {k: round(v, 2) for k, (_, v) in self._by_style.items()},
+            'trades': list(self._by_trade.values())
+        }
+
+    def get(self, trade_id):
+        """Pending Trade or None"""
+        return self._by_trade.get(trade_id)
+
+    def pending_trades(self):
+        return list(self._by_trade.values())
@@ -3,11 +3,119 @@ from oauth2client.service_account import ServiceAccountCredentials
 import json
 import base64
 import os
-from config import SHEET_ID, SHEET_NAME
-from datetime import datetime
+import time
+import threading
+import functools
+import hashlib
+from collections import OrderedDict
+from gspread.utils import rowcol_to_a1
+from config import SHEET_ID, SHEET_NAME, FILLS_SHEET_NAME, CACHE_TTL_SECONDS, DELTA_SYNC, SNAPSHOT_PATH
+from storage import TradeStorage, HEADERS, FILL_HEADERS
+from stats_aggregator import StatsAggregator
+from risk_view import OpenRiskView
+from columnar import ColumnarTrades
+from timeutil import now_timestamp
+from quota import QuotaManager, QuotaProxy
+from snapshot import write_snapshot, read_snapshot
+from trade import Trade
+from fills import Fill, FillsLedger, check_fill
 
-class SheetsHandler:
-    def __init__(self):
+# Columns the bot edits after a trade is added, the rest never change
+MUTABLE_COLUMNS = ('SL', 'Risk%', 'TP', 'Trạng thái', 'PnL_R', 'Ghi chú')
+
+# Columns read by stats, reports and the open-risk panel; free text
+# (Chart, Lý do, Ghi chú) is only fetched for a single trade or a full load
+VIEW_COLUMNS = ('ID', 'Timestamp', 'Thị trường', 'Kiểu', 'Hướng', 'Ticker',
+                'Entry', 'SL', 'Risk%', 'TP', 'Trạng thái', 'PnL_R')
+
+
+def _locked(method):
+    """Serialize access to the cache, handler methods run on a thread pool
+    
+    Only for methods without API calls: sheet I/O runs outside the lock
+    (_load, _write_lock) so one slow call does not stall the others.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _to_cell(value):
+    """Convert a written value to the string gspread would read back"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class SheetsHandler(TradeStorage):
+    def __init__(self, worksheet=None, fills_worksheet=None):
+        """worksheet: gspread Worksheet (or a stand-in) to use instead of connecting
+        
+        fills_worksheet: partial closes ledger, default FILLS_SHEET_NAME of
+        the same spreadsheet.
+        """
+        # Every API call goes through the quota manager
+        self.quota = QuotaManager()
+        if worksheet is None:
+            worksheet = self._connect()
+        self.sheet = QuotaProxy(worksheet, self.quota)
+        
+        # Trade cache: header row + data rows as strings, like get_all_values()
+        self._headers = []
+        self._rows = []
+        self._loaded_at = None
+        self._synced_at = None  # last time the cache was known to match the sheet
+        self._last_marker = None  # change marker seen at the last check_for_changes()
+        self._hash_marker = False  # True once Drive modifiedTime turned out unavailable
+        self._cache_columns = set()  # headers held by the cached rows
+        self.cache_counters = {'hits': 0, 'delta_syncs': 0, 'full_loads': 0}
+        self.cache_ttl = CACHE_TTL_SECONDS
+        self.delta_sync = DELTA_SYNC
+        # Warm-start file of the cache and views (save_snapshot), '' = off
+        self.snapshot_path = SNAPSHOT_PATH
+        self._snapshot_dirty = False  # cache changed since the last save
+        self._snapshot_lock = threading.Lock()  # one save_snapshot() writing the file at a time
+        # Held for cache reads/writes only, sheet reads run outside it (_load)
+        self._lock = threading.RLock()
+        self._version = 0  # bumped by every load applied and every write sent
+        
+        # Partial closes, loaded with the cache and applied to its Trade records
+        self.fills = FillsLedger()
+        self._fills_loaded = False
+        
+        # Report totals and open risk kept in step with the cache
+        self.stats = StatsAggregator()
+        self.open_risk = OpenRiskView()
+        # NumPy copy for ad-hoc analytics, built on first query_stats()
+        self._columns = None
+        
+        # Trade ID -> sheet row number, built from column A
+        self._id_index = None
+        self._index_built_at = None
+        self._row_count = 0  # rows in sheet incl. header
+        self.index_problems = {'duplicates': {}, 'missing': []}
+        
+        # Highest trade ID ever seen/allocated, never goes down
+        self._max_id = None
+        # idempotency key -> trade ID of trades already added
+        self._added_keys = OrderedDict()
+        
+        # Updates queued by queue_update(), sent together by flush_updates()
+        self._queued_updates = {}
+        
+        # Write-behind outbox (attach_outbox), None = write directly to sheet
+        self.outbox = None
+        self._pending_adds = OrderedDict()  # trade ID -> cached row not in sheet yet
+        self._write_lock = threading.Lock()  # one sheet write (or outbox flush) at a time
+        
+        self._setup_headers()
+        if fills_worksheet is None:
+            fills_worksheet = self._open_fills_sheet(worksheet.spreadsheet)
+        self.fills_sheet = QuotaProxy(fills_worksheet, self.quota)
+    
+    def _connect(self):
+        """Open SHEET_NAME with the service account in CREDENTIALS_JSON"""
         scope = [
             'https://spreadsheets.google.com/feeds',
             'https://www.googleapis.com/auth/drive'
@@ -32,32 +140,594 @@ class SheetsHandler:
         
         creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
         client = gspread.authorize(creds)
-        self.sheet = client.open_by_key(SHEET_ID).worksheet(SHEET_NAME)
+        spreadsheet = self.quota.call('read', client.open_by_key, SHEET_ID)
+        worksheet = self.quota.call('read', spreadsheet.worksheet, SHEET_NAME)
         print(f"✅ Connected to Google Sheet: {SHEET_NAME}")
-        self._setup_headers()
+        return worksheet
     
     def _setup_headers(self):
         """Setup header row if not exists"""
-        headers = [
-            'ID', 'Timestamp', 'Thị trường', 'Kiểu', 'Hướng', 'Ticker', 
-            'Entry', 'SL', 'Risk%', 'Chart', 'Lý do', 'TP', 
-            'Trạng thái', 'PnL_R', 'Ghi chú'
-        ]
+        headers = list(HEADERS)
+        self._headers = headers
         try:
             existing = self.sheet.row_values(1)
             if not existing or existing[0] != 'ID':
                 self.sheet.insert_row(headers, 1)
+                # Every row moved down by one
+                self.invalidate_index()
+            else:
+                self._headers = existing
         except:
             self.sheet.append_row(headers)
     
-    def add_trade(self, trade_data):
-        """Add new trade to sheet"""
-        all_rows = self.sheet.get_all_values()
-        next_id = len(all_rows)
+    def _open_fills_sheet(self, spreadsheet):
+        """FILLS_SHEET_NAME worksheet, created with its header row if missing"""
+        try:
+            return self.quota.call('read', spreadsheet.worksheet, FILLS_SHEET_NAME)
+        except gspread.WorksheetNotFound:
+            worksheet = self.quota.call('write', spreadsheet.add_worksheet, FILLS_SHEET_NAME,
+                                        rows=1000, cols=len(FILL_HEADERS))
+            self.quota.call('write', worksheet.append_row, FILL_HEADERS)
+            print(f"✅ Created worksheet: {FILLS_SHEET_NAME}")
+            return worksheet
+    
+    # === CACHE ===
+    
+    def _load(self, fetch, apply):
+        """apply(fetch()): sheet reads without the cache lock, the result applied with it
+        
+        Fetched again if another load or one of our writes landed meanwhile,
+        the result could miss it. The last try holds the lock throughout.
+        """
+        for _ in range(2):
+            with self._lock:
+                version = self._version
+            result = fetch()
+            with self._lock:
+                if self._version == version:
+                    self._version += 1
+                    return apply(result)
+        with self._lock:
+            result = fetch()
+            self._version += 1
+            return apply(result)
+    
+    def refresh_cache(self, columns=None):
+        """Reload the sheet into the cache, only the given columns if any"""
+        self._load(functools.partial(self._fetch_all, columns), self._apply_all)
+    
+    def _fetch_all(self, columns):
+        all_values = None
+        if columns is not None and not set(self._headers) <= set(columns):
+            all_values = self._read_columns(columns)
+        if all_values is None:
+            all_values = self.sheet.get_all_values()
+            columns = None
+        return all_values, columns, self.fills_sheet.get_all_values()
+    
+    def _apply_all(self, result):
+        all_values, columns, fill_rows = result
+        if columns is None and all_values:
+            self._headers = all_values[0]
+        self._rows = all_values[1:]
+        self._cache_columns = set(self._headers) if columns is None else set(columns) | {'ID'}
+        self._loaded_at = self._synced_at = time.monotonic()
+        # Same data as column A, no need for another read
+        self._build_id_index([row[0] if row else '' for row in all_values])
+        self._apply_fills(fill_rows)
+        if self.outbox is not None:
+            # Writes not sent yet must stay visible
+            self._apply_outbox_overlay()
+        # Each row is parsed once here, the views share the Trade records
+        trades = self._to_trades(self._rows + list(self._pending_adds.values()))
+        self.stats.rebuild(trades)
+        self.open_risk.rebuild(trades)
+        self._columns = None
+        self._snapshot_dirty = True
+    
+    @_locked
+    def invalidate_cache(self):
+        """Mark cache as stale, next read will reload from sheet"""
+        self._loaded_at = None
+        self.invalidate_index()
+    
+    def cache_age(self):
+        """Seconds since last load, None if not loaded"""
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+    
+    def sync_age(self):
+        """Seconds since the cache was last confirmed in step with the sheet, None if never"""
+        if self._synced_at is None:
+            return None
+        return time.monotonic() - self._synced_at
+    
+    def _cache_fresh(self):
+        age = self.cache_age()
+        return age is not None and age < self.cache_ttl
+    
+    def _ensure_cache(self, columns=None):
+        """Load cache on first use or when older than cache_ttl (0 = no cache)
+        
+        columns: headers the caller reads, None = all. A cache holding fewer
+        columns is reloaded with the ones asked for.
+        """
+        with self._lock:
+            covered = (set(self._headers) if columns is None else set(columns)) <= self._cache_columns
+            if covered and self._cache_fresh():
+                self.cache_counters['hits'] += 1
+                return
+            delta = covered and self.delta_sync and self._loaded_at is not None
+            self.cache_counters['delta_syncs' if delta else 'full_loads'] += 1
+        if delta:
+            self.sync_delta()
+        else:
+            self.refresh_cache(columns)
+    
+    def _change_marker(self):
+        """Cheap 'did the sheet change' value: Drive modifiedTime, else a hash of ID/status"""
+        if not self._hash_marker:
+            try:
+                return self.sheet.spreadsheet.get_lastUpdateTime()
+            except Exception as e:
+                print(f"⚠️ modifiedTime not available ({e}), hashing ID/status columns")
+                self._hash_marker = True
+        groups = self._column_groups(['ID', 'Trạng thái'])
+        values = self.sheet.batch_get([
+            f"{self._column_letter(start)}:{self._column_letter(end)}" for start, end in groups
+        ])
+        return hashlib.md5(repr(values).encode('utf-8')).hexdigest()
+    
+    def check_for_changes(self):
+        """Poll the change marker, sync the cache only if the sheet changed
+        
+        Returns True if the cache was synced. Our own writes change the
+        marker too, they cost one delta sync. The cache lock is not held
+        while the (background, lowest priority) reads wait for quota.
+        """
+        if self._loaded_at is None:
+            return False
+        with self.quota.background():
+            marker = self._change_marker()
+            if marker == self._last_marker:
+                # Nothing changed, the cache stays valid for another cache_ttl
+                with self._lock:
+                    self._loaded_at = self._synced_at = time.monotonic()
+                return False
+            if self.delta_sync:
+                self.sync_delta()
+            else:
+                self.refresh_cache(self._cache_columns)
+        self._last_marker = marker
+        return True
+    
+    def _column_letter(self, col):
+        return rowcol_to_a1(1, col)[:-1]
+    
+    def _column_groups(self, headers):
+        """[start, end] column numbers of the given headers, adjacent columns merged"""
+        cols = sorted(self._headers.index(h) + 1 for h in set(headers) if h in self._headers)
+        groups = []
+        for col in cols:
+            if groups and groups[-1][1] == col - 1:
+                groups[-1][1] = col
+            else:
+                groups.append([col, col])
+        return groups
+    
+    def _read_columns(self, columns):
+        """Header + data rows holding only the given columns (others ''), one batch_get
+        
+        None if the header row no longer matches, then the caller reads everything.
+        """
+        groups = self._column_groups(set(columns) | {'ID'})
+        results = self.sheet.batch_get([
+            f"{self._column_letter(start)}:{self._column_letter(end)}" for start, end in groups
+        ])
+        height = max((len(values) for values in results), default=0)
+        rows = [[''] * len(self._headers) for _ in range(height)]
+        for (start, _), values in zip(groups, results):
+            for row, cells in zip(rows, values):
+                row[start - 1:start - 1 + len(cells)] = cells
+        if not rows or any(
+            rows[0][col - 1] != self._headers[col - 1]
+            for start, end in groups for col in range(start, end + 1)
+        ):
+            return None
+        return rows
+    
+    def _mutable_ranges(self, last_row):
+        """A1 ranges of the cached MUTABLE_COLUMNS up to last_row"""
+        groups = self._column_groups(h for h in MUTABLE_COLUMNS if h in self._cache_columns)
+        return [
+            (start, end, f"{self._column_letter(start)}2:{self._column_letter(end)}{last_row}")
+            for start, end in groups
+        ]
+    
+    def sync_delta(self):
+        """Update the cache from rows added since the last load plus MUTABLE_COLUMNS
+        
+        One batch_get: column A (to notice moved/deleted rows), the mutable
+        columns of cached rows and every row after them. Edits to other
+        columns are picked up by the next full refresh_cache().
+        Returns the number of rows added or changed.
+        """
+        if self._loaded_at is None or not self._headers:
+            self.refresh_cache(self._cache_columns or None)
+            return len(self._rows)
+        
+        changed = self._load(self._fetch_delta, self._apply_delta)
+        if changed is None:
+            # Rows were inserted, deleted or sorted in the sheet
+            print("⚠️ Sheet rows moved, reloading the whole sheet")
+            self.refresh_cache(self._cache_columns)
+            return len(self._rows)
+        if not self._fills_loaded:
+            # Ledger came from a snapshot
+            self._sync_fills()
+        return changed
+    
+    def _fetch_delta(self):
+        count = len(self._rows)
+        last_col = self._column_letter(len(self._headers))
+        ranges = []
+        mutable = []
+        if count:
+            ranges.append(f"A2:A{count + 1}")
+            mutable = self._mutable_ranges(count + 1)
+            ranges.extend(rng for _, _, rng in mutable)
+        ranges.append(f"A{count + 2}:{last_col}")
+        return count, mutable, self.sheet.batch_get(ranges)
+    
+    def _apply_delta(self, result):
+        """Changed row count of a _fetch_delta() result, None if rows moved"""
+        count, mutable, results = result
+        if count:
+            ids = [row[0] if row else '' for row in results[0]]
+            ids += [''] * (count - len(ids))
+            cached_ids = [row[0] if row else '' for row in self._rows]
+            if ids != cached_ids:
+                return None
+        if self._id_index is None:
+            # Dropped by invalidate_index(); column A just matched the cached rows
+            self._build_id_index([self._headers[0]] + [row[0] if row else '' for row in self._rows])
+        
+        changed = set()
+        for (start, end, _), values in zip(mutable, results[1:-1]):
+            blank = [''] * (end - start + 1)
+            for idx, row in enumerate(self._rows):
+                new = values[idx] if idx < len(values) else []
+                old = row[start - 1:end]
+                # Unchanged is the usual case; Sheets drops trailing empty cells
+                if old == new or old + blank[len(old):] == new + blank[len(new):]:
+                    continue
+                for col in range(start, end + 1):
+                    value = new[col - start] if col - start < len(new) else ''
+                    old = row[col - 1] if col - 1 < len(row) else ''
+                    if value != old:
+                        while len(row) < col:
+                            row.append('')
+                        row[col - 1] = value
+                        changed.add(idx)
+        
+        added = [row for row in results[-1] if any(row)]
+        for row_num, row in enumerate(added, start=count + 2):
+            key = row[0].strip() if row else ''
+            if not key:
+                self.index_problems['missing'].append(row_num)
+            elif key in self._id_index:
+                self.index_problems['duplicates'].setdefault(key, [self._id_index[key]]).append(row_num)
+                print(f"⚠️ Duplicate trade ID in sheet: {key}")
+            else:
+                self._id_index[key] = row_num
+            if key.isdigit():
+                self._max_id = max(self._max_id or 0, int(key))
+            self._rows.append(list(row))
+            changed.add(len(self._rows) - 1)
+        
+        self._row_count = len(self._rows) + 1
+        self._loaded_at = self._synced_at = self._index_built_at = time.monotonic()
+        for idx in sorted(changed):
+            self._on_row_changed(self._rows[idx])
+        if changed and self.outbox is not None:
+            # Writes not sent yet must stay visible
+            self._apply_outbox_overlay()
+        return len(changed)
+    
+    def _load_fills(self):
+        """Reload the fills ledger, rows edited by hand are picked up here"""
+        self._load(self.fills_sheet.get_all_values, self._apply_fills)
+    
+    def _apply_fills(self, rows):
+        self.fills.rebuild(fill for fill in map(Fill.from_row, rows[1:]) if fill is not None)
+        if self.outbox is not None:
+            # Not sent yet
+            for entry in self.outbox.pending():
+                if entry['op'] == 'fill':
+                    self.fills.add(Fill.from_row(entry['row']))
+        self._fills_loaded = True
+    
+    def _sync_fills(self):
+        """Catch a snapshot's fills ledger up with the fills worksheet
+        
+        Reads column A, then only the rows from the first fill the ledger
+        does not know. Fills gone from the worksheet (deleted by hand) mean
+        a full _load_fills(). New fill IDs continue from the worksheet's
+        highest, even one in a row that does not parse.
+        """
+        if not self._load(self._fetch_new_fills, self._apply_new_fills):
+            self._load_fills()
+    
+    def _fetch_new_fills(self):
+        column_a = [str(value).strip() for value in self.fills_sheet.col_values(1)]
+        new = [row_num for row_num, value in enumerate(column_a[1:], start=2)
+               if value and not (value.isdigit() and int(value) in self.fills)]
+        rows = []
+        if new:
+            last_col = self._column_letter(len(FILL_HEADERS))
+            rows = self.fills_sheet.batch_get([f"A{new[0]}:{last_col}{len(column_a)}"])[0]
+        return column_a, rows
+    
+    def _apply_new_fills(self, result):
+        """False if fills of the ledger are gone from the worksheet"""
+        column_a, rows = result
+        known = set(column_a[1:])
+        if self.outbox is not None:
+            # Not sent yet
+            known |= {str(e['row'][0]) for e in self.outbox.pending() if e['op'] == 'fill'}
+        if any(str(fill.id) not in known for fill in self.fills.all()):
+            return False
+        for fill in map(Fill.from_row, rows):
+            if fill is not None:
+                self._fill_added(fill)
+        self.fills.max_id = max([self.fills.max_id] + [int(v) for v in column_a[1:] if v.isdigit()])
+        self._fills_loaded = True
+        return True
+    
+    def _to_trade(self, row):
+        """Trade record of a row with its partial fills, None without a numeric ID"""
+        trade = Trade.from_row(self._headers, row)
+        if trade is None:
+            return None
+        return self.fills.apply(trade)
+    
+    def _to_trades(self, rows):
+        """Trade records of rows, rows without a numeric ID are skipped"""
+        trades = []
+        for row in rows:
+            trade = self._to_trade(row)
+            if trade is not None:
+                trades.append(trade)
+        return trades
+    
+    def _on_row_changed(self, row):
+        """Keep derived state in step after a cached row was added or edited"""
+        trade = self._to_trade(row)
+        if trade is None:
+            return
+        self.stats.update_trade(trade)
+        self.open_risk.update_trade(trade)
+        if self._columns is not None:
+            self._columns.update_trade(trade)
+        self._snapshot_dirty = True
+    
+    def _write_cache(self, trade_id, updates):
+        """Apply column updates to the cached row of a trade, if cached"""
+        row = self._pending_adds.get(str(trade_id))
+        if row is None and self._id_index is not None:
+            row_num = self._id_index.get(str(trade_id))
+            if row_num is not None:
+                row = self._cached_row(row_num, trade_id)
+        if row is None:
+            return
+        for col_name, value in updates.items():
+            if col_name not in self._headers:
+                continue
+            col_index = self._headers.index(col_name) + 1
+            while len(row) < col_index:
+                row.append('')
+            row[col_index - 1] = _to_cell(value)
+        self._on_row_changed(row)
+    
+    def _cached_row(self, row_num, trade_id):
+        """Cached row for a sheet row number, None if not cached or not that trade"""
+        if self._loaded_at is None:
+            return None
+        idx = row_num - 2  # header is row 1
+        if 0 <= idx < len(self._rows):
+            row = self._rows[idx]
+            if row and row[0] == str(trade_id):
+                return row
+        return None
+    
+    # === SNAPSHOT ===
+    
+    def save_snapshot(self):
+        """Write the cache and its views to snapshot_path, False if off or nothing new
+        
+        The state is copied under the lock, pickling and the fsync run outside it.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                if not self.snapshot_path or self._loaded_at is None or not self._snapshot_dirty:
+                    return False
+                state = {
+                    'sheet': (SHEET_ID, SHEET_NAME),
+                    'saved_at': time.time(),
+                    'headers': list(self._headers),
+                    'rows': [list(row) for row in self._rows],
+                    'cache_columns': set(self._cache_columns),
+                    'max_id': self._max_id,
+                    'added_keys': OrderedDict(self._added_keys),
+                    'stats': self.stats.copy(),
+                    'open_risk': self.open_risk.copy(),
+                    'fills': self.fills.copy(),
+                    'marker': self._last_marker,
+                }
+                self._snapshot_dirty = False
+            try:
+                size = write_snapshot(self.snapshot_path, state)
+            except Exception:
+                with self._lock:
+                    self._snapshot_dirty = True
+                raise
+        print(f"💾 Snapshot: {len(state['rows'])} rows, {size // 1024} KB")
+        return True
+    
+    def load_snapshot(self):
+        """Warm the cache from snapshot_path, then sync_delta() with the sheet
+        
+        Replaces the first full download after a restart. False if there is
+        no usable snapshot (the cache then loads on first read as usual).
+        """
+        state = read_snapshot(self.snapshot_path) if self.snapshot_path else None
+        if state is None:
+            return False
+        if state['sheet'] != (SHEET_ID, SHEET_NAME) or state['headers'] != self._headers:
+            print("⚠️ Snapshot is from another sheet or column layout, ignoring")
+            return False
+        
+        with self._lock:
+            self._rows = state['rows']
+            self._cache_columns = state['cache_columns']
+            self._max_id = state['max_id']
+            self._added_keys = state['added_keys']
+            self.stats = state['stats']
+            self.open_risk = state['open_risk']
+            self.fills = state['fills']
+            self._fills_loaded = False  # sync_delta() catches it up with the worksheet
+            self._last_marker = state['marker']
+            self._columns = None
+            # The ID index is column A of the cached rows
+            self._build_id_index([self._headers[0]] + [row[0] if row else '' for row in self._rows])
+            self._loaded_at = time.monotonic()
+            self._synced_at = None  # not confirmed against the sheet yet
+            self._snapshot_dirty = False
+            self._version += 1
+        
+        age = time.time() - state['saved_at']
+        try:
+            changed = self.sync_delta()
+        except Exception as e:
+            # Stale, the first read syncs again
+            self._loaded_at = time.monotonic() - self.cache_ttl
+            print(f"⚠️ Snapshot delta sync failed, retrying on first read: {e}")
+            return True
+        print(f"✅ Snapshot: {len(self._rows)} rows from {age:.0f}s ago, {changed} changed since")
+        return True
+    
+    # === ID INDEX ===
+    
+    def _build_id_index(self, column_a):
+        """Build trade ID -> row number map from column A (header included), returns it"""
+        index = {}
+        duplicates = {}
+        missing = []
+        max_id = self._max_id or 0
+        for row_num, value in enumerate(column_a[1:], start=2):
+            key = str(value).strip()
+            if not key:
+                missing.append(row_num)
+                continue
+            if key in index:
+                duplicates.setdefault(key, [index[key]]).append(row_num)
+            else:
+                index[key] = row_num
+            if key.isdigit():
+                max_id = max(max_id, int(key))
+        
+        self._id_index = index
+        self._max_id = max_id
+        self._row_count = len(column_a)
+        self._index_built_at = time.monotonic()
+        self.index_problems = {'duplicates': duplicates, 'missing': missing}
+        
+        if duplicates:
+            print(f"⚠️ Duplicate trade IDs in sheet: {duplicates}")
+        if missing:
+            print(f"⚠️ Rows without trade ID: {missing}")
+        return index
+    
+    @_locked
+    def invalidate_index(self):
+        """Drop the ID index, call when rows were inserted/deleted/sorted"""
+        self._id_index = None
+        self._index_built_at = None
+        # A load in flight must not apply over it
+        self._version += 1
+    
+    def _reload_index(self):
+        """Rebuild the index from a fresh read of column A, returns it"""
+        return self._load(functools.partial(self.sheet.col_values, 1), self._build_id_index)
+    
+    def _ensure_index(self):
+        """The index, built on first use or when older than cache_ttl
+        
+        Callers keep the returned dict: invalidate_index() from another
+        thread may drop self._id_index meanwhile.
+        """
+        with self._lock:
+            index, built_at = self._id_index, self._index_built_at
+        if index is None or time.monotonic() - built_at >= self.cache_ttl:
+            index = self._reload_index()
+        return index
+    
+    def _find_row_num(self, trade_id):
+        """Sheet row number of a trade, None if not found"""
+        return self._ensure_index().get(str(trade_id))
+    
+    def get_index_problems(self):
+        """Duplicate IDs {id: [row numbers]} and rows without ID"""
+        self._ensure_index()
+        with self._lock:
+            return self.index_problems
+    
+    # === TRADES ===
+    
+    def _allocate_id(self):
+        """Next trade ID from the local high-water mark (reconciled from column A at startup)"""
+        self._max_id += 1
+        return self._max_id
+    
+    def add_trade(self, trade_data, idempotency_key=None):
+        """Add new trade to sheet
+        
+        Same idempotency_key twice (double tap, retry) returns the first trade ID
+        instead of adding another row.
+        """
+        if self._max_id is None:
+            # IDs continue from column A
+            self._ensure_index()
+        
+        if self.outbox is not None:
+            with self._lock:
+                if idempotency_key and idempotency_key in self._added_keys:
+                    return self._added_keys[idempotency_key]
+                next_id = self._allocate_id()
+                row = self._new_row(next_id, trade_data)
+                # Write-behind: on disk now, in the sheet when the worker flushes
+                self.outbox.append('add', next_id, row=row)
+                self._pending_adds[str(next_id)] = [_to_cell(v) for v in row]
+                self._on_row_changed(self._pending_adds[str(next_id)])
+                self._remember_key(idempotency_key, next_id)
+            return next_id
         
-        row = [
-            next_id,
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        with self._write_lock:
+            with self._lock:
+                if idempotency_key and idempotency_key in self._added_keys:
+                    return self._added_keys[idempotency_key]
+                next_id = self._allocate_id()
+                row = self._new_row(next_id, trade_data)
+            self._append_trade_row(next_id, row)
+            with self._lock:
+                self._remember_key(idempotency_key, next_id)
+        return next_id
+    
+    def _new_row(self, trade_id, trade_data):
+        return [
+            trade_id,
+            now_timestamp(),  # TIMEZONE, same as report boundaries
             trade_data['market'],
             trade_data['style'],
             trade_data['direction'],
@@ -72,205 +742,535 @@ class SheetsHandler:
             '',  # PnL_R
             ''   # Ghi chú
         ]
-        self.sheet.append_row(row)
-        return next_id
+    
+    def _remember_key(self, idempotency_key, trade_id):
+        if idempotency_key:
+            self._added_keys[idempotency_key] = trade_id
+            while len(self._added_keys) > 1000:
+                self._added_keys.popitem(last=False)
+    
+    def _append_trade_row(self, next_id, row):
+        """Append one trade row (caller holds _write_lock) and add it to the cache"""
+        try:
+            self.sheet.append_row(row)
+        except Exception:
+            # The append may have reached the sheet before the error (timeout)
+            column_a = self.sheet.col_values(1)
+            with self._lock:
+                self._version += 1
+                if str(next_id) not in self._build_id_index(column_a):
+                    raise
+                self._loaded_at = None
+            return
+        
+        with self._lock:
+            self._version += 1
+            if self._id_index is not None and str(next_id) in self._id_index:
+                # A load in the meantime already read it
+                return
+            if self._id_index is not None:
+                row_num = self._row_count + 1
+                self._row_count = row_num
+                self._id_index[str(next_id)] = row_num
+            if self._loaded_at is not None and self._id_index is not None and len(self._rows) == row_num - 2:
+                self._rows.append([_to_cell(v) for v in row])
+                self._on_row_changed(self._rows[-1])
+            else:
+                # Cache is out of step with the sheet, reload on next read
+                self._loaded_at = None
     
     def get_pending_trades(self):
-        """Get all pending trades with correct Risk% parsing"""
+        """Get all pending trades as Trade records (Chart/Lý do/Ghi chú may be empty)"""
         try:
-            records = self.sheet.get_all_records()
-            pending = []
-            for r in records:
-                if r.get('Trạng thái') == 'Pending':
-                    # FIX: Parse Risk% - handle both formats
-                    risk_value = r.get('Risk%', 0)
-                    try:
-                        # If it's already a number, use it directly
-                        r['Risk%'] = float(str(risk_value).replace(',', '.').replace('%', '').strip())
-                    except:
-                        r['Risk%'] = 0.0
-                    pending.append(r)
-            return pending
+            self._ensure_cache(VIEW_COLUMNS)
+            with self._lock:
+                return self.open_risk.pending_trades()
         except Exception as e:
             print(f"❌ Error getting pending trades: {e}")
             return []
-
+    
+    def get_all_trades(self):
+        """Every trade as a Trade record"""
+        self._ensure_cache()
+        with self._lock:
+            return self._to_trades(self._rows + list(self._pending_adds.values()))
     
     def get_trade_by_id(self, trade_id):
         """Get trade details by ID"""
-        all_values = self.sheet.get_all_values()
-        headers = all_values[0]
+        row = self._read_trade_row(trade_id)
+        if row is None:
+            return None
+        with self._lock:
+            return self._to_trade(row)
+    
+    def _read_trade_row(self, trade_id, retry=True):
+        """Copy of the row of a trade from cache, or a single-row read via the ID index"""
+        with self._lock:
+            if str(trade_id) in self._pending_adds:
+                return list(self._pending_adds[str(trade_id)])
+        
+        row_num = self._find_row_num(trade_id)
+        if row_num is None:
+            return None
+        
+        with self._lock:
+            if self._cache_fresh() and set(self._headers) <= self._cache_columns:
+                row = self._cached_row(row_num, trade_id)
+                if row is not None:
+                    return list(row)
         
-        for row in all_values[1:]:
-            if row[0] == str(trade_id):
-                trade = {}
-                for i, header in enumerate(headers):
-                    trade[header] = row[i] if i < len(row) else ''
-                return trade
+        row = self.sheet.row_values(row_num)
+        if row and row[0] == str(trade_id):
+            with self._lock:
+                return self._with_unsent_updates(trade_id, row)
         
+        # Rows moved since the index was built
+        self.invalidate_index()
+        self.invalidate_cache()
+        if retry:
+            return self._read_trade_row(trade_id, retry=False)
         return None
     
     def update_trade_by_id(self, trade_id, updates):
         """Update trade by ID with dict of updates"""
-        all_values = self.sheet.get_all_values()
-        headers = all_values[0]
+        return self.update_trades_batch({trade_id: updates})[trade_id]
+    
+    def update_trades_batch(self, updates_by_id):
+        """Update several trades in one batch_update request
         
-        # Find row by ID
-        row_num = None
-        for idx, row in enumerate(all_values[1:], start=2):
-            if row[0] == str(trade_id):
-                row_num = idx
-                break
+        updates_by_id: {trade_id: {column: value}}
+        Returns {trade_id: True/False (not found)}
+        """
+        if self.outbox is not None:
+            return self._enqueue_updates(updates_by_id)
         
-        if not row_num:
+        result = {}
+        data = []
+        with self._write_lock:
+            index = self._ensure_index()
+            if not self._rows_hold_ids(index, updates_by_id):
+                # Rows inserted or sorted by hand since the index was built
+                index = self._reload_index()
+            with self._lock:
+                for trade_id, updates in updates_by_id.items():
+                    row_num = index.get(str(trade_id))
+                    result[trade_id] = row_num is not None
+                    if row_num is None:
+                        continue
+                    for col_name, value in updates.items():
+                        if col_name in self._headers:
+                            col_index = self._headers.index(col_name) + 1
+                            data.append({'range': rowcol_to_a1(row_num, col_index), 'values': [[value]]})
+            
+            if data:
+                # USER_ENTERED like update_cell, so numbers stay numbers
+                self.sheet.batch_update(data, value_input_option='USER_ENTERED')
+                # Write-through to cache
+                with self._lock:
+                    self._version += 1
+                    for trade_id, updates in updates_by_id.items():
+                        if result[trade_id]:
+                            self._write_cache(trade_id, updates)
+        
+        return result
+    
+    def _rows_hold_ids(self, index, trade_ids):
+        """True if the index rows of trade_ids still have those IDs in column A
+        
+        One batch_get of just those cells, not the whole column. An ID missing
+        from the index counts as a failed check (added by hand since).
+        """
+        row_nums = [index.get(str(trade_id)) for trade_id in trade_ids]
+        if None in row_nums:
             return False
+        if not row_nums:
+            return True
+        cells = self.sheet.batch_get([f"A{row_num}" for row_num in row_nums])
+        return all(
+            value and value[0] and str(value[0][0]).strip() == str(trade_id)
+            for trade_id, value in zip(trade_ids, cells)
+        )
+    
+    def _enqueue_updates(self, updates_by_id):
+        """Write-behind version of update_trades_batch, every trade is queued (True)
         
-        # Update columns
-        for col_name, value in updates.items():
-            try:
-                col_index = headers.index(col_name) + 1
-                self.sheet.update_cell(row_num, col_index, value)
-            except ValueError:
-                continue
+        No API call, so a Sheets outage does not lose the update;
+        flush_outbox() drops and reports IDs the sheet does not have.
+        """
+        result = {}
+        with self._lock:
+            for trade_id, updates in updates_by_id.items():
+                result[trade_id] = True
+                updates = {k: v for k, v in updates.items() if k in self._headers}
+                if updates:
+                    self.outbox.append('update', trade_id, updates=updates)
+                    self._write_cache(trade_id, updates)
+        return result
+    
+    def add_fill(self, trade_id, percent, r):
+        """Record a partial close, returns the Fill (None if the trade is not found)
         
-        return True
+        ValueError if the trade is no longer Pending or the percent is not
+        what is still open. Appends one row to the fills worksheet; with an
+        outbox the row waits there and goes out with the others in one
+        append_rows.
+        """
+        if self.outbox is not None:
+            return self._enqueue_fill(trade_id, percent, r)
+        
+        row = self._read_trade_row(trade_id)
+        if row is None:
+            return None
+        if not self._fills_loaded:
+            # Fill IDs continue from the worksheet
+            self._load_fills()
+        
+        with self._write_lock:
+            with self._lock:
+                fill = self._new_fill(self._to_trade(row).status, trade_id, percent, r)
+            self.fills_sheet.append_row(fill.to_row())
+            with self._lock:
+                self._version += 1
+                self._fill_added(fill)
+        return fill
+    
+    def _enqueue_fill(self, trade_id, percent, r):
+        """Write-behind version of add_fill, checked against memory only
+        
+        The trade's status is checked when its row is cached; the ID is
+        taken from the ledger even if it has not been loaded yet,
+        flush_outbox() renumbers a fill whose ID the worksheet already
+        holds for another fill.
+        """
+        with self._lock:
+            trade = self._cached_trade(trade_id)
+            fill = self._new_fill('Pending' if trade is None else trade.status, trade_id, percent, r)
+            self.outbox.append('fill', trade_id, row=fill.to_row())
+            self._fill_added(fill)
+        return fill
+    
+    def _cached_trade(self, trade_id):
+        """Trade record of a pending add or a cached row, None if not in memory"""
+        row = self._pending_adds.get(str(trade_id))
+        if row is None and self._id_index is not None and str(trade_id) in self._id_index:
+            row = self._cached_row(self._id_index[str(trade_id)], trade_id)
+        return None if row is None else self._to_trade(row)
+    
+    def _new_fill(self, status, trade_id, percent, r):
+        check_fill(status, percent, self.fills.totals(trade_id)[0])
+        return Fill.create(self.fills.next_id(), trade_id, percent, r)
+    
+    def _fill_added(self, fill):
+        if self.fills.add(fill):
+            # Stats and open risk of the trade change with its fills
+            self._write_cache(fill.trade_id, {})
+            self._snapshot_dirty = True
+    
+    def get_all_fills(self):
+        """Every partial fill, by ID"""
+        self._ensure_cache(VIEW_COLUMNS)
+        with self._lock:
+            return self.fills.all()
+    
+    @_locked
+    def queue_update(self, trade_id, updates):
+        """Queue updates for a trade, later values for the same column win"""
+        self._queued_updates.setdefault(trade_id, {}).update(updates)
     
-    def calculate_new_risk(self, entry, old_sl, new_sl, old_risk, direction):
-        """Calculate new risk % after moving SL"""
+    def flush_updates(self):
+        """Send all queued updates in one request"""
+        with self._lock:
+            queued = self._queued_updates
+            self._queued_updates = {}
+        if not queued:
+            return {}
         try:
-            entry = float(entry)
-            old_sl = float(old_sl)
-            new_sl = float(new_sl)
-            old_risk = float(old_risk)
+            return self.update_trades_batch(queued)
+        except Exception:
+            # Put them back so the next flush retries, updates queued meanwhile win
+            with self._lock:
+                for trade_id, updates in self._queued_updates.items():
+                    queued.setdefault(trade_id, {}).update(updates)
+                self._queued_updates = queued
+            raise
+    
+    # === OUTBOX ===
+    
+    def attach_outbox(self, outbox):
+        """Send writes through a durable Outbox instead of straight to the sheet"""
+        self._ensure_index()
+        with self._lock:
+            self.outbox = outbox
+            self._apply_outbox_overlay()
+    
+    def _fold_outbox(self, entries):
+        """Coalesce outbox entries into ({id: row to append}, {id: {column: value}})
+        
+        Updates are kept apart from the add of the same trade: that add may
+        already be in the sheet (only its ack was lost), then the updates
+        still have to be written to the row.
+        """
+        adds = OrderedDict()
+        updates = {}
+        for entry in entries:
+            key = str(entry['trade_id'])
+            if entry['op'] == 'fill':
+                # Fills go to their own worksheet
+                continue
+            if entry['op'] == 'add':
+                adds[key] = list(entry['row'])
+            else:
+                updates.setdefault(key, {}).update(entry['updates'])
+        return adds, updates
+    
+    def _merge_updates(self, row, updates, convert=lambda value: value):
+        """Copy of row with {column: value} written into it"""
+        row = list(row)
+        for col_name, value in updates.items():
+            col_index = self._headers.index(col_name)
+            while len(row) <= col_index:
+                row.append('')
+            row[col_index] = convert(value)
+        return row
+    
+    def _with_unsent_updates(self, trade_id, row):
+        """Row read from the sheet plus outbox updates not sent yet"""
+        if self.outbox is None:
+            return row
+        key = str(trade_id)
+        entries = [e for e in self.outbox.pending() if str(e['trade_id']) == key]
+        _, updates = self._fold_outbox(entries)
+        if key not in updates:
+            return row
+        return self._merge_updates(row, updates[key], _to_cell)
+    
+    def _apply_outbox_overlay(self):
+        """Show unsent outbox writes in the cache (after attach or reload)"""
+        entries = self.outbox.pending()
+        for entry in entries:
+            if entry['op'] == 'fill':
+                self._fill_added(Fill.from_row(entry['row']))
+        adds, updates = self._fold_outbox(entries)
+        known = self._id_index
+        if known is None:
+            # Index dropped meanwhile, the cached rows tell what is in the sheet
+            known = {row[0] for row in self._rows if row}
+        self._pending_adds = OrderedDict()
+        for key, row in adds.items():
+            if key in known:
+                # Appended before a crash, only the ack was lost
+                continue
+            self._pending_adds[key] = [_to_cell(v) for v in row]
+            # The views may come from a snapshot that never saw this add
+            self._on_row_changed(self._pending_adds[key])
+            if key.isdigit():
+                self._max_id = max(self._max_id or 0, int(key))
+        for key, col_updates in updates.items():
+            self._write_cache(key, col_updates)
+    
+    @_locked
+    def mirror_add(self, trade_id, row):
+        """Queue a row written elsewhere (SQLite is source of truth) for appending"""
+        self.outbox.append('add', trade_id, row=row)
+        self._pending_adds[str(trade_id)] = [_to_cell(v) for v in row]
+        self._on_row_changed(self._pending_adds[str(trade_id)])
+        if self._max_id is not None:
+            self._max_id = max(self._max_id, int(trade_id))
+    
+    @_locked
+    def mirror_fill(self, fill):
+        """Queue a fill recorded elsewhere for the fills worksheet"""
+        self.outbox.append('fill', fill.trade_id, row=fill.to_row())
+        self._fill_added(fill)
+    
+    @_locked
+    def mirror_updates(self, trade_id, updates):
+        """Queue column updates made elsewhere for the sheet"""
+        updates = {k: v for k, v in updates.items() if k in self._headers}
+        if updates:
+            self.outbox.append('update', trade_id, updates=updates)
+            self._write_cache(trade_id, updates)
+    
+    def known_trade_ids(self):
+        """IDs in the sheet or waiting in the outbox"""
+        index = self._ensure_index()
+        with self._lock:
+            return set(index) | set(self._pending_adds)
+    
+    def flush_outbox(self):
+        """Send unsent outbox entries to the sheet, returns number of entries sent
+        
+        One append_rows for new trades and one batch_update for edits. The cache
+        lock is not held during API calls, so handlers keep enqueueing meanwhile.
+        """
+        if self.outbox is None:
+            return 0
+        
+        with self._write_lock:
+            with self._lock:
+                entries = self.outbox.pending()
+                if not entries:
+                    return 0
+                adds, updates = self._fold_outbox(entries)
             
-            if direction == 'BUY':
-                old_distance = entry - old_sl
-                new_distance = entry - new_sl
-            else:  # SELL
-                old_distance = old_sl - entry
-                new_distance = new_sl - entry
+            # Fresh column A, so replayed adds that already landed are skipped
+            column_a = self.sheet.col_values(1)
+            row_nums = {}
+            for row_num, value in enumerate(column_a[1:], start=2):
+                row_nums.setdefault(str(value).strip(), row_num)
             
-            if old_distance == 0:
-                return 0
+            # Updates to a trade not appended yet go into its row
+            new_rows = [self._merge_updates(row, updates.pop(key, {}))
+                        for key, row in adds.items() if key not in row_nums]
+            if new_rows:
+                self.sheet.append_rows(new_rows)
+                for row in new_rows:
+                    column_a.append(str(row[0]))
+                    row_nums[str(row[0])] = len(column_a)
             
-            # Calculate new risk proportionally
-            new_risk = (new_distance / old_distance) * old_risk
+            data = []
+            for key, col_updates in updates.items():
+                row_num = row_nums.get(key)
+                if row_num is None:
+                    print(f"⚠️ Outbox: trade #{key} not in sheet, dropping {col_updates}")
+                    continue
+                for col_name, value in col_updates.items():
+                    col_index = self._headers.index(col_name) + 1
+                    data.append({'range': rowcol_to_a1(row_num, col_index), 'values': [[value]]})
+            if data:
+                self.sheet.batch_update(data, value_input_option='USER_ENTERED')
             
-            # FIX: Return value directly, NO multiplication
-            return round(new_risk, 2)
+            fill_rows = [e['row'] for e in entries if e['op'] == 'fill']
+            renumbered = False
+            if fill_rows:
+                # Fill ID -> row as read back, for the fills in the worksheet
+                width = len(FILL_HEADERS)
+                sent = {}
+                for row in self.fills_sheet.get_all_values()[1:]:
+                    cells = [str(value).strip() for value in row][:width]
+                    sent[cells[0] if cells else ''] = cells + [''] * (width - len(cells))
+                next_fill = max([int(key) for key in sent if key.isdigit()], default=0)
+                new_fills = []
+                for row in fill_rows:
+                    cells = [_to_cell(value) for value in row]
+                    if cells[1] not in row_nums:
+                        print(f"⚠️ Outbox: trade #{cells[1]} not in sheet, dropping fill {row}")
+                        continue
+                    if sent.get(cells[0]) == cells:
+                        # Appended by a flush that failed before its ack
+                        continue
+                    if cells[0] in sent:
+                        # ID taken while the ledger was not loaded
+                        next_fill += 1
+                        row = [next_fill] + list(row[1:])
+                        renumbered = True
+                    sent[str(row[0])] = [str(row[0])] + cells[1:]
+                    next_fill = max(next_fill, int(row[0]))
+                    new_fills.append(row)
+                if new_fills:
+                    self.fills_sheet.append_rows(new_fills)
             
-        except Exception as e:
-            print(f"❌ Error calculating risk: {e}")
-            return old_risk
-
+            with self._lock:
+                self.outbox.ack([e['seq'] for e in entries])
+                self._version += 1
+                self._build_id_index(column_a)
+                for row in new_rows:
+                    cached = self._pending_adds.pop(str(row[0]), None)
+                    row_num = row_nums[str(row[0])]
+                    if cached is not None and self._loaded_at is not None and len(self._rows) == row_num - 2:
+                        self._rows.append(cached)
+                        self._on_row_changed(cached)
+                    else:
+                        self._loaded_at = None
+                for key in adds:
+                    # Appended earlier (replay), nothing left to send
+                    self._pending_adds.pop(key, None)
+                if renumbered:
+                    # The ledger holds the old IDs, reload it with the cache
+                    self._loaded_at = None
+            
+            return len(entries)
+    
+    def _partial_r(self, start_date=None, end_date=None, **filters):
+        """R realized in the period by partial fills of trades still open"""
+        trade_ids = set()
+        for trade_id in self.fills.trade_ids():
+            trade = self.open_risk.get(trade_id)
+            if trade is None:
+                continue
+            if all(
+                wanted is None or getattr(trade, name) in (
+                    wanted if isinstance(wanted, (list, tuple, set)) else [wanted])
+                for name, wanted in filters.items()
+            ):
+                trade_ids.add(trade_id)
+        return round(self.fills.realized_between(trade_ids, start_date, end_date), 2)
     
     def get_stats(self, start_date=None, end_date=None):
         """Get trading statistics for a period"""
-        records = self.sheet.get_all_records()
-        
-        # Filter by date range
-        if start_date:
-            records = [r for r in records if r.get('Timestamp', '') >= start_date]
-        if end_date:
-            records = [r for r in records if r.get('Timestamp', '') <= end_date]
-        
-        # Get closed trades only
-        closed = [r for r in records if r.get('Trạng thái') in ['Closed', 'BE']]
-        
-        if not closed:
-            return {
-                'winrate': 0,
-                'total_pnl': 0,
-                'total_trades': 0,
-                'wins': 0,
-                'losses': 0,
-                'be': 0
-            }
-        
-        # Helper function to parse PnL - NO MULTIPLY
-        def parse_pnl(value):
-            if not value:
-                return 0.0
-            try:
-                # Remove comma, percentage, R suffix
-                clean_value = str(value).replace(',', '.').replace('%', '').replace('R', '').replace('r', '').strip()
-                return float(clean_value)
-            except:
-                return 0.0
-        
-        # Calculate stats
-        wins = [r for r in closed if parse_pnl(r.get('PnL_R', 0)) > 0]
-        losses = [r for r in closed if parse_pnl(r.get('PnL_R', 0)) < 0]
-        be_trades = [r for r in closed if r.get('Trạng thái') == 'BE']
-        
-        total_pnl = sum([parse_pnl(r.get('PnL_R', 0)) for r in closed])
-        winrate = len(wins) / len(closed) * 100 if closed else 0
-        
-        return {
-            'winrate': round(winrate, 1),
-            'total_pnl': round(total_pnl, 2),  # KHÔNG NHÂN GÌ
-            'total_trades': len(closed),
-            'wins': len(wins),
-            'losses': len(losses),
-            'be': len(be_trades)
-        }
-
+        self._ensure_cache(VIEW_COLUMNS)
+        with self._lock:
+            stats = self.stats.stats(start_date, end_date)
+            stats['partial_r'] = self._partial_r(start_date, end_date)
+            return stats
     
     def get_stats_by_category(self, category, start_date=None, end_date=None):
         """Get stats breakdown by category (Thị trường or Kiểu)"""
-        records = self.sheet.get_all_records()
-        
-        # Filter by date
-        if start_date:
-            records = [r for r in records if r.get('Timestamp', '') >= start_date]
-        if end_date:
-            records = [r for r in records if r.get('Timestamp', '') <= end_date]
-        
-        closed = [r for r in records if r.get('Trạng thái') in ['Closed', 'BE']]
-        
-        # Group by category
-        grouped = {}
-        for trade in closed:
-            key = trade.get(category, 'Unknown')
-            if key not in grouped:
-                grouped[key] = []
-            grouped[key].append(trade)
-        
-        # Calculate stats for each group
-        result = {}
-        for key, trades in grouped.items():
-            wins = [t for t in trades if float(t.get('PnL_R', 0) or 0) > 0]
-            total_pnl = sum([float(t.get('PnL_R', 0) or 0) for t in trades])
-            winrate = len(wins) / len(trades) * 100 if trades else 0
-            
-            result[key] = {
-                'winrate': round(winrate, 1),
-                'pnl': round(total_pnl, 2),
-                'trades': len(trades)
-            }
-        
-        return result
+        self._ensure_cache(VIEW_COLUMNS)
+        with self._lock:
+            return self.stats.stats_by_category(category, start_date, end_date)
+    
+    def get_columnar(self):
+        """ColumnarTrades of the whole journal, kept in step with the cache"""
+        self._ensure_cache(VIEW_COLUMNS)
+        with self._lock:
+            if self._columns is None:
+                self._columns = ColumnarTrades(self._to_trades(self._rows + list(self._pending_adds.values())))
+            return self._columns
+    
+    def query_stats(self, start_date=None, end_date=None, category=None, **filters):
+        """Stats with filters (market=, style=, direction=), optionally by category"""
+        columns = self.get_columnar()
+        with self._lock:
+            if category:
+                return columns.stats_by_category(category, start_date, end_date, **filters)
+            stats = columns.stats(start_date, end_date, **filters)
+            stats['partial_r'] = self._partial_r(start_date, end_date, **filters)
+            return stats
     
     def get_open_risk(self):
         """Get total open risk and breakdown by market/style"""
-        pending = self.get_pending_trades()
-        total_risk = sum([float(r.get('Risk%', 0) or 0) for r in pending])
-        
-        # Calculate risk by market and style
-        by_market = {}
-        by_style = {}
-        for trade in pending:
-            market = trade.get('Thị trường', 'Unknown')
-            style = trade.get('Kiểu', 'Unknown')
-            risk = float(trade.get('Risk%', 0) or 0)
-            
-            by_market[market] = by_market.get(market, 0) + risk
-            by_style[style] = by_style.get(style, 0) + risk
-        
+        self._ensure_cache(VIEW_COLUMNS)
+        with self._lock:
+            snapshot = self.open_risk.snapshot()
+            snapshot['sync_age'] = self.sync_age()
+            return snapshot
+    
+    def get_quota_stats(self):
+        """Counters of Sheets API calls, throttling and 429 retries"""
+        return self.quota.snapshot()
+    
+    def get_runtime_stats(self):
+        """Cache, quota and queue numbers for the metrics endpoint"""
         return {
-            'total': round(total_risk, 2),
-            'count': len(pending),
-            'market_count': {k: round(v, 2) for k, v in by_market.items()},
-            'style_count': {k: round(v, 2) for k, v in by_style.items()},
-            'trades': pending  # ← THÊM TRADES LIST
+            'cache': dict(self.cache_counters),
+            'quota': self.quota.snapshot(),
+            'queues': {
+                'outbox': len(self.outbox) if self.outbox is not None else 0,
+                'pending_adds': len(self._pending_adds),
+                'queued_updates': len(self._queued_updates),
+            },
         }
+    
+    def reconcile_open_risk(self):
+        """Reload the sheet and report drift of the open-risk view (slow periodic job)"""
+        with self._lock:
+            before = self.open_risk.snapshot()
+        with self.quota.background():
+            self.refresh_cache(self._cache_columns or VIEW_COLUMNS)
+        with self._lock:
+            after = self.open_risk.snapshot()
+        if (before['total'], before['count']) != (after['total'], after['count']):
+            print(f"⚠️ Open risk drifted: {before['total']}% / {before['count']} lệnh "
+                  f"-> {after['total']}% / {after['count']} lệnh")
+        return after
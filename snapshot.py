@@ -0,0 +1,50 @@
+import gc
+import logging
+import os
+import pickle
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled state changes shape (SheetsHandler fields, Trade, views)
+VERSION = 2
+MAGIC = b'TJSNAP'
+
+
+def write_snapshot(path, state):
+    """Atomically replace path with the pickled state, returns its size in bytes"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = MAGIC + bytes([VERSION]) + pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def read_snapshot(path):
+    """State saved by write_snapshot, None if missing, from another version or unreadable
+
+    Only load files this bot wrote itself (pickle).
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    header = MAGIC + bytes([VERSION])
+    if not data.startswith(header):
+        logger.warning(f"⚠️ Snapshot {path}: other format/version, ignoring")
+        return None
+    # Unpickling creates millions of objects, GC passes meanwhile only cost time
+    gc.disable()
+    try:
+        return pickle.loads(memoryview(data)[len(header):])
+    except Exception as e:
+        logger.warning(f"⚠️ Snapshot {path} unreadable, ignoring: {e}")
+        return None
+    finally:
+        gc.enable()
@@ -0,0 +1,396 @@
+import sqlite3
+import threading
+from storage import TradeStorage, HEADERS
+from timeutil import now_timestamp, to_epoch, format_timestamp
+from trade import Trade, FIELDS, parse_number
+from fills import Fill, check_fill
+
+# Sheet header -> SQLite column, named like the Trade fields
+COLUMNS = FIELDS
+NUMERIC_COLUMNS = {'entry', 'sl', 'risk', 'tp', 'pnl_r'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    market TEXT,
+    style TEXT,
+    direction TEXT,
+    ticker TEXT,
+    entry REAL,
+    sl REAL,
+    risk REAL,
+    chart TEXT,
+    reason TEXT,
+    tp REAL,
+    status TEXT NOT NULL DEFAULT 'Pending',
+    pnl_r REAL,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_status ON trades(status);
+CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades(timestamp);
+CREATE INDEX IF NOT EXISTS idx_trades_status_timestamp ON trades(status, timestamp);
+CREATE INDEX IF NOT EXISTS idx_trades_market ON trades(market);
+CREATE INDEX IF NOT EXISTS idx_trades_style ON trades(style);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    trade_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trade_id INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    percent REAL NOT NULL,
+    r REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fills_trade ON fills(trade_id);
+CREATE INDEX IF NOT EXISTS idx_fills_timestamp ON fills(timestamp);
+"""
+
+# Trades with the totals of their partial fills (closed_pct / realized_r like Trade)
+TRADES = (
+    'trades LEFT JOIN (SELECT trade_id, SUM(percent) AS closed_pct, SUM(percent * r) / 100 AS realized_r '
+    'FROM fills GROUP BY trade_id) AS f ON f.trade_id = trades.id'
+)
+# Trade.pnl and Trade.remaining_risk in SQL
+PNL = '(COALESCE(f.realized_r, 0) + (100 - COALESCE(f.closed_pct, 0)) / 100 * COALESCE(pnl_r, 0))'
+REMAINING_RISK = '(100 - COALESCE(f.closed_pct, 0)) / 100 * risk'
+
+CATEGORY_COLUMNS = {'Thị trường': 'market', 'Kiểu': 'style', 'Hướng': 'direction'}
+FILTER_COLUMNS = {'market': 'market', 'style': 'style', 'direction': 'direction'}
+
+
+def _from_db(value):
+    """SQLite value -> what get_all_records would return"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class SQLiteTradeStore(TradeStorage):
+    """Trade journal in a local SQLite file.
+
+    Stats and open risk are indexed SQL queries in-process. With a mirror
+    (a SheetsHandler with an outbox attached) every write is also queued
+    for the Google Sheet, which then is only a read-only view.
+    """
+
+    def __init__(self, path, mirror=None):
+        self.path = path
+        self.mirror = mirror
+        self._lock = threading.RLock()
+        self._queued_updates = {}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        print(f"✅ SQLite journal: {path}")
+
+        if mirror is not None:
+            self._sync_with_mirror()
+
+    def _sync_with_mirror(self):
+        """Import the sheet into an empty database, re-queue rows the sheet is missing"""
+        with self._lock:
+            count = self.conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+            if count == 0:
+                trades = self.mirror.get_all_trades()
+                self.import_trades(trades)
+                self.import_fills(self.mirror.get_all_fills())
+                print(f"✅ Imported {len(trades)} trades from Google Sheet")
+                return
+
+            # Rows added just before a crash may not have reached the outbox
+            known = self.mirror.known_trade_ids()
+            for row in self.conn.execute('SELECT * FROM trades ORDER BY id'):
+                if str(row['id']) not in known:
+                    self.mirror.mirror_add(row['id'], self._sheet_row(row))
+            known_fills = {fill.id for fill in self.mirror.get_all_fills()}
+            for row in self.conn.execute('SELECT * FROM fills ORDER BY id'):
+                if row['id'] not in known_fills:
+                    self.mirror.mirror_fill(self._to_fill(row))
+
+    def import_trades(self, trades):
+        """Insert Trade records keeping their IDs"""
+        with self._lock, self.conn:
+            for trade in trades:
+                values = {column: getattr(trade, column) for column in COLUMNS.values()}
+                columns = ', '.join(values)
+                placeholders = ', '.join('?' for _ in values)
+                self.conn.execute(
+                    f'INSERT OR REPLACE INTO trades ({columns}) VALUES ({placeholders})',
+                    list(values.values())
+                )
+
+    def import_fills(self, fills):
+        """Insert Fill records keeping their IDs"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO fills (id, trade_id, timestamp, percent, r) VALUES (?, ?, ?, ?, ?)',
+                [fill.to_row() for fill in fills]
+            )
+
+    @staticmethod
+    def _to_trade(row):
+        return Trade.from_cells(dict(row))
+
+    @staticmethod
+    def _to_fill(row):
+        return Fill.create(row['id'], row['trade_id'], row['percent'], row['r'], row['timestamp'])
+
+    def _sheet_row(self, row):
+        """SQLite row -> list of cells in sheet column order"""
+        return [_from_db(row[COLUMNS[header]]) for header in HEADERS]
+
+    # === TRADES ===
+
+    def add_trade(self, trade_data, idempotency_key=None):
+        """Add new trade, returns its ID"""
+        with self._lock, self.conn:
+            if idempotency_key:
+                existing = self.conn.execute(
+                    'SELECT trade_id FROM idempotency_keys WHERE key = ?', (idempotency_key,)
+                ).fetchone()
+                if existing:
+                    return existing[0]
+
+            cursor = self.conn.execute(
+                'INSERT INTO trades (timestamp, market, style, direction, ticker, entry, sl, risk, chart, reason, status) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    now_timestamp(),
+                    trade_data['market'],
+                    trade_data['style'],
+                    trade_data['direction'],
+                    trade_data['ticker'],
+                    trade_data['entry'],
+                    trade_data['sl'],
+                    trade_data['risk'],
+                    trade_data.get('chart', ''),
+                    trade_data.get('reason', ''),
+                    'Pending',
+                )
+            )
+            trade_id = cursor.lastrowid
+            if idempotency_key:
+                self.conn.execute(
+                    'INSERT INTO idempotency_keys (key, trade_id) VALUES (?, ?)', (idempotency_key, trade_id)
+                )
+
+        if self.mirror is not None:
+            row = self.conn.execute('SELECT * FROM trades WHERE id = ?', (trade_id,)).fetchone()
+            self.mirror.mirror_add(trade_id, self._sheet_row(row))
+        return trade_id
+
+    def get_trade_by_id(self, trade_id):
+        """Get trade details by ID"""
+        with self._lock:
+            row = self.conn.execute(f'SELECT * FROM {TRADES} WHERE id = ?', (trade_id,)).fetchone()
+        return self._to_trade(row) if row else None
+
+    def update_trade_by_id(self, trade_id, updates):
+        """Update trade by ID with dict of updates"""
+        return self.update_trades_batch({trade_id: updates})[trade_id]
+
+    def update_trades_batch(self, updates_by_id):
+        """Update several trades in one transaction"""
+        result = {}
+        mirrored = []
+        with self._lock, self.conn:
+            for trade_id, updates in updates_by_id.items():
+                values = {}
+                for header, value in updates.items():
+                    column = COLUMNS.get(header)
+                    if column is None or column == 'id':
+                        continue
+                    values[column] = parse_number(value) if column in NUMERIC_COLUMNS else value
+
+                if values:
+                    assignments = ', '.join(f'{column} = ?' for column in values)
+                    cursor = self.conn.execute(
+                        f'UPDATE trades SET {assignments} WHERE id = ?', [*values.values(), trade_id]
+                    )
+                    found = cursor.rowcount > 0
+                else:
+                    found = self.conn.execute('SELECT 1 FROM trades WHERE id = ?', (trade_id,)).fetchone() is not None
+
+                result[trade_id] = found
+                if found and values:
+                    mirrored.append((trade_id, updates))
+
+        if self.mirror is not None:
+            for trade_id, updates in mirrored:
+                self.mirror.mirror_updates(trade_id, updates)
+        return result
+
+    def add_fill(self, trade_id, percent, r):
+        """Record a partial close, returns the Fill (None if the trade is not found)
+
+        ValueError if the trade is no longer Pending or too much is closed.
+        """
+        with self._lock, self.conn:
+            trade = self.conn.execute('SELECT status FROM trades WHERE id = ?', (trade_id,)).fetchone()
+            if trade is None:
+                return None
+            closed = self.conn.execute(
+                'SELECT COALESCE(SUM(percent), 0) FROM fills WHERE trade_id = ?', (trade_id,)
+            ).fetchone()[0]
+            check_fill(trade['status'], percent, closed)
+            timestamp = now_timestamp()
+            cursor = self.conn.execute(
+                'INSERT INTO fills (trade_id, timestamp, percent, r) VALUES (?, ?, ?, ?)',
+                (trade_id, timestamp, percent, r)
+            )
+            fill = Fill.create(cursor.lastrowid, trade_id, percent, r, timestamp)
+
+        if self.mirror is not None:
+            self.mirror.mirror_fill(fill)
+        return fill
+
+    def queue_update(self, trade_id, updates):
+        """Queue updates for a trade, later values for the same column win"""
+        with self._lock:
+            self._queued_updates.setdefault(trade_id, {}).update(updates)
+
+    def flush_updates(self):
+        """Write all queued updates in one transaction"""
+        with self._lock:
+            queued = self._queued_updates
+            self._queued_updates = {}
+            if not queued:
+                return {}
+            return self.update_trades_batch(queued)
+
+    def get_pending_trades(self):
+        """Get all pending trades"""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM {TRADES} WHERE status = 'Pending' ORDER BY id"
+            ).fetchall()
+        return [self._to_trade(row) for row in rows]
+
+    # === STATS ===
+
+    @staticmethod
+    def _period_filter(start_date, end_date, status="status IN ('Closed', 'BE')", time_column='timestamp',
+                       **filters):
+        # Stored timestamps are TIMEZONE strings, so compare in the same zone
+        clauses = [status]
+        params = []
+        start = to_epoch(start_date)
+        end = to_epoch(end_date)
+        if start is not None:
+            clauses.append(f'{time_column} >= ?')
+            params.append(format_timestamp(start))
+        if end is not None:
+            clauses.append(f'{time_column} <= ?')
+            params.append(format_timestamp(end))
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+            clauses.append(f"{FILTER_COLUMNS[name]} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        return ' AND '.join(clauses), params
+
+    def get_stats(self, start_date=None, end_date=None, **filters):
+        """Get trading statistics for a period"""
+        where, params = self._period_filter(start_date, end_date, **filters)
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT COUNT(*) AS total, '
+                f'COALESCE(SUM({PNL} > 0), 0) AS wins, '
+                f'COALESCE(SUM({PNL} < 0), 0) AS losses, '
+                "COALESCE(SUM(status = 'BE'), 0) AS be, "
+                f'COALESCE(SUM({PNL}), 0) AS total_pnl '
+                f'FROM {TRADES} WHERE {where}',
+                params
+            ).fetchone()
+            # Partial fills of trades still open, by fill time
+            where, params = self._period_filter(start_date, end_date, status="status = 'Pending'",
+                                                time_column='fills.timestamp', **filters)
+            partial_r = self.conn.execute(
+                'SELECT COALESCE(SUM(percent * r) / 100, 0) FROM fills JOIN trades ON trades.id = fills.trade_id '
+                f'WHERE {where}',
+                params
+            ).fetchone()[0]
+
+        total = row['total']
+        winrate = row['wins'] / total * 100 if total else 0
+        return {
+            'winrate': round(winrate, 1),
+            'total_pnl': round(row['total_pnl'], 2),
+            'total_trades': total,
+            'wins': row['wins'],
+            'losses': row['losses'],
+            'be': row['be'],
+            'partial_r': round(partial_r, 2)
+        }
+
+    def get_stats_by_category(self, category, start_date=None, end_date=None, **filters):
+        """Get stats breakdown by category (Thị trường or Kiểu)"""
+        column = CATEGORY_COLUMNS[category]
+        where, params = self._period_filter(start_date, end_date, **filters)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT COALESCE({column}, 'Unknown') AS key, COUNT(*) AS trades, "
+                f'COALESCE(SUM({PNL} > 0), 0) AS wins, COALESCE(SUM({PNL}), 0) AS pnl '
+                f'FROM {TRADES} WHERE {where} GROUP BY key',
+                params
+            ).fetchall()
+
+        return {
+            row['key']: {
+                'winrate': round(row['wins'] / row['trades'] * 100, 1),
+                'pnl': round(row['pnl'], 2),
+                'trades': row['trades']
+            }
+            for row in rows
+        }
+
+    def query_stats(self, start_date=None, end_date=None, category=None, **filters):
+        """Stats with filters (market=, style=, direction=) as indexed SQL"""
+        if category:
+            return self.get_stats_by_category(category, start_date, end_date, **filters)
+        return self.get_stats(start_date, end_date, **filters)
+
+    def get_open_risk(self):
+        """Get total open risk and breakdown by market/style"""
+        pending = self.get_pending_trades()
+
+        by_market = {}
+        by_style = {}
+        with self._lock:
+            for row in self.conn.execute(
+                f"SELECT market, SUM({REMAINING_RISK}) AS risk FROM {TRADES} WHERE status = 'Pending' GROUP BY market"
+            ):
+                by_market[row['market'] or 'Unknown'] = row['risk'] or 0
+            for row in self.conn.execute(
+                f"SELECT style, SUM({REMAINING_RISK}) AS risk FROM {TRADES} WHERE status = 'Pending' GROUP BY style"
+            ):
+                by_style[row['style'] or 'Unknown'] = row['risk'] or 0
+
+        return {
+            'total': round(sum(t.remaining_risk for t in pending), 2),
+            'count': len(pending),
+            'market_count': {k: round(v, 2) for k, v in by_market.items()},
+            'style_count': {k: round(v, 2) for k, v in by_style.items()},
+            'trades': pending
+        }
+
+    # === MIRROR ===
+
+    def get_runtime_stats(self):
+        """Mirror numbers (cache, quota, outbox) plus the local update queue"""
+        stats = self.mirror.get_runtime_stats() if self.mirror is not None else {}
+        stats.setdefault('queues', {})['queued_updates'] = len(self._queued_updates)
+        return stats
+
+    def flush_outbox(self):
+        """Send queued mirror writes to the Google Sheet"""
+        if self.mirror is None:
+            return 0
+        return self.mirror.flush_outbox()
@@ -0,0 +1,180 @@
+import bisect
+from timeutil import to_epoch, local_day, day_bounds
+
+
+def _empty():
+    # trades, wins, losses, be, pnl
+    return [0, 0, 0, 0, 0.0]
+
+
+def _add_into(total, values, sign=1):
+    for i in range(5):
+        total[i] += sign * values[i]
+
+
+class StatsAggregator:
+    """Running win/loss/BE/PnL totals bucketed by day x market x style.
+
+    Each closed trade contributes to exactly one bucket. update_trade()
+    moves a trade between buckets when it is closed, set to BE, cancelled
+    or edited, so a period report only merges the buckets of its days.
+    Trades arrive as Trade records with the epoch already parsed and are
+    kept in a sorted timeline; the partly covered days at the edges of a period are
+    a binary-searched slice of it.
+    """
+
+    def __init__(self):
+        self._by_trade = {}     # trade ID -> (epoch, market, style, values)
+        self._timeline = []     # sorted (epoch, trade ID) of dated closed trades
+        self._day_buckets = {}  # day -> {(market, style): values}
+        self._days = []         # sorted days that have buckets
+        self._day_bounds = {}   # day -> (start epoch, next day start epoch)
+        self._undated = {}      # trade ID -> (market, style, values), no valid timestamp
+
+    def rebuild(self, trades):
+        """Recompute from Trade records"""
+        self.__init__()
+        for trade in trades:
+            self.update_trade(trade)
+
+    def copy(self):
+        """Copy that later updates do not change (entries are replaced, never edited)"""
+        other = StatsAggregator.__new__(StatsAggregator)
+        other._by_trade = dict(self._by_trade)
+        other._timeline = list(self._timeline)
+        other._day_buckets = {
+            day: {key: list(values) for key, values in buckets.items()}
+            for day, buckets in self._day_buckets.items()
+        }
+        other._days = list(self._days)
+        other._day_bounds = dict(self._day_bounds)
+        other._undated = dict(self._undated)
+        return other
+
+    def update_trade(self, trade):
+        """Add, move or remove the contribution of one trade"""
+        trade_id = trade.id
+        self.remove_trade(trade_id)
+
+        if not trade.is_closed:
+            return
+
+        pnl = trade.pnl
+        values = [
+            1,
+            1 if pnl > 0 else 0,
+            1 if pnl < 0 else 0,
+            1 if trade.status == 'BE' else 0,
+            pnl,
+        ]
+        market = trade.market
+        style = trade.style
+        epoch = trade.epoch
+        self._by_trade[trade_id] = (epoch, market, style, values)
+
+        if epoch is None:
+            self._undated[trade_id] = (market, style, values)
+            return
+
+        bisect.insort(self._timeline, (epoch, trade_id))
+        day = local_day(epoch)
+        if day not in self._day_buckets:
+            self._day_buckets[day] = {}
+            self._day_bounds[day] = day_bounds(day)
+            bisect.insort(self._days, day)
+        bucket = self._day_buckets[day].setdefault((market, style), _empty())
+        _add_into(bucket, values)
+
+    def remove_trade(self, trade_id):
+        entry = self._by_trade.pop(trade_id, None)
+        if entry is None:
+            return
+        epoch, market, style, values = entry
+        if epoch is None:
+            del self._undated[trade_id]
+            return
+
+        self._timeline.pop(bisect.bisect_left(self._timeline, (epoch, trade_id)))
+        day = local_day(epoch)
+        buckets = self._day_buckets[day]
+        _add_into(buckets[(market, style)], values, sign=-1)
+        if buckets[(market, style)][0] == 0:
+            del buckets[(market, style)]
+        if not buckets:
+            del self._day_buckets[day]
+            del self._day_bounds[day]
+            self._days.pop(bisect.bisect_left(self._days, day))
+
+    def _slice(self, start, end):
+        """Contributions of trades with start <= epoch <= end (binary search)"""
+        lo = bisect.bisect_left(self._timeline, (start,))
+        hi = bisect.bisect_left(self._timeline, (end + 1,))
+        for _, trade_id in self._timeline[lo:hi]:
+            _, market, style, values = self._by_trade[trade_id]
+            yield market, style, values
+
+    def _collect(self, start_date=None, end_date=None):
+        """Yield (market, style, values) covering the period (inclusive bounds)"""
+        start = to_epoch(start_date)
+        end = to_epoch(end_date)
+        if start is None and end is None:
+            # Only an unbounded report can include trades without a date
+            yield from self._undated.values()
+        if not self._days:
+            return
+        if start is None:
+            start = self._timeline[0][0]
+        if end is None:
+            end = self._timeline[-1][0]
+
+        # Days fully inside [start, end] come from their buckets
+        lo = bisect.bisect_left(self._days, local_day(start))
+        if lo < len(self._days) and self._day_bounds[self._days[lo]][0] < start:
+            lo += 1
+        hi = bisect.bisect_right(self._days, local_day(end)) - 1
+        if hi >= 0 and self._day_bounds[self._days[hi]][1] > end + 1:
+            hi -= 1
+
+        if lo > hi:
+            yield from self._slice(start, end)
+            return
+
+        # Partly covered edges come from the timeline
+        yield from self._slice(start, self._day_bounds[self._days[lo]][0] - 1)
+        for day in self._days[lo:hi + 1]:
+            for (market, style), values in self._day_buckets[day].items():
+                yield market, style, values
+        yield from self._slice(self._day_bounds[self._days[hi]][1], end)
+
+    def stats(self, start_date=None, end_date=None):
+        """Same result as SheetsHandler.get_stats"""
+        total = _empty()
+        for _, _, values in self._collect(start_date, end_date):
+            _add_into(total, values)
+
+        trades, wins, losses, be, pnl = total
+        winrate = wins / trades * 100 if trades else 0
+        return {
+            'winrate': round(winrate, 1),
+            'total_pnl': round(pnl, 2) if trades else 0,
+            'total_trades': trades,
+            'wins': wins,
+            'losses': losses,
+            'be': be
+        }
+
+    def stats_by_category(self, category, start_date=None, end_date=None):
+        """Same result as SheetsHandler.get_stats_by_category"""
+        grouped = {}
+        for market, style, values in self._collect(start_date, end_date):
+            key = market if category == 'Thị trường' else style
+            _add_into(grouped.setdefault(key, _empty()), values)
+
+        result = {}
+        for key, (trades, wins, _, _, pnl) in grouped.items():
+            result[key] = {
+                'winrate': round(wins / trades * 100, 1) if trades else 0,
+                'pnl': round(pnl, 2),
+                'trades': trades
+            }
+        return result
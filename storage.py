@@ -0,0 +1,161 @@
+from abc import ABC, abstractmethod
+from config import STORAGE_BACKEND, SQLITE_PATH, OUTBOX_PATH
+
+# Journal columns, same order as the Google Sheet
+HEADERS = [
+    'ID', 'Timestamp', 'Thị trường', 'Kiểu', 'Hướng', 'Ticker',
+    'Entry', 'SL', 'Risk%', 'Chart', 'Lý do', 'TP',
+    'Trạng thái', 'PnL_R', 'Ghi chú'
+]
+
+# Partial closes ledger: % of the original size closed at R
+FILL_HEADERS = ['ID', 'Trade ID', 'Timestamp', '%', 'R']
+
+
+class TradeStorage(ABC):
+    """Interface of a trade journal backend.
+    
+    Trades are read as Trade records, updates are dicts keyed by HEADERS.
+    Implementations: SheetsHandler (Google Sheets) and SQLiteTradeStore (local SQLite).
+    """
+    
+    @abstractmethod
+    def add_trade(self, trade_data, idempotency_key=None):
+        """Add new trade, returns its ID"""
+    
+    @abstractmethod
+    def get_trade_by_id(self, trade_id):
+        """Trade or None"""
+    
+    @abstractmethod
+    def update_trade_by_id(self, trade_id, updates):
+        """Update columns of one trade, False if not found"""
+    
+    @abstractmethod
+    def update_trades_batch(self, updates_by_id):
+        """{trade_id: {column: value}} -> {trade_id: found}"""
+    
+    @abstractmethod
+    def add_fill(self, trade_id, percent, r):
+        """Record a partial close, returns the Fill (None if the trade is not found)
+        
+        ValueError unless 0 < percent < the % still open.
+        """
+    
+    @abstractmethod
+    def queue_update(self, trade_id, updates):
+        """Queue updates, sent by flush_updates()"""
+    
+    @abstractmethod
+    def flush_updates(self):
+        """Send queued updates together"""
+    
+    @abstractmethod
+    def get_pending_trades(self):
+        """Open trades, Risk% parsed to float"""
+    
+    @abstractmethod
+    def get_stats(self, start_date=None, end_date=None):
+        """winrate / total_pnl / total_trades / wins / losses / be for a period
+        
+        PnL of a closed trade counts its partial fills; partial_r is the R
+        realized in the period by fills of trades still open.
+        """
+    
+    @abstractmethod
+    def get_stats_by_category(self, category, start_date=None, end_date=None):
+        """{value of category: {winrate, pnl, trades}}"""
+    
+    @abstractmethod
+    def get_open_risk(self):
+        """total / count / market_count / style_count / trades, risk of the size still open"""
+    
+    @abstractmethod
+    def query_stats(self, start_date=None, end_date=None, category=None, **filters):
+        """get_stats (or get_stats_by_category) filtered by market=, style=, direction="""
+    
+    def reconcile_open_risk(self):
+        """Re-check open risk against the source of truth, returns get_open_risk()"""
+        return self.get_open_risk()
+    
+    def refresh_cache(self):
+        """Reload cached data, no-op for backends without a cache"""
+    
+    def sync_delta(self):
+        """Pull changes since the last load, returns rows changed (0 without a cache)"""
+        return 0
+    
+    def get_runtime_stats(self):
+        """{'cache': {...}, 'quota': {...}, 'queues': {...}} counters for metrics"""
+        return {}
+    
+    def check_for_changes(self):
+        """Sync cached data if the source changed elsewhere, True if synced"""
+        return False
+    
+    def invalidate_cache(self):
+        """Drop cached data, no-op for backends without a cache"""
+    
+    def save_snapshot(self):
+        """Save cached state for a warm start, False if not supported"""
+        return False
+    
+    def flush_outbox(self):
+        """Send pending write-behind entries, returns number sent"""
+        return 0
+    
+    def calculate_new_risk(self, entry, old_sl, new_sl, old_risk, direction):
+        """Calculate new risk % after moving SL"""
+        try:
+            entry = float(entry)
+            old_sl = float(old_sl)
+            new_sl = float(new_sl)
+            old_risk = float(old_risk)
+            
+            if direction == 'BUY':
+                old_distance = entry - old_sl
+                new_distance = entry - new_sl
+            else:  # SELL
+                old_distance = old_sl - entry
+                new_distance = new_sl - entry
+            
+            if old_distance == 0:
+                return 0
+            
+            # Calculate new risk proportionally
+            new_risk = (new_distance / old_distance) * old_risk
+            
+            # FIX: Return value directly, NO multiplication
+            return round(new_risk, 2)
+            
+        except Exception as e:
+            print(f"❌ Error calculating risk: {e}")
+            return old_risk
+
+
+def create_storage():
+    """Build the backend selected by STORAGE_BACKEND"""
+    from outbox import Outbox
+    
+    if STORAGE_BACKEND == 'sheets':
+        from sheets_handler import SheetsHandler
+        storage = SheetsHandler()
+        # Cache from the last snapshot + one delta sync, no full download
+        storage.load_snapshot()
+        if OUTBOX_PATH:
+            # Writes are acknowledged once on disk, run_outbox_worker sends them to Sheets
+            storage.attach_outbox(Outbox(OUTBOX_PATH))
+        return storage
+    
+    if STORAGE_BACKEND in ('sqlite', 'sqlite+sheets'):
+        from sqlite_store import SQLiteTradeStore
+        mirror = None
+        if STORAGE_BACKEND == 'sqlite+sheets':
+            from sheets_handler import SheetsHandler
+            if not OUTBOX_PATH:
+                raise ValueError("❌ STORAGE_BACKEND=sqlite+sheets needs OUTBOX_PATH")
+            mirror = SheetsHandler()
+            mirror.attach_outbox(Outbox(OUTBOX_PATH))
+        return SQLiteTradeStore(SQLITE_PATH, mirror=mirror)
+    
+    raise ValueError(f"❌ Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.fake_sheet import FakeWorksheet
+from storage import HEADERS
+
+
+@pytest.fixture
+def trade():
+    """add_trade() input of a plain pending trade"""
+    return dict(market='Tiền tệ', style='Day', direction='BUY', ticker='EURUSD',
+                entry=1.1, sl=1.09, risk=1.0, chart='', reason='test')
+
+
+@pytest.fixture
+def ws():
+    """Empty journal worksheet (header row only)"""
+    return FakeWorksheet([list(HEADERS)])
+
+
+@pytest.fixture
+def sheet_status():
+    """Trạng thái cell of a trade in a FakeWorksheet, None if the trade is not there"""
+    def status(worksheet, trade_id):
+        for row in worksheet.rows[1:]:
+            if row and row[0] == str(trade_id):
+                return row[HEADERS.index('Trạng thái')]
+        return None
+    return status
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+from async_sheets import AsyncSheetsHandler
+
+
+class SlowHandler:
+    """Handler stub counting calls, reads block until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def get_pending_trades(self):
+        self.calls.append('get_pending_trades')
+        self.release.wait(5)
+        return ['trade']
+
+    def get_stats(self, start_date=None, end_date=None):
+        self.calls.append(('get_stats', start_date, end_date))
+        return {'total_trades': len(self.calls)}
+
+    def update_trade_by_id(self, trade_id, updates):
+        self.calls.append('update_trade_by_id')
+        return True
+
+
+def test_concurrent_identical_reads_make_one_call():
+    async def scenario():
+        handler = SlowHandler()
+        sheets = AsyncSheetsHandler(handler=handler, grace=0)
+        readers = [asyncio.ensure_future(sheets.get_pending_trades()) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        handler.release.set()
+        results = await asyncio.gather(*readers)
+        sheets.shutdown()
+        return handler.calls, results, sheets.single_flight
+
+    calls, results, single_flight = asyncio.run(scenario())
+    assert calls == ['get_pending_trades']
+    assert results == [['trade']] * 5
+    assert single_flight == {'calls': 1, 'shared': 4, 'grace_hits': 0}
+
+
+def test_grace_window_reuses_a_read_until_a_write():
+    async def scenario():
+        handler = SlowHandler()
+        sheets = AsyncSheetsHandler(handler=handler, grace=60)
+        first = await sheets.get_stats('2024-03-01')
+        again = await sheets.get_stats('2024-03-01')
+        other_period = await sheets.get_stats('2024-04-01')
+        await sheets.update_trade_by_id(1, {'Trạng thái': 'Closed'})
+        after_write = await sheets.get_stats('2024-03-01')
+        sheets.shutdown()
+        return first, again, other_period, after_write, sheets.single_flight
+
+    first, again, other_period, after_write, single_flight = asyncio.run(scenario())
+    assert again is first
+    assert other_period == {'total_trades': 2}
+    assert after_write == {'total_trades': 4}
+    assert single_flight['grace_hits'] == 1
+    assert single_flight['calls'] == 3
+
+
+def test_grace_zero_reads_again():
+    async def scenario():
+        handler = SlowHandler()
+        sheets = AsyncSheetsHandler(handler=handler, grace=0)
+        await sheets.get_stats()
+        await sheets.get_stats()
+        sheets.shutdown()
+        return handler.calls
+
+    assert len(asyncio.run(scenario())) == 2
@@ -0,0 +1,39 @@
+import pytest
+
+from sheets_handler import SheetsHandler
+from sqlite_store import SQLiteTradeStore
+
+
+def test_warm_start_picks_up_fills_after_snapshot(tmp_path, monkeypatch, ws, trade):
+    """Fills written after the last snapshot are loaded and their IDs not reused"""
+    monkeypatch.setattr('sheets_handler.SNAPSHOT_PATH', str(tmp_path / 'journal.snapshot'))
+    handler = SheetsHandler(worksheet=ws)
+    fills_ws = ws.spreadsheet.worksheets['Fills']
+    trade_id = handler.add_trade(trade)
+    handler.get_all_trades()
+    handler.add_fill(trade_id, 25, 1)
+    assert handler.save_snapshot()
+    late = handler.add_fill(trade_id, 25, 2)
+
+    restarted = SheetsHandler(worksheet=ws)
+    assert restarted.load_snapshot()
+    assert [f.id for f in restarted.get_all_fills()] == [1, late.id]
+    assert restarted.get_trade_by_id(trade_id).closed_pct == 50
+
+    fill = restarted.add_fill(trade_id, 10, 1)
+    assert fill.id == late.id + 1
+    assert len([row for row in fills_ws.rows[1:] if any(row)]) == 3
+
+
+@pytest.mark.parametrize('backend', ['sheets', 'sqlite'])
+def test_no_fill_on_closed_trade(tmp_path, backend, ws, trade):
+    if backend == 'sheets':
+        storage = SheetsHandler(worksheet=ws)
+    else:
+        storage = SQLiteTradeStore(str(tmp_path / 'journal.db'))
+    trade_id = storage.add_trade(trade)
+    storage.update_trade_by_id(trade_id, {'Trạng thái': 'Closed', 'PnL_R': 1})
+
+    with pytest.raises(ValueError):
+        storage.add_fill(trade_id, 50, 1)
+    assert storage.get_trade_by_id(trade_id).closed_pct == 0
@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+from locks import ChatUpdateProcessor, KeyedLock
+
+
+def test_keyed_lock_is_exclusive_per_key():
+    async def scenario():
+        lock = KeyedLock('trade')
+        order = []
+
+        async def hold(key, tag, seconds):
+            async with lock.hold(key):
+                order.append(f"{tag} in")
+                await asyncio.sleep(seconds)
+                order.append(f"{tag} out")
+
+        first = asyncio.ensure_future(hold(7, 'a', 0.05))
+        await asyncio.sleep(0)
+        held = len(lock)
+        await asyncio.gather(first, hold(7, 'b', 0), hold(8, 'c', 0))
+        return order, held, len(lock)
+
+    order, held, left = asyncio.run(scenario())
+    # b waits for a on trade 7, c on trade 8 does not
+    assert order == ['a in', 'c in', 'c out', 'a out', 'b in', 'b out']
+    assert held == 1
+    assert left == 0
+
+
+def _update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+
+def test_chat_updates_take_turns_other_chats_do_not_wait():
+    async def scenario():
+        processor = ChatUpdateProcessor(8)
+        running = []
+        overlaps = []
+
+        async def handle(chat_id):
+            if chat_id in running:
+                overlaps.append(chat_id)
+            running.append(chat_id)
+            await asyncio.sleep(0.05)
+            running.remove(chat_id)
+
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            processor.process_update(_update(1), handle(1)),
+            processor.process_update(_update(1), handle(1)),
+            processor.process_update(_update(2), handle(2)),
+        )
+        return overlaps, asyncio.get_running_loop().time() - start
+
+    overlaps, elapsed = asyncio.run(scenario())
+    assert overlaps == []
+    assert elapsed < 0.14  # chat 2 ran alongside chat 1
@@ -0,0 +1,101 @@
+import pytest
+
+from outbox import Outbox
+from sheets_handler import SheetsHandler
+from storage import HEADERS
+
+
+def test_update_after_replayed_add_reaches_sheet(tmp_path, monkeypatch, ws, trade, sheet_status):
+    """Append landed, ack lost, trade closed, restart: the close must still be sent"""
+    path = str(tmp_path / 'outbox.jsonl')
+
+    handler = SheetsHandler(worksheet=ws)
+    handler.attach_outbox(Outbox(path))
+    trade_id = handler.add_trade(trade)
+
+    def crash(seqs):
+        raise RuntimeError('crash before ack')
+    monkeypatch.setattr(handler.outbox, 'ack', crash)
+    with pytest.raises(RuntimeError):
+        handler.flush_outbox()
+    assert sheet_status(ws, trade_id) == 'Pending'
+
+    handler.update_trade_by_id(trade_id, {'Trạng thái': 'Closed', 'PnL_R': 2})
+
+    # Restart on the same outbox file
+    restarted = SheetsHandler(worksheet=ws)
+    restarted.attach_outbox(Outbox(path))
+    restarted.flush_outbox()
+
+    assert sheet_status(ws, trade_id) == 'Closed'
+    assert sum(1 for row in ws.rows[1:] if row and row[0] == str(trade_id)) == 1
+    assert restarted.get_trade_by_id(trade_id).status == 'Closed'
+    assert len(restarted.outbox) == 0
+
+
+def test_outbox_queues_writes_while_sheets_is_down(tmp_path, monkeypatch, ws, trade):
+    """Stale index and a failing sheet: updates and fills still reach the outbox"""
+    handler = SheetsHandler(worksheet=ws)
+    handler.attach_outbox(Outbox(str(tmp_path / 'outbox.jsonl')))
+    trade_id = handler.add_trade(trade)
+    handler.flush_outbox()
+    handler.get_all_trades()
+    handler.cache_ttl = 0  # index and cache are stale
+
+    def down(*args, **kwargs):
+        raise ConnectionError('sheets down')
+    for worksheet in ws.spreadsheet.worksheets.values():
+        for name in ('col_values', 'row_values', 'get_all_values', 'batch_get'):
+            monkeypatch.setattr(worksheet, name, down)
+
+    assert handler.update_trade_by_id(trade_id, {'SL': 1.095})
+    fill = handler.add_fill(trade_id, 50, 1.5)
+    assert fill is not None
+    assert len(handler.outbox) == 2
+
+    monkeypatch.undo()
+    handler.flush_outbox()
+    assert ws.rows[1][HEADERS.index('SL')] == '1.095'
+    fills = ws.spreadsheet.worksheets['Fills'].rows
+    assert [row[:2] for row in fills[1:]] == [[str(fill.id), str(trade_id)]]
+    assert len(handler.outbox) == 0
+
+
+def test_flush_renumbers_a_fill_whose_id_is_taken(tmp_path, ws, trade):
+    """A fill queued before the ledger was loaded gets the next free ID"""
+    first = SheetsHandler(worksheet=ws)
+    trade_id = first.add_trade(trade)
+    first.add_fill(trade_id, 25, 1)
+
+    second = SheetsHandler(worksheet=ws)
+    second.attach_outbox(Outbox(str(tmp_path / 'outbox.jsonl')))
+    assert second.add_fill(trade_id, 25, 2).id == 1
+    second.flush_outbox()
+
+    rows = ws.spreadsheet.worksheets['Fills'].rows[1:]
+    assert [(row[0], row[4]) for row in rows] == [('1', '1'), ('2', '2')]
+    assert [f.id for f in second.get_all_fills()] == [1, 2]
+
+
+def test_warm_start_shows_unsent_adds_in_the_views(tmp_path, monkeypatch, ws, trade):
+    """Adds still in the outbox after a restart count in open risk and the pending list"""
+    monkeypatch.setattr('sheets_handler.SNAPSHOT_PATH', str(tmp_path / 'journal.snapshot'))
+    path = str(tmp_path / 'outbox.jsonl')
+
+    handler = SheetsHandler(worksheet=ws)
+    handler.attach_outbox(Outbox(path))
+    sent = handler.add_trade(trade)
+    handler.flush_outbox()
+    handler.get_all_trades()
+    assert handler.save_snapshot()
+    unsent = handler.add_trade(trade)
+
+    restarted = SheetsHandler(worksheet=ws)
+    assert restarted.load_snapshot()
+    restarted.attach_outbox(Outbox(path))
+    assert restarted.get_open_risk()['count'] == 2
+    assert [t.id for t in restarted.get_pending_trades()] == [sent, unsent]
+
+    restarted.flush_outbox()
+    assert restarted.get_open_risk()['count'] == 2
+    assert [t.id for t in restarted.get_pending_trades()] == [sent, unsent]
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from quota import QuotaExceeded, QuotaManager, TokenBucket
+
+
+class RateLimited(Exception):
+    class response:
+        status_code = 429
+
+
+def _always_429():
+    raise RateLimited()
+
+
+def test_retries_stop_at_max_wait():
+    """429 backoff gives up within max_wait, before the facade's call timeout"""
+    quota = QuotaManager(max_retries=10, max_backoff=32, max_wait=2)
+    start = time.monotonic()
+    with pytest.raises(QuotaExceeded):
+        quota.call('write', _always_429)
+    assert time.monotonic() - start < 2
+    assert quota.snapshot()['quota_exceeded'] == 1
+
+
+def test_token_wait_stops_at_max_wait():
+    quota = QuotaManager(reads_per_minute=1, max_wait=0.5)
+    quota.call('read', lambda: 'first')
+    with pytest.raises(QuotaExceeded):
+        quota.call('read', lambda: 'second')
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    for _ in range(2):
+        assert bucket.wait_time() == 0
+        bucket.take()
+    assert bucket.wait_time() == pytest.approx(1, abs=0.05)
+
+    bucket.updated -= 0.5
+    assert bucket.wait_time() == pytest.approx(0.5, abs=0.05)
+    bucket.updated -= 60
+    assert bucket.wait_time() == 0
+    assert bucket.tokens == 2
+
+
+def test_429_backs_off_and_retries(monkeypatch):
+    monkeypatch.setattr('quota.random.random', lambda: 0)
+    quota = QuotaManager(max_retries=3, max_backoff=0.05, max_wait=5)
+    answers = [RateLimited(), RateLimited(), 'rows']
+
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert quota.call('write', flaky) == 'rows'
+    counters = quota.snapshot()
+    assert counters['writes'] == 3
+    assert counters['rate_limited'] == 2
+    assert counters['quota_exceeded'] == 0
+    assert quota._paused_until['write'] > 0
+    assert quota._paused_until['read'] == 0
+
+
+def test_identical_reads_in_flight_share_one_request():
+    quota = QuotaManager()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    class Sheet:
+        def get_all_values(self):
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return [['ID'], ['1']]
+
+    sheet = Sheet()
+    results = []
+    first = threading.Thread(target=lambda: results.append(quota.call('read', sheet.get_all_values)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(quota.call('read', sheet.get_all_values)))
+    second.start()
+    while not quota._inflight[next(iter(quota._inflight))][1]:
+        time.sleep(0.01)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(calls) == 1
+    assert quota.snapshot()['coalesced'] == 1
+    assert results[0] == results[1] and results[0] is not results[1]
+    # Nothing in flight any more: the next read is a new request
+    quota.call('read', sheet.get_all_values)
+    assert len(calls) == 2
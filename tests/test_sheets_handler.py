@@ -0,0 +1,223 @@
+import threading
+
+import pytest
+
+from outbox import Outbox
+from sheets_handler import SheetsHandler
+from snapshot import read_snapshot, write_snapshot
+from sqlite_store import SQLiteTradeStore
+from storage import HEADERS
+
+
+def test_direct_update_follows_rows_moved_in_sheet(ws, trade, sheet_status):
+    """Rows sorted by hand after the index was built: the update goes to the right trade"""
+    handler = SheetsHandler(worksheet=ws)
+    first = handler.add_trade(trade)
+    second = handler.add_trade(trade)
+    handler.get_all_trades()
+
+    ws.rows[1], ws.rows[2] = ws.rows[2], ws.rows[1]
+    handler.update_trade_by_id(first, {'Trạng thái': 'Closed', 'PnL_R': 2})
+
+    assert sheet_status(ws, first) == 'Closed'
+    assert sheet_status(ws, second) == 'Pending'
+
+
+def test_direct_update_checks_only_its_own_rows(ws, trade, sheet_status):
+    """Index still right: one small read of the target cells, not all of column A"""
+    handler = SheetsHandler(worksheet=ws)
+    first = handler.add_trade(trade)
+    second = handler.add_trade(trade)
+    handler.get_all_trades()
+
+    ws.calls.clear()
+    assert handler.update_trades_batch({first: {'Trạng thái': 'Closed'}, second: {'Trạng thái': 'BE'}}) == {first: True, second: True}
+    assert ws.calls == {'batch_get': 1, 'batch_update': 1}
+    assert sheet_status(ws, first) == 'Closed'
+    assert sheet_status(ws, second) == 'BE'
+    assert handler.update_trade_by_id(second + 1, {'Trạng thái': 'Closed'}) is False
+
+
+def test_background_poll_does_not_hold_the_cache_lock(monkeypatch, ws, trade):
+    """A poll waiting on a sheet read leaves cache reads alone"""
+    handler = SheetsHandler(worksheet=ws)
+    trade_id = handler.add_trade(trade)
+    handler.get_all_trades()
+    handler.check_for_changes()  # first marker
+
+    release = threading.Event()
+    reading = threading.Event()
+    batch_get = ws.batch_get
+
+    def slow_batch_get(ranges, **kwargs):
+        reading.set()
+        release.wait(5)
+        return batch_get(ranges, **kwargs)
+    monkeypatch.setattr(ws, 'batch_get', slow_batch_get)
+    ws.spreadsheet.modified += 1
+
+    poll = threading.Thread(target=handler.check_for_changes)
+    poll.start()
+    try:
+        assert reading.wait(5)
+        done = []
+        reader = threading.Thread(target=lambda: done.append(handler.get_pending_trades()))
+        reader.start()
+        reader.join(2)
+        assert done and [t.id for t in done[0]] == [trade_id]
+    finally:
+        release.set()
+        poll.join(5)
+
+
+def test_cache_reads_do_not_wait_for_a_sheet_write(monkeypatch, ws, trade):
+    """A direct-mode append in flight does not block reads served from the cache"""
+    handler = SheetsHandler(worksheet=ws)
+    trade_id = handler.add_trade(trade)
+    handler.get_all_trades()
+
+    release = threading.Event()
+    writing = threading.Event()
+    append_row = ws.append_row
+
+    def slow_append_row(row, **kwargs):
+        writing.set()
+        release.wait(5)
+        return append_row(row, **kwargs)
+    monkeypatch.setattr(ws, 'append_row', slow_append_row)
+
+    writer = threading.Thread(target=handler.add_trade, args=(trade,))
+    writer.start()
+    try:
+        assert writing.wait(5)
+        done = []
+        reader = threading.Thread(target=lambda: done.append(handler.get_trade_by_id(trade_id)))
+        reader.start()
+        reader.join(2)
+        assert done and done[0].id == trade_id
+    finally:
+        release.set()
+        writer.join(5)
+    assert [t.id for t in handler.get_pending_trades()] == [trade_id, trade_id + 1]
+
+
+def test_sync_delta_picks_up_added_edited_and_blanked_rows(ws, trade):
+    handler = SheetsHandler(worksheet=ws)
+    first = handler.add_trade(trade)
+    second = handler.add_trade(trade)
+    handler.get_all_trades()
+    status, pnl = HEADERS.index('Trạng thái'), HEADERS.index('PnL_R')
+
+    # Edited by hand: closed in the sheet, a note cleared
+    ws.rows[1][status], ws.rows[1][pnl] = 'Closed', '2'
+    ws.rows[2][HEADERS.index('Ghi chú')] = 'x'
+    assert handler.sync_delta() == 2
+    ws.rows[2][HEADERS.index('Ghi chú')] = ''
+    assert handler.sync_delta() == 1
+    assert handler.get_trade_by_id(first).status == 'Closed'
+    assert handler.get_trade_by_id(second).note == ''
+    assert handler.get_stats()['total_pnl'] == 2
+
+    # Added by hand below the cached rows
+    ws.rows.append([str(second + 1)] + ws.rows[2][1:])
+    assert handler.sync_delta() == 1
+    assert handler.get_trade_by_id(second + 1).status == 'Pending'
+    assert handler.sync_delta() == 0
+
+    # Blanked: column A no longer matches, the whole sheet is reloaded
+    ws.rows[1] = [''] * len(HEADERS)
+    handler.sync_delta()
+    assert handler.known_trade_ids() == {str(second), str(second + 1)}
+    assert handler.get_stats()['total_trades'] == 0
+
+
+def test_sync_delta_after_invalidate_index(ws, trade):
+    """New rows are indexed even when the index was dropped before the sync"""
+    handler = SheetsHandler(worksheet=ws)
+    first = handler.add_trade(trade)
+    handler.get_all_trades()
+
+    handler.invalidate_index()
+    ws.rows.append([str(first + 1)] + ws.rows[1][1:])
+    assert handler.sync_delta() == 1
+    assert handler.known_trade_ids() == {str(first), str(first + 1)}
+
+
+@pytest.mark.parametrize('backend', ['direct', 'outbox', 'sqlite'])
+def test_add_trade_twice_with_same_key_adds_one_trade(tmp_path, backend, ws, trade):
+    """Double tap / retry of the confirm button: one trade, same ID"""
+    if backend == 'sqlite':
+        storage = SQLiteTradeStore(str(tmp_path / 'journal.db'))
+    else:
+        storage = SheetsHandler(worksheet=ws)
+        if backend == 'outbox':
+            storage.attach_outbox(Outbox(str(tmp_path / 'outbox.jsonl')))
+
+    first = storage.add_trade(trade, 'key-1')
+    assert storage.add_trade(trade, 'key-1') == first
+    other = storage.add_trade(trade, 'key-2')
+    assert other != first
+
+    if backend == 'outbox':
+        storage.flush_outbox()
+    if backend != 'sqlite':
+        assert [row[0] for row in ws.rows[1:] if row] == [str(first), str(other)]
+    assert [t.id for t in storage.get_pending_trades()] == [first, other]
+
+
+def test_snapshot_write_does_not_hold_the_cache_lock(tmp_path, monkeypatch, ws, trade):
+    """Close a trade while the snapshot is on its way to disk: the file has the state before it"""
+    monkeypatch.setattr('sheets_handler.SNAPSHOT_PATH', str(tmp_path / 'journal.snapshot'))
+    handler = SheetsHandler(worksheet=ws)
+    trade_id = handler.add_trade(trade)
+    handler.get_all_trades()
+
+    def write_during_update(path, state):
+        closer = threading.Thread(target=handler.update_trade_by_id, args=(trade_id, {'Trạng thái': 'Closed', 'PnL_R': 2}))
+        closer.start()
+        closer.join(2)
+        assert not closer.is_alive()
+        return write_snapshot(path, state)
+    monkeypatch.setattr('sheets_handler.write_snapshot', write_during_update)
+    assert handler.save_snapshot()
+
+    restarted = SheetsHandler(worksheet=ws)
+    assert restarted.load_snapshot()
+    assert restarted.get_open_risk()['count'] == 0  # sync_delta caught up with the close
+    state = read_snapshot(str(tmp_path / 'journal.snapshot'))
+    assert state['open_risk'].get(trade_id).status == 'Pending'
+    assert state['stats'].stats()['total_trades'] == 0
+    assert handler.save_snapshot()  # the close made it dirty again
+
+
+def test_failed_snapshot_write_is_retried(tmp_path, monkeypatch, ws, trade):
+    monkeypatch.setattr('sheets_handler.SNAPSHOT_PATH', str(tmp_path / 'journal.snapshot'))
+    handler = SheetsHandler(worksheet=ws)
+    handler.add_trade(trade)
+    handler.get_all_trades()
+
+    def disk_full(path, state):
+        raise OSError('No space left on device')
+    monkeypatch.setattr('sheets_handler.write_snapshot', disk_full)
+    with pytest.raises(OSError):
+        handler.save_snapshot()
+    monkeypatch.setattr('sheets_handler.write_snapshot', write_snapshot)
+    assert handler.save_snapshot()
+    assert not handler.save_snapshot()
+
+
+@pytest.mark.parametrize('backend', ['sheets', 'sqlite'])
+def test_report_by_direction(tmp_path, backend, ws, trade):
+    if backend == 'sqlite':
+        storage = SQLiteTradeStore(str(tmp_path / 'journal.db'))
+    else:
+        storage = SheetsHandler(worksheet=ws)
+    buy = storage.add_trade(trade)
+    sell = storage.add_trade(dict(trade, direction='SELL'))
+    storage.add_trade(dict(trade, direction='SELL'))
+    storage.update_trades_batch({buy: {'Trạng thái': 'Closed', 'PnL_R': 2}, sell: {'Trạng thái': 'Closed', 'PnL_R': -1}})
+
+    assert storage.query_stats(category='Hướng') == {
+        'BUY': {'winrate': 100.0, 'pnl': 2.0, 'trades': 1},
+        'SELL': {'winrate': 0.0, 'pnl': -1.0, 'trades': 1},
+    }
@@ -0,0 +1,109 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from stats_aggregator import StatsAggregator
+from timeutil import format_timestamp, to_epoch
+from trade import Trade
+
+START = to_epoch('2024-03-01 00:00:00')
+DAY = 86400
+
+
+def make_trade(trade_id, epoch, status, pnl_r, market='Crypto', style='Day'):
+    return Trade.from_dict({
+        'ID': trade_id,
+        'Timestamp': '' if epoch is None else format_timestamp(epoch),
+        'Thị trường': market,
+        'Kiểu': style,
+        'Risk%': 1,
+        'Trạng thái': status,
+        'PnL_R': pnl_r,
+    })
+
+
+def naive_stats(trades, start=None, end=None):
+    """Straight filter over every trade, what the aggregator must match"""
+    start, end = to_epoch(start), to_epoch(end)
+    picked = []
+    for trade in trades:
+        if not trade.is_closed:
+            continue
+        if trade.epoch is None:
+            if start is None and end is None:
+                picked.append(trade)
+            continue
+        if (start is None or trade.epoch >= start) and (end is None or trade.epoch <= end):
+            picked.append(trade)
+    wins = sum(1 for t in picked if t.pnl > 0)
+    pnl = sum(t.pnl for t in picked)
+    return {
+        'winrate': round(wins / len(picked) * 100, 1) if picked else 0,
+        'total_pnl': round(pnl, 2) if picked else 0,
+        'total_trades': len(picked),
+        'wins': wins,
+        'losses': sum(1 for t in picked if t.pnl < 0),
+        'be': sum(1 for t in picked if t.status == 'BE'),
+    }
+
+
+@pytest.fixture
+def trades():
+    rng = random.Random(7)
+    result = []
+    for trade_id in range(1, 301):
+        # Midnight, one second either side of it, and anywhere in between
+        epoch = START + rng.randrange(10) * DAY + rng.choice([0, 1, -1, rng.randrange(DAY)])
+        status = rng.choice(['Pending', 'Closed', 'Closed', 'BE', 'Cancelled'])
+        pnl_r = {'Closed': rng.choice([-1, 2.5, 0.7]), 'BE': 0}.get(status, '')
+        result.append(make_trade(trade_id, epoch, status, pnl_r,
+                                 market=rng.choice(['Crypto', 'Vàng']), style=rng.choice(['Day', 'Swing'])))
+    result.append(make_trade(301, None, 'Closed', 3))
+    return result
+
+
+PERIODS = [
+    (None, None),
+    ('2024-03-03 00:00:00', '2024-03-05 23:59:59'),
+    ('2024-03-03 00:00:01', '2024-03-05 00:00:00'),
+    ('2024-03-02 12:00:00', '2024-03-02 18:00:00'),
+    (datetime(2024, 3, 4), datetime(2024, 3, 8, 23, 59, 59)),
+    (None, '2024-03-04 00:00:00'),
+    ('2024-03-07 00:00:00', None),
+    ('2024-04-01 00:00:00', '2024-04-30 23:59:59'),
+]
+
+
+@pytest.mark.parametrize('start,end', PERIODS)
+def test_period_stats_match_a_full_recompute(trades, start, end):
+    aggregator = StatsAggregator()
+    aggregator.rebuild(trades)
+    assert aggregator.stats(start, end) == naive_stats(trades, start, end)
+
+
+def test_edits_move_trades_between_buckets(trades):
+    aggregator = StatsAggregator()
+    aggregator.rebuild(trades)
+    rng = random.Random(11)
+    trades = {t.id: t for t in trades}
+    for trade_id in rng.sample(sorted(trades), 80):
+        epoch = START + rng.randrange(10) * DAY + rng.randrange(DAY)
+        status = rng.choice(['Pending', 'Closed', 'BE'])
+        trades[trade_id] = make_trade(trade_id, epoch, status, -1 if status == 'Closed' else 0)
+        aggregator.update_trade(trades[trade_id])
+    for trade_id in rng.sample(sorted(trades), 20):
+        del trades[trade_id]
+        aggregator.remove_trade(trade_id)
+
+    for start, end in PERIODS:
+        assert aggregator.stats(start, end) == naive_stats(trades.values(), start, end)
+
+
+def test_stats_by_category_sums_to_the_period_total(trades):
+    aggregator = StatsAggregator()
+    aggregator.rebuild(trades)
+    start, end = '2024-03-02 00:00:01', '2024-03-06 00:00:00'
+    by_market = aggregator.stats_by_category('Thị trường', start, end)
+    assert sum(group['trades'] for group in by_market.values()) == naive_stats(trades, start, end)['total_trades']
+    assert set(aggregator.stats_by_category('Kiểu', start, end)) == {'Day', 'Swing'}
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from timeutil import (
+    TZ, day_bounds, format_timestamp, local_day, now_timestamp, parse_timestamp, to_epoch,
+)
+
+# 2024-03-01 00:00:00 in Asia/Tokyo (UTC+9)
+MIDNIGHT = int(datetime(2024, 2, 29, 15, 0, tzinfo=timezone.utc).timestamp())
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('2024-03-01 00:00:00', MIDNIGHT),
+    ('  2024-03-01 00:00:00 ', MIDNIGHT),
+    ('2024-03-01T00:00:00', MIDNIGHT),
+    ('2024-03-01', MIDNIGHT),
+    ('2024-02-29T15:00:00+00:00', MIDNIGHT),
+    ('', None),
+    (None, None),
+    ('hôm qua', None),
+    ('2024-13-01 00:00:00', None),
+])
+def test_parse_timestamp(value, expected):
+    assert parse_timestamp(value) == expected
+
+
+@pytest.mark.parametrize('value', [
+    None, MIDNIGHT, '2024-03-01 00:00:00', datetime(2024, 3, 1),
+    TZ.localize(datetime(2024, 3, 1)), datetime(2024, 2, 29, 15, tzinfo=timezone.utc),
+])
+def test_to_epoch_accepts_every_boundary_kind(value):
+    assert to_epoch(value) == (None if value is None else MIDNIGHT)
+
+
+def test_format_round_trips_in_timezone():
+    assert format_timestamp(MIDNIGHT) == '2024-03-01 00:00:00'
+    assert format_timestamp(MIDNIGHT - 1) == '2024-02-29 23:59:59'
+    now = now_timestamp()
+    assert format_timestamp(parse_timestamp(now)) == now
+
+
+def test_local_day_and_bounds():
+    assert local_day(MIDNIGHT) == '2024-03-01'
+    assert local_day(MIDNIGHT - 1) == '2024-02-29'
+    assert day_bounds('2024-03-01') == (MIDNIGHT, MIDNIGHT + 86400)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import signal
+from types import SimpleNamespace
+
+import pytest
+
+from webhook import SECRET_HEADER, TelegramWebhook
+
+UPDATE = json.dumps({'update_id': 1, 'message': {
+    'message_id': 1, 'date': 0, 'chat': {'id': 5, 'type': 'private'}, 'text': '/start',
+}}).encode()
+
+
+class FakeApplication:
+    """Application stub: stop() finishes the queued updates like PTB does"""
+
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+        self.post_init = self.post_stop = self.post_shutdown = None
+        self.processed = []
+        self.events = []
+        self.webhook = None
+
+    async def initialize(self):
+        self.events.append('initialize')
+
+    async def start(self):
+        self.events.append('start')
+
+    async def stop(self):
+        # Updates arriving now must be refused, not lost in the queue
+        status, _, _ = await self.webhook({SECRET_HEADER: 's3cret'}, UPDATE)
+        self.events.append(f"post during drain: {status}")
+        while not self.update_queue.empty():
+            await asyncio.sleep(0.01)
+            self.processed.append(self.update_queue.get_nowait().update_id)
+        self.events.append('stop')
+
+    async def shutdown(self):
+        self.events.append('shutdown')
+
+
+def test_webhook_needs_a_secret():
+    with pytest.raises(ValueError):
+        TelegramWebhook(SimpleNamespace(), '')
+
+
+def test_wrong_or_missing_secret_is_rejected():
+    async def scenario():
+        application = FakeApplication()
+        webhook = TelegramWebhook(application, 's3cret')
+        return [
+            (await webhook({}, UPDATE))[0],
+            (await webhook({SECRET_HEADER: 'guess'}, UPDATE))[0],
+            (await webhook({SECRET_HEADER: 's3cret'}, b'not json'))[0],
+            (await webhook({SECRET_HEADER: 's3cret'}, UPDATE))[0],
+            application.update_queue.qsize(),
+        ]
+
+    assert asyncio.run(scenario()) == [403, 403, 400, 200, 1]
+
+
+def test_sigterm_drains_queued_updates_before_shutdown():
+    async def scenario():
+        application = FakeApplication()
+        webhook = application.webhook = TelegramWebhook(application, 's3cret')
+        serving = asyncio.ensure_future(webhook.serve())
+        await asyncio.sleep(0.05)
+        for _ in range(3):
+            await webhook({SECRET_HEADER: 's3cret'}, UPDATE)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(serving, 5)
+        return application
+
+    application = asyncio.run(scenario())
+    assert application.processed == [1, 1, 1]
+    assert application.events == ['initialize', 'start', 'post during drain: 503', 'stop', 'shutdown']
@@ -0,0 +1,39 @@
+import asyncio
+
+from webserver import WebServer, require_token
+
+
+async def _ok(headers, body):
+    return 200, 'text/plain', b'ok\n'
+
+
+async def _get(port, path, headers=()):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = ''.join(f"{name}: {value}\r\n" for name, value in headers)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n{lines}\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split()[1])
+
+
+def test_token_guarded_routes():
+    async def scenario():
+        server = WebServer('127.0.0.1', 0)
+        server.route('GET', '/metrics', require_token('s3cret', _ok))
+        server.route('GET', '/closed', require_token('', _ok))
+        server.route('GET', '/healthz', _ok)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return [
+                await _get(port, '/healthz'),
+                await _get(port, '/metrics'),
+                await _get(port, '/metrics', [('Authorization', 'Bearer wrong')]),
+                await _get(port, '/metrics', [('Authorization', 'Bearer s3cret')]),
+                await _get(port, '/closed', [('Authorization', 'Bearer ')]),
+            ]
+        finally:
+            await server.stop()
+
+    assert asyncio.run(scenario()) == [200, 403, 403, 200, 403]
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import pytz
+from config import TIMEZONE
+
+# Sheet timestamps are naive 'YYYY-MM-DD HH:MM:SS' in this timezone
+TZ = pytz.timezone(TIMEZONE)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def now_timestamp():
+    """Current time as a sheet timestamp string (TIMEZONE, not server time)"""
+    return datetime.now(TZ).strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(value):
+    """Sheet timestamp -> epoch seconds, None if empty/invalid"""
+    value = str(value or '').strip()
+    if not value:
+        return None
+    try:
+        if len(value) == 19 and value[4] == '-' and value[10] == ' ':
+            # Fast path for our own format
+            naive = datetime(
+                int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                int(value[11:13]), int(value[14:16]), int(value[17:19])
+            )
+        else:
+            naive = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if naive.tzinfo is not None:
+        return int(naive.timestamp())
+    return int(TZ.localize(naive).timestamp())
+
+
+def to_epoch(value):
+    """Period boundary (aware/naive datetime, sheet string or epoch) -> epoch seconds"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = TZ.localize(value)
+        return int(value.timestamp())
+    return parse_timestamp(value)
+
+
+def format_timestamp(epoch):
+    """Epoch seconds -> sheet timestamp string in TIMEZONE"""
+    return datetime.fromtimestamp(epoch, TZ).strftime(TIMESTAMP_FORMAT)
+
+
+def local_day(epoch):
+    """'YYYY-MM-DD' of an epoch in TIMEZONE"""
+    return datetime.fromtimestamp(epoch, TZ).strftime('%Y-%m-%d')
+
+
+def day_bounds(day):
+    """(start, next day start) epoch seconds of a 'YYYY-MM-DD' day in TIMEZONE"""
+    midnight = datetime.strptime(day, '%Y-%m-%d')
+    start = TZ.localize(midnight)
+    end = TZ.localize(midnight + timedelta(days=1))
+    return int(start.timestamp()), int(end.timestamp())
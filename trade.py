@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Optional
+from timeutil import parse_timestamp
+
+# Sheet header -> Trade field
+FIELDS = {
+    'ID': 'id',
+    'Timestamp': 'timestamp',
+    'Thị trường': 'market',
+    'Kiểu': 'style',
+    'Hướng': 'direction',
+    'Ticker': 'ticker',
+    'Entry': 'entry',
+    'SL': 'sl',
+    'Risk%': 'risk',
+    'Chart': 'chart',
+    'Lý do': 'reason',
+    'TP': 'tp',
+    'Trạng thái': 'status',
+    'PnL_R': 'pnl_r',
+    'Ghi chú': 'note',
+}
+
+
+def parse_number(value, default=None):
+    """The one tolerant number parser: 2.5, '2,5', '1.5R', '2%', '' -> float or default"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        # Remove comma, percentage, R suffix
+        clean_value = str(value).replace(',', '.').replace('%', '').replace('R', '').replace('r', '').strip()
+        return float(clean_value)
+    except ValueError:
+        return default
+
+
+def format_number(value):
+    """Number for messages: 2650.0 -> '2650', None -> 'N/A'"""
+    if value is None:
+        return 'N/A'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+@dataclass(frozen=True, slots=True)
+class Trade:
+    """One journal row, parsed once when it enters the process"""
+    id: int
+    timestamp: str
+    epoch: Optional[int]      # timestamp as epoch seconds (TIMEZONE), None if invalid
+    market: str
+    style: str
+    direction: str
+    ticker: str
+    entry: Optional[float]
+    sl: Optional[float]
+    risk: float
+    chart: str
+    reason: str
+    tp: Optional[float]
+    status: str
+    pnl_r: Optional[float]    # None until the trade is closed
+    note: str
+    closed_pct: float = 0.0   # % of the size closed by partial fills (FillsLedger)
+    realized_r: float = 0.0   # R realized by those fills
+
+    @classmethod
+    def from_row(cls, headers, row):
+        """Sheet row (list of cells under headers) -> Trade, None if it has no numeric ID"""
+        cells = {}
+        for i, header in enumerate(headers):
+            field = FIELDS.get(header)
+            if field:
+                cells[field] = row[i] if i < len(row) else ''
+        return cls.from_cells(cells)
+
+    @classmethod
+    def from_dict(cls, record):
+        """Dict keyed by sheet headers -> Trade, None if it has no numeric ID"""
+        return cls.from_cells({field: record.get(header, '') for header, field in FIELDS.items()})
+
+    @classmethod
+    def from_cells(cls, cells):
+        trade_id = parse_number(cells.get('id'))
+        if trade_id is None or not trade_id.is_integer():
+            return None
+        timestamp = str(cells.get('timestamp', '') or '').strip()
+        return cls(
+            id=int(trade_id),
+            timestamp=timestamp,
+            epoch=parse_timestamp(timestamp),
+            market=str(cells.get('market', '') or ''),
+            style=str(cells.get('style', '') or ''),
+            direction=str(cells.get('direction', '') or ''),
+            ticker=str(cells.get('ticker', '') or ''),
+            entry=parse_number(cells.get('entry')),
+            sl=parse_number(cells.get('sl')),
+            risk=parse_number(cells.get('risk'), 0.0),
+            chart=str(cells.get('chart', '') or ''),
+            reason=str(cells.get('reason', '') or ''),
+            tp=parse_number(cells.get('tp')),
+            status=str(cells.get('status', '') or ''),
+            pnl_r=parse_number(cells.get('pnl_r')),
+            note=str(cells.get('note', '') or ''),
+            closed_pct=parse_number(cells.get('closed_pct'), 0.0),
+            realized_r=parse_number(cells.get('realized_r'), 0.0),
+        )
+
+    @property
+    def is_closed(self):
+        return self.status in ('Closed', 'BE')
+
+    @property
+    def pnl(self):
+        """PnL in R for stats: partial fills plus the rest of the size at PnL_R, 0 when empty"""
+        rest = self.pnl_r or 0.0
+        if not self.closed_pct:
+            return rest
+        return self.realized_r + rest * (100 - self.closed_pct) / 100
+
+    @property
+    def remaining_risk(self):
+        """Risk% of the size still open"""
+        if not self.closed_pct:
+            return self.risk
+        return self.risk * (100 - self.closed_pct) / 100
+
+    def to_row(self, headers):
+        """Cells in sheet column order"""
+        row = []
+        for header in headers:
+            field = FIELDS.get(header)
+            value = getattr(self, field) if field else ''
+            row.append('' if value is None else value)
+        return row
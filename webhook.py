@@ -0,0 +1,81 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from telegram import Update
+from metrics import WEBHOOK_UPDATES
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+
+class TelegramWebhook:
+    """WebServer route feeding Telegram updates into a PTB Application.
+
+    Updates are acknowledged as soon as they are queued, the application
+    processes them (concurrently when built with concurrent_updates).
+    While draining, new POSTs get 503 and Telegram delivers them again later.
+    """
+
+    def __init__(self, application, secret):
+        if not secret:
+            raise ValueError("❌ BOT_MODE=webhook needs WEBHOOK_SECRET")
+        self.application = application
+        self.secret = secret
+        self.accepting = True
+
+    def _result(self, result, status):
+        WEBHOOK_UPDATES.labels(result).inc()
+        return status, 'text/plain', f"{result}\n".encode()
+
+    async def __call__(self, headers, body):
+        token = headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode('latin-1'), self.secret.encode('latin-1')):
+            return self._result('forbidden', 403)
+        if not self.accepting:
+            return self._result('draining', 503)
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning(f"⚠️ Webhook: not an update ({e})")
+            update = None
+        if update is None:
+            return self._result('bad_request', 400)
+        await self.application.update_queue.put(update)
+        return self._result('accepted', 200)
+
+    async def serve(self, url=None):
+        """Webhook counterpart of Application.run_polling(), until SIGINT/SIGTERM
+
+        url: public HTTPS address registered with Telegram (None = only
+        serve, e.g. locally with recorded updates). On a signal the route
+        stops accepting, queued and running updates finish, then the
+        post_stop/post_shutdown hooks run.
+        """
+        application = self.application
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        try:
+            if url:
+                await application.bot.set_webhook(
+                    url, secret_token=self.secret, allowed_updates=Update.ALL_TYPES)
+                logger.info(f"🌐 Webhook: {url}")
+            await stop.wait()
+        finally:
+            logger.info("⏳ Draining updates before shutdown")
+            self.accepting = False
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
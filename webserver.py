@@ -0,0 +1,93 @@
+import asyncio
+import hmac
+import logging
+
+logger = logging.getLogger(__name__)
+
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+MAX_BODY = 1024 * 1024
+
+
+def require_token(token, handler):
+    """Route handler answering 403 unless the request has Authorization: Bearer <token>"""
+    async def guarded(headers, body):
+        sent = headers.get('authorization', '')
+        if not token or not hmac.compare_digest(sent.encode('latin-1'), f"Bearer {token}".encode('latin-1')):
+            return 403, 'text/plain', b'forbidden\n'
+        return await handler(headers, body)
+    return guarded
+
+
+class WebServer:
+    """Minimal asyncio HTTP/1.1 server on the bot's event loop (fly.toml internal_port).
+
+    Routes are async callables taking (headers, body) and returning
+    (status, content_type, body bytes). One request per connection.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.routes = {}  # (method, path) -> handler
+        self._server = None
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"🌐 HTTP server on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            status, content_type, body = await self._respond(reader)
+        except Exception as e:
+            logger.error(f"❌ HTTP handler error: {e}")
+            status, content_type, body = 500, 'text/plain', b'error\n'
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            return 400, 'text/plain', b'bad request\n'
+        method, target = request_line[0], request_line[1]
+        path = target.split('?', 1)[0]
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY:
+            return 400, 'text/plain', b'body too large\n'
+        body = await reader.readexactly(length) if length else b''
+
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(p == path for _, p in self.routes):
+                return 405, 'text/plain', b'method not allowed\n'
+            return 404, 'text/plain', b'not found\n'
+        return await handler(headers, body)